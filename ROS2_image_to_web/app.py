@@ -38,21 +38,8 @@ class CameraSubscriber(Node):
         self.chessboard_lock = threading.Lock()
 
     def listener_callback(self, msg):
-        self.frame = self.bridge.imgmsg_to_cv2(msg, desired_encoding="bgr8")
-        
-        if self.config.get('blur_kernel', 7) > 0:
-            self.frame = cv2.medianBlur(self.frame, self.config['blur_kernel'])
-        
-        if self.config.get('use_correction', True):
-            self.frame = correct_lens_distortion(
-                self.frame,
-                self.calibration['camera_matrix'],
-                self.calibration['dist_coeffs']
-            )
-        
-        if self.config.get('enable_processing', True):
-            self.frame = apply_gamma_correction(self.frame, self.config.get('gamma', 1.2))
-            find_contours(self.frame)
+        frame = self.bridge.imgmsg_to_cv2(msg, desired_encoding="bgr8")
+        self.frame = process_frame(frame, self.config, self.calibration)
 
 def gen_frame():
     while True:
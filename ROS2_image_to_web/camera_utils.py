@@ -58,6 +58,23 @@ def apply_gamma_correction(image, gamma=1.0):
         for i in np.arange(0, 256)]).astype("uint8")
     return cv2.LUT(image, table)
 
+def process_frame(frame, config, calibration):
+    # Median blur -> lens correction -> gamma + contours, as configured
+    if config.get('blur_kernel', 7) > 0:
+        frame = cv2.medianBlur(frame, config['blur_kernel'])
+
+    if config.get('use_correction', True):
+        frame = correct_lens_distortion(
+            frame,
+            calibration['camera_matrix'],
+            calibration['dist_coeffs']
+        )
+
+    if config.get('enable_processing', True):
+        frame = apply_gamma_correction(frame, config.get('gamma', 1.2))
+        find_contours(frame)
+    return frame
+
 def find_contours(image, threshold=100):
     img_grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     ret, thresh_img = cv2.threshold(img_grey, threshold, 255, cv2.THRESH_BINARY)
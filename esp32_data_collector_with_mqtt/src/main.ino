@@ -4,6 +4,8 @@
 #include <sstream>
 #include <string>
 #include <vector>
+#include <memory>
+#include <algorithm>
 #include "FS.h"
 #include <LittleFS.h>
 #include "esp_attr.h"
@@ -84,6 +86,8 @@ uint16_t LOG_COUNTER = 100; // numper of periods befor log will be recorded
 
 int chip_id = 0;
 std::string device_URL = "0";
+String topic_url = "URL";    // URL/<device_id>
+String topic_data = "Data";  // Data/<device_id>
 uint8_t data_ready = false;
 uint8_t status_timer = 0;    // waiting before shutdown counter
 bool first_start = true;     // first start falag
@@ -198,6 +202,68 @@ String generateHTML() {
   return html;
 }
 
+// Binary capture frame (see wirenboard_data_collector/wire_format.py):
+// 16-byte header, device_id, timestamp, channel lengths, padding to 8 bytes, uint16 channels.
+// Only the header (a few dozen bytes) is built in memory: the response callback copies
+// channel data from the sample arrays straight into the TCP send buffer, piece by piece.
+void sendBinaryCapture(AsyncWebServerRequest *request)
+{
+  JsonObject meta = sensors_data_to_send["metadata"];
+  String device_id = meta["device_id"].as<String>();
+  String timestamp = meta["timestamp"].as<String>();
+  uint32_t sample_rate = meta["sample_rate"];
+  uint16_t device_len = device_id.length();
+  uint16_t timestamp_len = timestamp.length();
+  const uint32_t lengths[] = {SAMPLE_SIZE, SAMPLE_SIZE, SAMPLE_SIZE};
+  const size_t channel_bytes = SAMPLE_SIZE * sizeof(uint16_t);
+
+  uint8_t header[16] = {'F', 'D', 'C', '1', 1, 3, 12, 0};
+  memcpy(header + 8, &sample_rate, sizeof(sample_rate));
+  memcpy(header + 12, &device_len, sizeof(device_len));
+  memcpy(header + 14, &timestamp_len, sizeof(timestamp_len));
+
+  auto head = std::make_shared<std::vector<uint8_t>>(header, header + sizeof(header));
+  head->insert(head->end(), device_id.c_str(), device_id.c_str() + device_len);
+  head->insert(head->end(), timestamp.c_str(), timestamp.c_str() + timestamp_len);
+  head->insert(head->end(), (const uint8_t *)lengths, (const uint8_t *)lengths + sizeof(lengths));
+  head->resize((head->size() + 7) / 8 * 8, 0); // padding to 8 bytes
+  size_t total = head->size() + 3 * channel_bytes;
+
+  AsyncWebServerResponse *response = request->beginResponse(
+    "application/octet-stream", total,
+    [head, channel_bytes](uint8_t *buffer, size_t maxLen, size_t index) -> size_t {
+      const uint8_t *channels[] = {(const uint8_t *)current_data_0.data(),
+                                   (const uint8_t *)mic_data_0.data(),
+                                   (const uint8_t *)vibro_data_0.data()};
+      size_t written = 0;
+      while (written < maxLen)
+      {
+        size_t offset = index + written;
+        const uint8_t *source;
+        size_t available;
+        if (offset < head->size())
+        {
+          source = head->data() + offset;
+          available = head->size() - offset;
+        }
+        else
+        {
+          offset -= head->size();
+          size_t channel = offset / channel_bytes;
+          if (channel >= 3)
+            break;
+          source = channels[channel] + offset % channel_bytes;
+          available = channel_bytes - offset % channel_bytes;
+        }
+        size_t count = std::min(available, maxLen - written);
+        memcpy(buffer + written, source, count);
+        written += count;
+      }
+      return written;
+    });
+  request->send(response);
+}
+
 void setup()
 {
   Serial.begin(115200); // serial communication
@@ -215,6 +281,8 @@ void setup()
   Serial.println("IP address: ");
   Serial.println(WiFi.localIP());
   device_URL = WiFi.localIP() + "/" + DATA_PORT;
+  topic_url = "URL/" + String(ESP.getEfuseMac(), HEX);
+  topic_data = "Data/" + String(ESP.getEfuseMac(), HEX);
   
   //MQTT BROCKER setup
   client.setServer(mqttServer, mqttPort);
@@ -229,8 +297,8 @@ void setup()
       }
   }
   // INITIAL MQTT MESSAGE  
-  client.publish( "URL", device_URL);
-  client.publish( "Data", String(data_ready).c_str());
+  client.publish(topic_url.c_str(), device_URL.c_str());
+  client.publish(topic_data.c_str(), String(data_ready).c_str());
   
   //WEB server setup
     // Route handlers
@@ -242,13 +310,18 @@ void setup()
     server.on("/get_data", HTTP_GET, [](AsyncWebServerRequest *request){
       if (sensors_data_to_send.isNull()) {
         request->send(500, "text/plain", "No data is ready");
+      } else if (request->hasHeader("Accept") &&
+                 request->header("Accept").indexOf("application/octet-stream") >= 0) {
+        data_ready = 0;
+        client.publish(topic_data.c_str(), String(data_ready).c_str());
+        sendBinaryCapture(request);
       } else {
         AsyncMessagePackResponse *response = new AsyncMessagePackResponse();
         JsonObject root = sensors_data_to_send.as<JsonObject>();
         serializeJson(root, *response);
         // Use mutex/semaphore for thread-safe flag update (if in a multi-threaded environment)
         data_ready = 0; 
-        client.publish("Data", String(data_ready).c_str());
+        client.publish(topic_data.c_str(), String(data_ready).c_str());
         request->send(response);
       }
     });
@@ -329,7 +402,7 @@ meta["device_id"] = String(ESP.getEfuseMac(), HEX);
 
 
 data_ready = 1;
-client.publish( "Data", String(data_ready).c_str());
+client.publish(topic_data.c_str(), String(data_ready).c_str());
 }
 
 void system_halt() {
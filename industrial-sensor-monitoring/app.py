@@ -1,186 +1,333 @@
 import os
-import json
+import threading
+import time
 import numpy as np
 import pandas as pd
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from datetime import datetime
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
+from werkzeug.datastructures import FileStorage
 from fedot.core.pipelines.pipeline import Pipeline
 from fedot.core.data.data import InputData
 from fedot.core.repository.dataset_types import DataTypesEnum
 from fedot.core.repository.tasks import Task, TaskTypesEnum
-from werkzeug.utils import secure_filename
-import matplotlib.pyplot as plt
-from io import BytesIO
 import base64
-from scipy.fft import fft, fftfreq
-import pywt
+from sample_loader import load_samples, parse_sample_file, sample_arrays, sample_id, sample_result
+from feature_cache import FeatureCache
+from features import LEGACY_FEATURES, FeatureExtractor, featurize
+from label_store import LabelStore
+from sample_catalog import PER_PAGE, SampleCatalog
+from upload_queue import UploadQueue
+from plot_render import PLOT_POINTS, PLOT_TYPES, WAVELET_SCALES, PlotCache, plot_data, render_png
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'data/samples'
 app.config['LABELS_FILE'] = 'data/labels.json'
+app.config['LABELS_DB'] = 'data/labels.sqlite'
 app.config['MODEL_FILE'] = 'data/models/ts_classifier'
-app.config['ALLOWED_EXTENSIONS'] = {'csv'}
+app.config['ALLOWED_EXTENSIONS'] = {'csv', 'zip'}
+app.config['FEATURE_CACHE'] = 'data/processed/feature_cache.sqlite'
+app.config['FEATURES_FILE'] = 'data/models/features.json'
+app.config['CATALOG_FILE'] = 'data/catalog.sqlite'
+app.config['UPLOAD_STAGING'] = 'data/uploads'
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+# Загруженная модель и ее набор признаков (см. load_model)
+model_cache = {'pipeline': None, 'extractor': None, 'mtime': None}
+model_lock = threading.Lock()
+feature_caches = {}
+# Готовые графики /visualize (см. plot_render.py)
+plot_cache = PlotCache()
+# Каталог выборок для главной страницы (см. sample_catalog.py)
+catalog = SampleCatalog(app.config['CATALOG_FILE'])
+# Метки классов (см. label_store.py); labels.json переносится при первом запуске
+label_store = LabelStore(app.config['LABELS_DB'], legacy_json=app.config['LABELS_FILE'])
+catalog_state = {'labels_cursor': None}
 
-def load_labels():
-    if os.path.exists(app.config['LABELS_FILE']):
-        with open(app.config['LABELS_FILE'], 'r') as f:
-            return json.load(f)
-    return {}
+def model_mtime():
+    """Время последнего изменения файлов модели и конфигурации признаков или None"""
+    model_file = app.config['MODEL_FILE']
+    if os.path.isdir(model_file):
+        paths = [os.path.join(root, f) for root, _, files in os.walk(model_file) for f in files]
+    elif os.path.exists(model_file):
+        paths = [model_file]
+    else:
+        return None
+    if os.path.exists(app.config['FEATURES_FILE']):
+        paths.append(app.config['FEATURES_FILE'])
+    return max((os.path.getmtime(p) for p in paths), default=None)
 
-def save_labels(labels):
-    with open(app.config['LABELS_FILE'], 'w') as f:
-        json.dump(labels, f, indent=4)
-
-def load_model():
-    if os.path.exists(app.config['MODEL_FILE']):
-        try:
-            return Pipeline.load(app.config['MODEL_FILE'])
-        except:
+def load_model(reload=False):
+    """Модель из памяти; с диска загружается заново только после изменения файлов модели"""
+    mtime = model_mtime()
+    with model_lock:
+        if mtime is None:
+            model_cache.update(pipeline=None, extractor=None, mtime=None)
             return None
-    return None
+        if reload or model_cache['mtime'] != mtime:
+            try:
+                pipeline = Pipeline.load(app.config['MODEL_FILE'])
+            except Exception as e:
+                print(f"Ошибка загрузки модели: {e}")
+                return None
+            model_cache.update(pipeline=pipeline, extractor=load_feature_extractor(), mtime=mtime)
+        return model_cache['pipeline']
+
+def refresh_catalog():
+    # Каталог выборок пересканируется только при изменении mtime каталога,
+    # метки переносятся по курсору изменений хранилища меток
+    cursor = catalog_state['labels_cursor']
+    if cursor is None:
+        catalog_state['labels_cursor'] = label_store.cursor()
+        catalog.rescan(app.config['UPLOAD_FOLDER'], label_store)
+        catalog.sync_labels(label_store.all())
+        return
+    catalog.rescan(app.config['UPLOAD_FOLDER'], label_store)
+    changes, catalog_state['labels_cursor'] = label_store.changes(cursor)
+    if changes:
+        catalog.set_labels(changes)
+
+def get_samples(page=1, per_page=PER_PAGE, **filters):
+    refresh_catalog()
+    samples, total = catalog.query(page, per_page, **filters)
+    for sample in samples:
+        sample['id'] = sample['sample_id']
+        sample['timestamp'] = sample['timestamp'] or 'Unknown'
+    return samples, total
+
+def load_feature_extractor():
+    # Набор признаков, с которым обучена модель; без features.json модель обучена
+    # до конфигурируемых признаков и ждет прежние четыре статистики
+    if os.path.exists(app.config['FEATURES_FILE']):
+        return FeatureExtractor.load(app.config['FEATURES_FILE'])
+    return FeatureExtractor(LEGACY_FEATURES)
+
+def get_feature_cache(extractor):
+    if extractor.version not in feature_caches:
+        feature_caches[extractor.version] = FeatureCache(app.config['FEATURE_CACHE'], extractor.version)
+    return feature_caches[extractor.version]
 
-def get_samples():
-    samples = []
-    labels = load_labels()
+def sample_features(paths, extractor):
+    """Признаки файлов выборок: из кэша, остальные считаются одним пакетом.
     
-    for f in os.listdir(app.config['UPLOAD_FOLDER']):
-        if f.startswith('sample_') and f.endswith('.csv'):
-            sample_id = f.replace('.csv', '')
-            label = labels.get(sample_id, None)
-            
-            try:
-                timestamp = datetime.strptime(f.replace('sample_', '').replace('.csv', ''), '%Y%m%d_%H%M%S')
-                samples.append({
-                    'id': sample_id,
-                    'filename': f,
-                    'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    'label': label
-                })
-            except:
-                samples.append({
-                    'id': sample_id,
-                    'filename': f,
-                    'timestamp': 'Unknown',
-                    'label': label
-                })
-    
-    return sorted(samples, key=lambda x: x['timestamp'], reverse=True)
-
-def prepare_sample_for_prediction(filepath):
-    df = pd.read_csv(filepath)
-    values = df['values'].values if 'values' in df.columns else df['current_avg'].values
-    
-    features = np.array([[
-        np.mean(values),
-        np.std(values),
-        np.max(values),
-        np.min(values)
-    ]])
-    
-    input_data = InputData(
-        idx=np.array([0]),
-        features=features,
+    Возвращает ({путь: признаки}, {путь: ошибка}).
+    """
+    feature_cache = get_feature_cache(extractor)
+    hits, misses = feature_cache.lookup(paths)
+    found = {path: hits[sample_id(path)] for path in paths if sample_id(path) in hits}
+    computed, errors = compute_features(load_samples(misses, progress=False), extractor)
+    found.update(computed)
+    return found, errors
+
+def compute_features(results, extractor):
+    """Признаки разобранных выборок (см. sample_loader) одним пакетом, с записью в кэш"""
+    found, errors = {}, {}
+    loaded = []
+    for result in results:
+        if 'error' in result:
+            errors[result['path']] = result['error']
+            continue
+        _, values = sample_arrays(result)
+        if not len(values):
+            errors[result['path']] = 'Empty sample'
+            continue
+        loaded.append((result, values))
+    
+    matrix = featurize([values for _, values in loaded],
+                       [result['metadata'].get('sample_rate') for result, _ in loaded], extractor)
+    computed = []
+    for (result, _), row in zip(loaded, matrix):
+        found[result['path']] = dict(zip(extractor.names, row.tolist()))
+        computed.append((result['path'], found[result['path']]))
+    get_feature_cache(extractor).store(computed)
+    return found, errors
+
+def make_input_data(features):
+    return InputData(
+        idx=np.arange(len(features)),
+        features=np.asarray(features, dtype=np.float64),
         target=None,
         task=Task(TaskTypesEnum.classification),
         data_type=DataTypesEnum.table
     )
+
+def prepare_sample_for_prediction(filepath, extractor=None):
+    # Признаки те же, что при обучении; повторно не считаются, пока файл не изменится
+    extractor = extractor or load_feature_extractor()
+    found, errors = sample_features([filepath], extractor)
+    if filepath in errors:
+        raise ValueError(errors[filepath])
     
-    return input_data
-
-def create_plot(df, plot_type='oscillogram'):
-    plt.figure(figsize=(10, 4))
-    
-    if plot_type == 'oscillogram':
-        time_col = 'exact_timestamp' if 'exact_timestamp' in df.columns else 'timestamp'
-        value_col = 'values' if 'values' in df.columns else 'current_avg'
-        plt.plot(df[time_col], df[value_col])
-        plt.title('Осциллограмма')
-        plt.xlabel('Время')
-        plt.ylabel('Амплитуда')
-    
-    elif plot_type == 'fft':
-        values = df['values'].values if 'values' in df.columns else df['current_avg'].values
-        n = len(values)
-        yf = fft(values)
-        xf = fftfreq(n, 1 / (df['sample_rate'].iloc[0] if 'sample_rate' in df.columns else 1000))
-        plt.plot(xf[:n//2], np.abs(yf[:n//2]))
-        plt.title('Фурье-спектр')
-        plt.xlabel('Частота (Гц)')
-        plt.ylabel('Амплитуда')
-    
-    elif plot_type == 'wavelet':
-        values = df['values'].values if 'values' in df.columns else df['current_avg'].values
-        scales = np.arange(1, 128)
-        wavelet = 'cmor1.5-1.0'
-        coefficients, _ = pywt.cwt(values, scales, wavelet, 
-                                 sampling_period=1/(df['sample_rate'].iloc[0] if 'sample_rate' in df.columns else 1000))
-        plt.imshow(np.abs(coefficients), extent=[0, len(values), 1, 128], 
-                  cmap='jet', aspect='auto')
-        plt.title('Вейвлет-спектр')
-        plt.xlabel('Время (отсчеты)')
-        plt.ylabel('Масштаб')
-        plt.colorbar()
-    
-    plt.grid(True)
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close()
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return make_input_data([[found[filepath][name] for name in extractor.names]])
+
+def sample_source(filepath):
+    """Отложенная загрузка сигнала: файл читается только при промахе кэша графиков"""
+    loaded = {}
+    def source():
+        if not loaded:
+            result = parse_sample_file((filepath, None, None))
+            if 'error' in result:
+                raise ValueError(result['error'])
+            times, values = sample_arrays(result)
+            loaded['sample'] = (times, values, result['metadata'].get('sample_rate'))
+        return loaded['sample']
+    return source
+
+def render_plot(sample_id, filepath, plot_type, fmt='png', points=PLOT_POINTS, scales=WAVELET_SCALES, source=None):
+    """График из кэша; ключ - выборка, тип, формат, параметры и mtime файла"""
+    source = source or sample_source(filepath)
+    key = (sample_id, plot_type, fmt, points, scales if plot_type == 'wavelet' else None,
+           os.stat(filepath).st_mtime_ns)
+    if fmt == 'json':
+        return plot_cache.get(key, lambda: plot_data(plot_type, *source(), points=points, scales=scales))
+    # PNG строится из тех же (закэшированных) данных, что отдаются в JSON
+    return plot_cache.get(key, lambda: render_png(
+        plot_type, render_plot(sample_id, filepath, plot_type, 'json', points, scales, source)))
 
 @app.route('/')
 def index():
-    samples = get_samples()
+    filters = {name: request.args.get(name) or None
+               for name in ('label', 'device_id', 'search', 'date_from', 'date_to')}
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', PER_PAGE, type=int), 1), 500)
+    samples, total = get_samples(page, per_page, **filters)
     model_exists = os.path.exists(app.config['MODEL_FILE'])
-    return render_template('index.html', samples=samples, model_exists=model_exists)
+    return render_template('index.html', samples=samples, model_exists=model_exists,
+                           page=page, per_page=per_page, total=total,
+                           pages=max(1, (total + per_page - 1) // per_page),
+                           filters=filters, devices=catalog.devices())
+
+def on_upload_accepted(results):
+    # Принятые загрузки сразу попадают в каталог, признаки считаются заранее
+    catalog.upsert(results, label_store)
+    compute_features(results, load_feature_extractor())
+
+upload_queue = UploadQueue(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_STAGING'], on_upload_accepted,
+                           extensions=tuple(f'.{e}' for e in app.config['ALLOWED_EXTENSIONS']))
+
+def wants_json():
+    return request.accept_mimetypes.best == 'application/json'
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
-        return redirect(request.url)
-    
-    file = request.files['file']
-    if file.filename == '':
-        return redirect(request.url)
+    """Загрузка CSV и zip: multipart (несколько файлов в поле file или files) или
+    тело запроса целиком с ?filename=... - тогда поток пишется на диск без буферизации.
     
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    Файлы только сохраняются, разбор и проверка идут в фоне (см. upload_queue.py);
+    состояние задания - GET /upload/<job_id>.
+    """
+    if request.mimetype == 'multipart/form-data':
+        files = [f for f in request.files.getlist('file') + request.files.getlist('files') if f.filename]
+    elif request.args.get('filename'):
+        files = [FileStorage(stream=request.stream, filename=request.args['filename'])]
+    else:
+        files = []
+    if not files:
+        if wants_json():
+            return jsonify({'error': 'No files provided'}), 400
+        return redirect(url_for('index'))
     
+    job_id = upload_queue.submit(files)
+    if wants_json():
+        return jsonify({'job_id': job_id, 'status_url': url_for('upload_status', job_id=job_id)}), 202
     return redirect(url_for('index'))
 
+@app.route('/upload/<job_id>')
+def upload_status(job_id):
+    status = upload_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(status)
+
+@app.route('/uploads')
+def uploads_status():
+    return jsonify(upload_queue.status())
+
 @app.route('/label', methods=['POST'])
 def label_sample():
-    sample_id = request.form.get('sample_id')
+    # Форма: одна или несколько выборок (sample_id повторяется) и метка
+    sample_ids = request.form.getlist('sample_id')
     label = request.form.get('label')
     
-    if sample_id and label:
-        labels = load_labels()
-        labels[sample_id] = int(label)
-        save_labels(labels)
+    if sample_ids and label:
+        labels = {sample_id: int(label) for sample_id in sample_ids}
+        label_store.set_many(labels, annotator=request.remote_addr)
+        catalog.set_labels(labels)
     
     return redirect(url_for('index'))
 
+@app.route('/labels', methods=['GET', 'POST'])
+def labels_api():
+    """Метки выборок.
+    
+    GET ?sample_id=...&sample_id=... - метки указанных выборок (без параметров - все).
+    POST {"labels": {"sample_id": метка или null}} или {"sample_ids": [...], "label": метка} -
+    разметка в одной транзакции.
+    """
+    if request.method == 'GET':
+        sample_ids = request.args.getlist('sample_id')
+        return jsonify(label_store.labels_for(sample_ids) if sample_ids else label_store.all())
+    
+    data = request.get_json(silent=True) or {}
+    if 'labels' in data:
+        labels = data['labels']
+    else:
+        labels = {sample_id: data.get('label') for sample_id in data.get('sample_ids', [])}
+    if not isinstance(labels, dict) or not labels:
+        return jsonify({'error': 'No labels provided'}), 400
+    try:
+        labels = {str(key): None if value is None else int(value) for key, value in labels.items()}
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Labels must be integers or null'}), 400
+    
+    changed = label_store.set_many(labels, annotator=data.get('annotator') or request.remote_addr)
+    catalog.set_labels(labels)
+    return jsonify({'labeled': len(labels), 'changed': changed})
+
+@app.route('/labels/history')
+def labels_history():
+    """История разметки: ?sample_id=... для одной выборки, ?limit=N"""
+    return jsonify(label_store.history(request.args.get('sample_id'),
+                                       min(request.args.get('limit', 100, type=int), 10000)))
+
 @app.route('/visualize/<sample_id>')
 def visualize_sample(sample_id):
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{sample_id}.csv")
     if not os.path.exists(filepath):
         return jsonify({'error': 'Sample not found'}), 404
     
-    df = pd.read_csv(filepath)
-    
-    oscillogram = create_plot(df, 'oscillogram')
-    fft_plot = create_plot(df, 'fft')
-    wavelet_plot = create_plot(df, 'wavelet')
+    source = sample_source(filepath)
+    plots = {plot_type: base64.b64encode(render_plot(sample_id, filepath, plot_type, source=source)).decode('utf-8')
+             for plot_type in PLOT_TYPES}
     
     return jsonify({
-        'oscillogram': oscillogram,
-        'fft_plot': fft_plot,
-        'wavelet_plot': wavelet_plot
+        'oscillogram': plots['oscillogram'],
+        'fft_plot': plots['fft'],
+        'wavelet_plot': plots['wavelet']
     })
 
+@app.route('/visualize/<sample_id>/<plot_type>')
+def visualize_plot(sample_id, plot_type):
+    """Один график: PNG или данные для построения на клиенте (format=json)"""
+    if plot_type not in PLOT_TYPES:
+        return jsonify({'error': f'Unknown plot type {plot_type}'}), 404
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{sample_id}.csv")
+    if not os.path.exists(filepath):
+        return jsonify({'error': 'Sample not found'}), 404
+    
+    fmt = request.args.get('format', 'png')
+    points = min(max(request.args.get('points', PLOT_POINTS, type=int), 10), 20000)
+    scales = min(max(request.args.get('scales', WAVELET_SCALES, type=int), 1), 256)
+    try:
+        plot = render_plot(sample_id, filepath, plot_type, fmt, points, scales)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    if fmt == 'json':
+        return jsonify(plot)
+    return Response(plot, mimetype='image/png')
+
+@app.route('/plot_cache_stats')
+def plot_cache_stats():
+    return jsonify(plot_cache.stats())
+
 @app.route('/predict', methods=['POST'])
 def predict():
     sample_id = request.form.get('sample_id')
@@ -196,9 +343,9 @@ def predict():
         return jsonify({'error': 'Sample file not found'}), 404
     
     try:
-        input_data = prepare_sample_for_prediction(filepath)
+        input_data = prepare_sample_for_prediction(filepath, model_cache['extractor'])
         prediction = model.predict(input_data)
-        predicted_class = int(prediction.predict[0])
+        predicted_class = int(np.ravel(prediction.predict)[0])
         
         return jsonify({
             'sample_id': sample_id,
@@ -207,6 +354,85 @@ def predict():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Предсказание для списка выборок (sample_ids) и/или загруженных файлов (files).
+    
+    Признаки всех выборок считаются вместе, предсказание - одним вызовом model.predict.
+    """
+    started = time.perf_counter()
+    latency = {}
+    payload = request.get_json(silent=True) or {}
+    sample_ids = request.form.getlist('sample_ids') or payload.get('sample_ids', [])
+    uploads = request.files.getlist('files')
+    if not sample_ids and not uploads:
+        return jsonify({'error': 'Sample IDs or files not provided'}), 400
+    
+    model = load_model()
+    latency['load_model'] = time.perf_counter() - started
+    if not model:
+        return jsonify({'error': 'Model not found'}), 404
+    extractor = model_cache['extractor']
+    
+    errors = {}
+    paths = {}
+    for requested in sample_ids:
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{requested}.csv")
+        if os.path.exists(filepath):
+            paths[filepath] = requested
+        else:
+            errors[requested] = 'Sample file not found'
+    
+    step = time.perf_counter()
+    found, failed = sample_features(list(paths), extractor)
+    names, rows = [], []
+    for filepath, requested in paths.items():
+        if filepath in failed:
+            errors[requested] = failed[filepath]
+        else:
+            names.append(requested)
+            rows.append([found[filepath][name] for name in extractor.names])
+    
+    # Загруженные файлы не сохраняются и не кэшируются
+    uploaded = []
+    for file in uploads:
+        try:
+            result = sample_result(file.filename, pd.read_csv(file.stream))
+            _, values = sample_arrays(result)
+            if not len(values):
+                raise ValueError('Empty sample')
+            uploaded.append((file.filename, values, result['metadata'].get('sample_rate')))
+        except Exception as e:
+            errors[file.filename] = str(e)
+    if uploaded:
+        matrix = featurize([u[1] for u in uploaded], [u[2] for u in uploaded], extractor)
+        names += [u[0] for u in uploaded]
+        rows += matrix.tolist()
+    latency['features'] = time.perf_counter() - step
+    
+    predictions = []
+    if rows:
+        step = time.perf_counter()
+        try:
+            prediction = model.predict(make_input_data(rows))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        latency['predict'] = time.perf_counter() - step
+        predictions = [{'sample_id': name, 'predicted_class': int(predicted)}
+                       for name, predicted in zip(names, np.ravel(prediction.predict))]
+    latency['total'] = time.perf_counter() - started
+    
+    return jsonify({
+        'predictions': predictions,
+        'errors': errors,
+        'latency_ms': {name: round(value * 1000, 2) for name, value in latency.items()}
+    })
+
+@app.route('/reload_model', methods=['POST'])
+def reload_model():
+    model = load_model(reload=True)
+    return jsonify({'loaded': model is not None})
+
 if __name__ == '__main__':
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs('data/models', exist_ok=True)
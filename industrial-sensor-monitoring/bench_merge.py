@@ -0,0 +1,118 @@
+"""Сравнение векторного объединения выборок (merge_engine.py) с прежней реализацией.
+
+Данные генерируются так же, как в generate_samples.py (зашумленная синусоида),
+в двух форматах: файлы ответов /samples со списком значений в строке
+и длинный формат generate_synthetic_samples (одно значение в строке).
+
+    python bench_merge.py --files 20 --captures 2 --sample-rate 1000 --duration 80
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from generate_samples import generate_synthetic_samples
+from merge_engine import merge_frames
+
+
+def legacy_merge(frames):
+    """Прежняя реализация APIDataCollector.merge_samples (без записи на диск)"""
+    all_data = []
+    for df in frames:
+        df_exploded = df.explode('values')
+        df_exploded['timestamp'] = pd.to_datetime(df_exploded['timestamp'])
+        sample_rate = df_exploded['sample_rate'].iloc[0]
+        time_delta = 1 / sample_rate
+        timestamps = []
+        for _, group in df_exploded.groupby('timestamp'):
+            start_time = group['timestamp'].iloc[0]
+            times = [start_time + timedelta(seconds=i*time_delta) for i in range(len(group))]
+            timestamps.extend(times)
+        df_exploded['exact_timestamp'] = timestamps
+        all_data.append(df_exploded)
+    merged = pd.concat(all_data).sort_values('exact_timestamp')
+    subset = ['exact_timestamp', 'device_id'] if 'device_id' in merged.columns else ['exact_timestamp']
+    return merged.drop_duplicates(subset=subset, keep='last')
+
+
+def make_capture_files(directory, files, captures, sample_rate, duration, freq=50, noise_level=0.2):
+    """Файлы в формате ответа /samples: строка на выборку, values - список"""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    start = datetime(2025, 1, 1)
+    paths = []
+    for i in range(files):
+        rows = []
+        for j in range(captures):
+            signal = np.sin(2 * np.pi * freq * (1 + 0.1 * np.random.randn()) * t)
+            signal += noise_level * np.random.randn(len(t))
+            rows.append({
+                'values': np.round(signal * 1000).astype(int).tolist(),
+                'timestamp': (start + timedelta(seconds=(i * captures + j) * duration)).isoformat(),
+                'sample_rate': sample_rate,
+                'resolution': 12,
+                'device_id': 'ESP32-BENCH',
+            })
+        path = os.path.join(directory, f'sample_{i:05d}.csv')
+        pd.DataFrame(rows).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run(files, captures, sample_rate, duration, long_samples):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # Для прежней реализации списки в CSV нужно разобрать так же, как для новой
+        frames = [pd.read_csv(p) for p in make_capture_files(directory, files, captures, sample_rate, duration)]
+        parsed = [df.assign(values=df['values'].map(lambda v: [int(x) for x in v.strip('[]').split(',')]))
+                  for df in frames]
+        legacy_time, legacy = timed(legacy_merge, parsed)
+        engine_time, engine = timed(merge_frames, frames)
+        assert len(legacy) == len(engine)
+        assert np.allclose(legacy['values'].astype(float).values, engine['values'].values)
+        assert (legacy['exact_timestamp'].values.astype('datetime64[us]')
+                == engine['exact_timestamp'].values.astype('datetime64[us]')).all()
+        results['captures'] = (len(engine), legacy_time, engine_time)
+
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            generate_synthetic_samples(num_samples=long_samples, sample_rate=sample_rate, duration=duration)
+            synthetic_dir = os.path.join('data', 'synthetic_samples')
+            frames = [pd.read_csv(os.path.join(synthetic_dir, f)) for f in sorted(os.listdir(synthetic_dir))
+                      if f.endswith('.csv')]
+        finally:
+            os.chdir(cwd)
+        legacy_time, legacy = timed(legacy_merge, frames)
+        engine_time, engine = timed(merge_frames, frames)
+        assert len(legacy) == len(engine)
+        results['long format'] = (len(engine), legacy_time, engine_time)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark merge_samples implementations')
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--captures', type=int, default=2, help='captures per file')
+    parser.add_argument('--sample-rate', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=80, help='capture length, seconds')
+    parser.add_argument('--long-samples', type=int, default=20, help='generate_samples.py files')
+    args = parser.parse_args()
+
+    results = run(args.files, args.captures, args.sample_rate, args.duration, args.long_samples)
+    for name, (rows, legacy_time, engine_time) in results.items():
+        print(f"{name:>12}: {rows} rows, legacy {legacy_time:.2f} s, vectorized {engine_time:.3f} s, "
+              f"x{legacy_time / engine_time:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""Замеры производительности всего конвейера с сохраненными базовыми значениями.
+
+Данные генерируются generate_samples.py во временном каталоге для каждого
+масштаба (SCALES). Для каждого случая (CASES) подготовка не входит в замер,
+функция выполняется --repeat раз, в результат идут медиана и минимум.
+Результаты сравниваются с базовыми значениями из JSON файла: если медиана
+выросла больше чем на --threshold, случай считается регрессией и скрипт
+завершается с кодом 1. Случаи, для которых нет зависимостей (fedot, cv2),
+пропускаются.
+
+    python bench_suite.py --scales small,medium --save      # записать базовые значения
+    python bench_suite.py --scales small,medium             # сравнить с ними
+    python bench_suite.py --cases merge,gap_fill --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from generate_samples import generate_synthetic_samples, wire_format
+from resampler import iter_chunks, resample_frames
+from sample_loader import list_sample_files, load_samples, sample_arrays
+from merge_engine import merge_chunk_maps
+from features import FeatureExtractor, featurize
+from plot_render import PLOT_TYPES, plot_data, render_png
+
+SCALES = {
+    'small': {'samples': 50, 'length': 1000, 'devices': 2, 'frame': (480, 640)},
+    'medium': {'samples': 500, 'length': 4000, 'devices': 5, 'frame': (720, 1280)},
+    'large': {'samples': 2000, 'length': 4000, 'devices': 20, 'frame': (1080, 1920)},
+}
+SAMPLE_RATE = 1000
+REPEAT = 5
+THRESHOLD = 0.2            # допустимый рост медианы относительно базового значения
+BASELINE_FILE = os.path.join('data', 'benchmarks', 'baseline.json')
+CAMERA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ROS2_image_to_web')
+
+CASES = OrderedDict()
+
+
+class Skip(Exception):
+    """Случай нельзя выполнить в этом окружении"""
+
+
+def case(name):
+    """Регистрирует подготовку случая: setup(workspace) -> функция для замера"""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class Workspace:
+    """Сгенерированные данные одного масштаба и результаты, общие для случаев"""
+
+    def __init__(self, root, scale, params):
+        self.root = root
+        self.scale = scale
+        self.params = params
+        self.samples_dir = os.path.join(root, 'data', 'samples')
+        self.shared = {}
+
+    def generate(self):
+        duration = self.params['length'] / SAMPLE_RATE
+        # Выборки устройства идут подряд, без пропусков: gap_fill заполняет только стыки
+        labels = generate_synthetic_samples(num_samples=self.params['samples'], sample_rate=SAMPLE_RATE,
+                                            duration=duration, devices=self.params['devices'],
+                                            formats=('csv', 'esp32-binary'), output_dir=self.samples_dir,
+                                            interval=duration, seed=0,
+                                            labels_db=os.path.join(self.root, 'data', 'labels.sqlite'))
+        self.labels = labels
+
+    def get(self, key, build):
+        if key not in self.shared:
+            self.shared[key] = build()
+        return self.shared[key]
+
+    def paths(self):
+        return list_sample_files(self.samples_dir)
+
+    def results(self):
+        return self.get('results', lambda: load_samples(self.paths(), progress=False))
+
+    def merged(self):
+        return self.get('merged', lambda: merge_chunk_maps(r['chunks'] for r in self.results()))
+
+
+def require(module):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise Skip(f'{module} is not installed')
+
+
+@case('ingest')
+def ingest_case(workspace):
+    paths = workspace.paths()
+    return lambda: load_samples(paths, progress=False)
+
+
+@case('wire_decode')
+def wire_decode_case(workspace):
+    wire = wire_format()
+    buffers = []
+    for name in sorted(os.listdir(workspace.samples_dir)):
+        if name.endswith('.bin'):
+            with open(os.path.join(workspace.samples_dir, name), 'rb') as f:
+                buffers.append(f.read())
+    return lambda: [wire.decode_capture(buffer) for buffer in buffers]
+
+
+@case('merge')
+def merge_case(workspace):
+    results = workspace.results()
+    return lambda: merge_chunk_maps(r['chunks'] for r in results)
+
+
+@case('gap_fill')
+def gap_fill_case(workspace):
+    merged = workspace.merged()
+    step_ns = 10 ** 9 // SAMPLE_RATE
+    return lambda: sum(len(grid) for _, grid, _ in resample_frames(iter_chunks(merged), step_ns, 'linear'))
+
+
+@case('featurize')
+def featurize_case(workspace):
+    loaded = [(sample_arrays(r)[1], r['metadata'].get('sample_rate')) for r in workspace.results()]
+    extractor = FeatureExtractor()
+    return lambda: featurize([v for v, _ in loaded], [rate for _, rate in loaded], extractor)
+
+
+def trainer_module(workspace):
+    """train_classifier импортирует fedot; конфигурация и данные - в каталоге масштаба"""
+    require('fedot')
+    import train_classifier
+    return train_classifier
+
+
+@case('preprocess')
+def preprocess_case(workspace):
+    train_classifier = trainer_module(workspace)
+    def run():
+        # Каждый запуск - с пустым датасетом и кэшем признаков
+        shutil.rmtree(os.path.join('data', 'processed'), ignore_errors=True)
+        train_classifier.DataPreprocessor().preprocess_samples()
+    return run
+
+
+@case('train')
+def train_case(workspace):
+    train_classifier = trainer_module(workspace)
+    workspace.get('preprocessed', lambda: train_classifier.DataPreprocessor().preprocess_samples())
+    trainer = train_classifier.TSClassifierTrainer()
+    features, labels = trainer.load_training_data()
+    return lambda: trainer.train_classifier(features, labels)
+
+
+def app_client(workspace):
+    """Тестовый клиент веб-приложения с обученной моделью"""
+    train_classifier = trainer_module(workspace)
+    def build():
+        train_classifier.DataPreprocessor().preprocess_samples()
+        trainer = train_classifier.TSClassifierTrainer()
+        trainer.train_classifier(*trainer.load_training_data())
+        import app
+        return app.app.test_client()
+    return workspace.get('client', build)
+
+
+@case('predict')
+def predict_case(workspace):
+    client = app_client(workspace)
+    sample_id = sorted(workspace.labels)[0]
+    def run():
+        # Признаки берутся из кэша, заполненного при обучении, как для уже загруженной выборки
+        response = client.post('/predict', data={'sample_id': sample_id})
+        assert response.status_code == 200, response.get_json()
+    return run
+
+
+@case('predict_batch')
+def predict_batch_case(workspace):
+    client = app_client(workspace)
+    sample_ids = sorted(workspace.labels)[:100]
+    def run():
+        response = client.post('/predict_batch', json={'sample_ids': sample_ids})
+        assert response.status_code == 200, response.get_json()
+    return run
+
+
+@case('plot')
+def plot_case(workspace):
+    times, values = sample_arrays(workspace.results()[0])
+    return lambda: [render_png(plot_type, plot_data(plot_type, times, values, SAMPLE_RATE))
+                    for plot_type in PLOT_TYPES]
+
+
+@case('camera_frame')
+def camera_frame_case(workspace):
+    require('cv2')
+    if CAMERA_DIR not in sys.path:
+        sys.path.append(CAMERA_DIR)
+    import camera_utils
+    height, width = workspace.params['frame']
+    frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    config = {'use_correction': True, 'enable_processing': True, 'gamma': 1.2, 'blur_kernel': 7}
+    calibration = {'camera_matrix': [[800, 0, width / 2], [0, 800, height / 2], [0, 0, 1]],
+                   'dist_coeffs': [-0.1, 0.05, 0.001, 0.002, 0.0]}
+    return lambda: camera_utils.process_frame(frame.copy(), config, calibration)
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {'median_s': float(np.median(timings)), 'min_s': float(np.min(timings)), 'repeat': repeat}
+
+
+def run(scales, cases, repeat=REPEAT):
+    """Результаты {'масштаб/случай': замер или {'skipped': причина}}"""
+    results = OrderedDict()
+    cwd = os.getcwd()
+    for scale in scales:
+        root = tempfile.mkdtemp(prefix=f'bench_{scale}_')
+        try:
+            shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'), root)
+            os.chdir(root)
+            workspace = Workspace(root, scale, SCALES[scale])
+            workspace.generate()
+            for name in cases:
+                key = f'{scale}/{name}'
+                try:
+                    function = CASES[name](workspace)
+                except Skip as e:
+                    results[key] = {'skipped': str(e)}
+                    print(f"{key:<28} skipped: {e}")
+                    continue
+                function()  # прогрев
+                results[key] = measure(function, repeat)
+                print(f"{key:<28} {results[key]['median_s'] * 1000:10.2f} ms")
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Сравнение с базовыми значениями. Возвращает список регрессий"""
+    regressions = []
+    print(f"\n{'case':<28} {'median ms':>10} {'baseline ms':>12} {'change':>8}")
+    for key, result in results.items():
+        if 'skipped' in result:
+            continue
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key:<28} {result['median_s'] * 1000:10.2f} {'-':>12} {'new':>8}")
+            continue
+        change = result['median_s'] / base['median_s'] - 1
+        status = 'REGRESSION' if change > threshold else ''
+        print(f"{key:<28} {result['median_s'] * 1000:10.2f} {base['median_s'] * 1000:12.2f} {change:+8.1%} {status}")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path, results):
+    """Дописывает результаты в файл базовых значений (пропущенные случаи не записываются)"""
+    baseline = load_baseline(path)
+    baseline.update((key, result) for key, result in results.items() if 'skipped' not in result)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                        'cpus': os.cpu_count()},
+            'saved_at': datetime.now().isoformat(),
+            'results': baseline,
+        }, f, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark suite')
+    parser.add_argument('--scales', default='small', help=f"comma separated: {', '.join(SCALES)}")
+    parser.add_argument('--cases', default=','.join(CASES), help='comma separated case names')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='allowed slowdown, 0.2 = 20%%')
+    parser.add_argument('--save', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--output', help='also write these results to a JSON file')
+    args = parser.parse_args()
+
+    scales = [s.strip() for s in args.scales.split(',') if s.strip()]
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    unknown = set(scales) - set(SCALES) | set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown scales or cases: {', '.join(sorted(unknown))}")
+
+    baseline_path = os.path.abspath(args.baseline)
+    results = run(scales, cases, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    if args.save:
+        save_baseline(baseline_path, results)
+        print(f"Базовые значения сохранены в {baseline_path}")
+        return
+
+    regressions = compare(results, load_baseline(baseline_path), args.threshold)
+    if regressions:
+        print(f"Регрессии больше {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,17 @@
 import requests
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
 import os
 import json
-from scipy import interpolate
 import configparser
+import sqlite3
+from sample_store import SampleStore
+from sample_catalog import SampleCatalog
+from merge_engine import NO_DEVICE, merge_chunk_maps
+from resampler import CHUNK_ROWS, iter_chunks, resample_frames, block_frame, to_step_ns
+from sample_loader import LOADER_CHUNKSIZE, list_sample_files, load_samples
 
 class APIDataCollector:
     def __init__(self, config_file='config.ini'):
@@ -28,7 +33,28 @@ class APIDataCollector:
         self.collection_interval = self.config.getint('Data', 'collection_interval', fallback=60)
         self.output_dir = self.config.get('Data', 'output_dir', fallback='data')
         self.samples_dir = os.path.join(self.output_dir, 'samples')
+        # Формат хранения выборок: csv (читают веб-приложение и обучение) или
+        # columnar (чанки .npz, см. sample_store.py) - только для объединения
+        self.storage = self.config.get('Data', 'storage', fallback='csv')
+        self.store = SampleStore(os.path.join(self.output_dir, 'store')) if self.storage == 'columnar' else None
+        # Каталог выборок веб-приложения (см. sample_catalog.py): новые CSV записываются сразу
+        self.catalog = SampleCatalog(self.config.get('Data', 'catalog_file',
+                                                     fallback=os.path.join(self.output_dir, 'catalog.sqlite')))
         self.merged_file = os.path.join(self.output_dir, 'merged_data.csv')
+        self.filled_file = os.path.join(self.output_dir, 'filled_data.csv')
+        # Инкрементальное объединение: водяной знак и хвост уже объединенных данных
+        self.watermark_file = os.path.join(self.output_dir, 'merge_watermark.json')
+        self.tail_file = os.path.join(self.output_dir, 'merged_tail.csv')
+        self.merge_overlap = self.config.getint('Data', 'merge_overlap', fallback=1000)
+        # Сколько циклов подряд повторять разбор файла с ошибкой, прежде чем пропустить его
+        self.merge_retries = self.config.getint('Data', 'merge_retries', fallback=3)
+        # Заполнение пропусков: шаг сетки, метод (linear, nearest, zoh) и максимальный пропуск
+        self.resample_freq = self.config.get('Data', 'resample_freq', fallback='1s')
+        self.fill_method = self.config.get('Data', 'fill_method', fallback='linear')
+        self.max_gap = self.config.get('Data', 'max_gap', fallback='') or None
+        # Параллельная загрузка файлов выборок (см. sample_loader.py), 0 - по числу ядер
+        self.loader_workers = self.config.getint('Data', 'loader_workers', fallback=0)
+        self.loader_chunksize = self.config.getint('Data', 'loader_chunksize', fallback=LOADER_CHUNKSIZE)
         
         # Создание директорий, если они не существуют
         os.makedirs(self.samples_dir, exist_ok=True)
@@ -36,12 +62,14 @@ class APIDataCollector:
         # Инициализация переменных для хранения данных
         self.merged_data = pd.DataFrame()
         self.last_timestamp = None
+        # Курсор /samples?since=: номер последней полученной выборки
+        self.cursor = None
         
-    def get_api_data(self, endpoint):
+    def get_api_data(self, endpoint, params=None):
         """Получение данных из API"""
         url = self.base_url + self.endpoints[endpoint]
         try:
-            response = requests.get(url)
+            response = requests.get(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -60,113 +88,210 @@ class APIDataCollector:
         print(f"Сохранено: {filepath}")
         return filepath
     
+    def save_sample(self, data):
+        """Сохранение ответа /samples в выбранном формате хранения"""
+        if self.storage == 'csv':
+            paths = [self.save_sample_to_csv(data)]
+            try:
+                self.catalog.add_files(paths)
+            except sqlite3.Error as e:
+                print(f"Ошибка записи в каталог выборок: {e}")
+            return paths
+        paths = self.store.write_chunk(data['samples'])
+        for path in paths:
+            print(f"Сохранено: {path}")
+        return paths
+
     def collect_samples(self):
         """Сбор заданного количества выборок"""
         samples_collected = 0
         sample_files = []
         
         while samples_collected < self.sample_size:
-            data = self.get_api_data('samples')
+            # Запрашиваем только выборки, появившиеся после предыдущего запроса
+            params = {'since': self.cursor} if self.cursor is not None else None
+            data = self.get_api_data('samples', params)
             if data and 'samples' in data:
-                sample_file = self.save_sample_to_csv(data)
-                sample_files.append(sample_file)
-                samples_collected += len(data['samples'])
+                self.cursor = data.get('cursor', self.cursor)
+                if data['samples']:
+                    sample_files.extend(self.save_sample(data))
+                    samples_collected += len(data['samples'])
             
             time.sleep(self.collection_interval)
         
         return sample_files
     
-    def merge_samples(self, sample_files=None):
-        """Объединение выборок в единый временной ряд"""
+    @staticmethod
+    def empty_watermark():
+        return {'processed': [], 'devices': {}, 'filled_until': {}, 'pending': [], 'failures': {}}
+    
+    def load_watermark(self):
+        """Объединенные файлы, последняя метка времени (нс) по каждому устройству,
+        отложенные файлы и число неудачных попыток разбора"""
+        watermark = self.empty_watermark()
+        if os.path.exists(self.watermark_file):
+            with open(self.watermark_file, 'r') as f:
+                watermark.update(json.load(f))
+        return watermark
+    
+    def save_watermark(self, watermark):
+        tmp_file = self.watermark_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(watermark, f, indent=4)
+        os.replace(tmp_file, self.watermark_file)
+    
+    @staticmethod
+    def file_key(path):
+        """Часть имени после префикса sample_/chunk_ (водяной знак прежнего формата, last_file)"""
+        name = os.path.splitext(os.path.basename(path))[0]
+        return name.split('_', 1)[1] if '_' in name else name
+    
+    def file_id(self, path):
+        """Идентификатор файла в водяном знаке: путь относительно output_dir"""
+        return os.path.relpath(path, self.output_dir)
+    
+    def file_order(self, path):
+        """Порядок обработки новых файлов: время изменения, затем имя.
+        
+        В каталоге лежат chunk_*, sample_<время> и sample_<имя загруженного файла>,
+        поэтому по одному имени файлы не упорядочить.
+        """
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = 0
+        return mtime, os.path.basename(path)
+    
+    def load_tail(self):
+        """Последние строки объединенных данных для перекрытия при заполнении пропусков"""
+        if not os.path.exists(self.tail_file):
+            return pd.DataFrame()
+        tail = pd.read_csv(self.tail_file)
+        for col in ['timestamp', 'exact_timestamp']:
+            if col in tail.columns:
+                tail[col] = pd.to_datetime(tail[col])
+        return tail
+    
+    def merge_samples(self, sample_files=None, incremental=True):
+        """Объединение выборок в единый временной ряд.
+        
+        В инкрементальном режиме обрабатываются только файлы, которых нет в списке
+        объединенных (processed в водяном знаке),
+        новые данные дописываются в merged_data.csv, а self.merged_data содержит
+        хвост предыдущих данных (merge_overlap строк) и новые данные.
+        
+        Если файл не разобран (например, еще дописывается), он и все следующие
+        файлы откладываются до следующего вызова: иначе более новые отсчеты
+        сдвинули бы водяной знак устройства и данные этого файла были бы отброшены.
+        Файл, не разобранный merge_retries раз подряд, пропускается.
+        """
+        watermark = self.load_watermark() if incremental else self.empty_watermark()
         if sample_files is None:
-            sample_files = [os.path.join(self.samples_dir, f) for f in os.listdir(self.samples_dir) 
-                          if f.startswith('sample_') and f.endswith('.csv')]
+            sample_files = list_sample_files(self.samples_dir)
+            if self.store is not None:
+                sample_files += self.store.chunks()
+        processed = set(watermark['processed'])
+        legacy_last_file = watermark.pop('last_file', '')
+        if legacy_last_file:
+            # Водяной знак прежнего формата: объединенными считаются файлы не новее last_file
+            processed.update(self.file_id(f) for f in sample_files if self.file_key(f) <= legacy_last_file)
+        # Отложенные файлы идут первыми в прежнем порядке, за ними новые
+        pending = [f for f in watermark['pending'] if os.path.exists(f)]
+        skip = processed | {self.file_id(f) for f in pending}
+        new_files = {f for f in sample_files if self.file_id(f) not in skip}
+        sample_files = pending + sorted(new_files, key=self.file_order)
         
-        all_data = []
+        # Файлы разбираются параллельно в типизированные фрагменты (см. sample_loader.py)
+        results = load_samples(sample_files, self.loader_workers, self.loader_chunksize, store=self.store)
+        loaded = []
+        consumed = 0
+        for path, result in zip(sample_files, results):
+            if 'error' in result:
+                key = self.file_id(path)
+                attempts = watermark['failures'][key] = watermark['failures'].get(key, 0) + 1
+                print(f"Ошибка при обработке файла {path}: {result['error']} (попытка {attempts})")
+                if attempts < self.merge_retries:
+                    break
+                print(f"Файл {path} пропущен после {attempts} попыток")
+                del watermark['failures'][key]
+            else:
+                watermark['failures'].pop(self.file_id(path), None)
+                loaded.append(result)
+            consumed += 1
+        watermark['pending'] = sample_files[consumed:]
+        processed.update(self.file_id(path) for path in sample_files[:consumed])
+        # Удаленные файлы больше не появятся, список не растет бесконечно
+        watermark['processed'] = sorted(f for f in processed if os.path.exists(os.path.join(self.output_dir, f)))
         
-        for file in sample_files:
-            try:
-                df = pd.read_csv(file)
-                # Преобразование данных из списков в отдельные строки
-                df_exploded = df.explode('values')
-                df_exploded['timestamp'] = pd.to_datetime(df_exploded['timestamp'])
-                
-                # Рассчет временных меток для каждого значения в выборке
-                sample_rate = df_exploded['sample_rate'].iloc[0]
-                time_delta = 1 / sample_rate
-                
-                # Создание временных меток для каждого значения
-                timestamps = []
-                for _, group in df_exploded.groupby('timestamp'):
-                    start_time = group['timestamp'].iloc[0]
-                    times = [start_time + timedelta(seconds=i*time_delta) for i in range(len(group))]
-                    timestamps.extend(times)
-                
-                df_exploded['exact_timestamp'] = timestamps
-                all_data.append(df_exploded)
-            except Exception as e:
-                print(f"Ошибка при обработке файла {file}: {e}")
+        # Метки времени отсчетов, слияние отсортированных файлов и удаление
+        # дубликатов выполняются векторно (см. merge_engine.py)
+        merged = merge_chunk_maps(r['chunks'] for r in loaded)
+        # Столбец device_id есть всегда (пустой для выборок без устройства): схема
+        # дописываемого merged_data.csv не зависит от устройств в пакете
+        if 'device_id' not in merged.columns:
+            merged.insert(merged.columns.get_loc('exact_timestamp'), 'device_id', NO_DEVICE)
         
-        if not all_data:
-            print("Нет данных для объединения")
+        # Отбрасываем отсчеты, которые уже есть в объединенных данных
+        devices = merged['device_id'].astype(str)
+        times = merged['exact_timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        limits = devices.map(watermark['devices']).fillna(np.iinfo(np.int64).min).values.astype(np.int64)
+        merged = merged[times > limits]
+        if merged.empty:
+            print("Нет новых данных для объединения")
+            self.save_watermark(watermark)
             return
         
-        merged = pd.concat(all_data).sort_values('exact_timestamp')
+        # Дописывание новых данных
+        append = incremental and os.path.exists(self.merged_file)
+        merged.to_csv(self.merged_file, mode='a' if append else 'w', header=not append, index=False)
+        print(f"Объединенные данные сохранены в {self.merged_file} (+{len(merged)} строк)")
         
-        # Удаление дубликатов (если есть)
-        merged = merged.drop_duplicates(subset=['exact_timestamp', 'device_id'], keep='last')
+        new_times = merged['exact_timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        for device, last in pd.Series(new_times).groupby(devices.loc[merged.index].values).max().items():
+            watermark['devices'][device] = int(max(last, watermark['devices'].get(device, last)))
+        self.last_timestamp = merged['exact_timestamp'].max()
         
-        # Сохранение объединенных данных
-        merged.to_csv(self.merged_file, index=False)
-        print(f"Объединенные данные сохранены в {self.merged_file}")
-        
-        self.merged_data = merged
+        tail = self.load_tail() if incremental else pd.DataFrame()
+        self.merged_data = pd.concat([tail, merged], ignore_index=True) if not tail.empty else merged
+        self.merged_data.tail(self.merge_overlap).to_csv(self.tail_file, index=False)
+        self.save_watermark(watermark)
         return merged
     
-    def fill_missing_data(self, resample_freq='1S', method='linear'):
-        """Заполнение пропущенных данных с помощью аппроксимации"""
+    def fill_missing_data(self, resample_freq=None, method=None, max_gap=None, chunk_rows=CHUNK_ROWS):
+        """Заполнение пропущенных данных передискретизацией на регулярную сетку.
+        
+        Данные обрабатываются фрагментами по chunk_rows строк (см. resampler.py),
+        время - целые наносекунды. В filled_data.csv дописываются только точки
+        после уже заполненного интервала каждого устройства. Возвращает число строк.
+        """
         if self.merged_data.empty:
             print("Нет данных для обработки. Сначала выполните объединение выборок.")
             return None
         
-        # Создание регулярного временного ряда
-        min_time = self.merged_data['exact_timestamp'].min()
-        max_time = self.merged_data['exact_timestamp'].max()
-        full_range = pd.date_range(start=min_time, end=max_time, freq=resample_freq)
-        
-        # Подготовка данных для интерполяции
-        timestamps = self.merged_data['exact_timestamp'].values.astype(np.int64) // 10**9
-        values = self.merged_data['values'].values
-        
-        # Создание функции интерполяции
-        interp_func = interpolate.interp1d(
-            timestamps, 
-            values, 
-            kind=method, 
-            fill_value='extrapolate'
-        )
-        
-        # Применение интерполяции
-        full_timestamps = full_range.values.astype(np.int64) // 10**9
-        interpolated_values = interp_func(full_timestamps)
-        
-        # Создание DataFrame с заполненными данными
-        filled_data = pd.DataFrame({
-            'timestamp': full_range,
-            'values': interpolated_values
-        })
-        
-        # Добавление метаданных (берем из последней записи)
-        for col in ['sample_rate', 'resolution', 'device_id']:
-            if col in self.merged_data.columns:
-                filled_data[col] = self.merged_data[col].iloc[0]
-        
-        # Сохранение результатов
-        filled_file = os.path.join(self.output_dir, 'filled_data.csv')
-        filled_data.to_csv(filled_file, index=False)
-        print(f"Данные с заполненными пропусками сохранены в {filled_file}")
-        
-        return filled_data
+        step_ns = to_step_ns(resample_freq or self.resample_freq)
+        max_gap = max_gap or self.max_gap
+        max_gap_ns = to_step_ns(max_gap) if max_gap else None
+        
+        # Продолжаем сетку каждого устройства со следующей точки после заполненной
+        watermark = self.load_watermark()
+        filled_until = watermark.get('filled_until') or {}
+        start_ns = {device: until + step_ns for device, until in filled_until.items()}
+        
+        append = bool(filled_until) and os.path.exists(self.filled_file)
+        written = 0
+        for device, grid, values in resample_frames(iter_chunks(self.merged_data, chunk_rows), step_ns,
+                                                    method or self.fill_method, max_gap_ns, start_ns):
+            block_frame(device, grid, values).to_csv(self.filled_file, mode='a' if append else 'w',
+                                                     header=not append, index=False)
+            append = True
+            written += len(grid)
+            filled_until[device] = int(grid[-1])
+        
+        if written:
+            print(f"Данные с заполненными пропусками сохранены в {self.filled_file} (+{written} строк)")
+            watermark['filled_until'] = filled_until
+            self.save_watermark(watermark)
+        return written
     
     def run(self):
         """Основной цикл сбора и обработки данных"""
@@ -200,7 +325,15 @@ if __name__ == "__main__":
         config['Data'] = {
             'sample_size': '100',
             'collection_interval': '60',
-            'output_dir': 'data'
+            'output_dir': 'data',
+            'storage': 'csv',
+            'merge_overlap': '1000',
+            'merge_retries': '3',
+            'resample_freq': '1s',
+            'fill_method': 'linear',
+            'max_gap': '',
+            'loader_workers': '0',
+            'loader_chunksize': '16'
         }
         
         with open('config.ini', 'w') as configfile:
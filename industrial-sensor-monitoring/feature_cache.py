@@ -0,0 +1,111 @@
+"""Постоянный кэш признаков выборок (SQLite).
+
+Запись кэша привязана к идентификатору выборки, версии набора признаков,
+а также mtime/размеру и SHA-1 содержимого файла. Если mtime или размер
+изменились, сверяется хэш: файл, который только перезаписали тем же
+содержимым, не пересчитывается. Версия - FeatureExtractor.version: при
+изменении кода или конфигурации признаков все записи считаются устаревшими.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+from sample_loader import sample_id
+
+HASH_BLOCK = 1 << 20
+QUERY_BATCH = 500          # идентификаторов в одном запросе IN (...)
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS features (
+                    sample_id TEXT PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha1 TEXT NOT NULL,
+                    features TEXT NOT NULL
+                )""")
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        return closing(db)
+
+    def lookup(self, paths):
+        """Разделяет файлы на найденные в кэше и требующие расчета.
+
+        Возвращает ({sample_id: признаки}, [пути для расчета]).
+        """
+        paths = list(paths)
+        keys = [sample_id(path) for path in paths]
+        rows = {}
+        with self.connect() as db:
+            for start in range(0, len(keys), QUERY_BATCH):
+                batch = keys[start:start + QUERY_BATCH]
+                rows.update((row[0], row[1:]) for row in db.execute(
+                    'SELECT sample_id, version, mtime_ns, size, sha1, features FROM features '
+                    f'WHERE sample_id IN ({",".join("?" * len(batch))})', batch))
+
+        hits, misses, touched = {}, [], []
+        for path in paths:
+            key = sample_id(path)
+            stat = os.stat(path)
+            row = rows.get(key)
+            if row is None or row[0] != self.version:
+                misses.append(path)
+                continue
+            version, mtime_ns, size, sha1, features = row
+            if (mtime_ns, size) != (stat.st_mtime_ns, stat.st_size):
+                # Файл перезаписан: пересчет нужен, только если изменилось содержимое
+                if size != stat.st_size or file_hash(path) != sha1:
+                    misses.append(path)
+                    continue
+                touched.append((stat.st_mtime_ns, stat.st_size, key))
+            hits[key] = json.loads(features)
+
+        if touched:
+            with self.lock, self.connect() as db, db:
+                db.executemany('UPDATE features SET mtime_ns = ?, size = ? WHERE sample_id = ?', touched)
+        return hits, misses
+
+    def get(self, path):
+        """Признаки файла из кэша или None"""
+        hits, _ = self.lookup([path])
+        return hits.get(sample_id(path))
+
+    def store(self, items):
+        """Сохраняет признаки: items - пары (путь к файлу, словарь признаков)"""
+        records = []
+        for path, features in items:
+            stat = os.stat(path)
+            records.append((sample_id(path), self.version, stat.st_mtime_ns, stat.st_size,
+                            file_hash(path), json.dumps(features)))
+        if records:
+            with self.lock, self.connect() as db, db:
+                db.executemany('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?)', records)
+
+    def prune(self, sample_ids):
+        """Удаляет записи выборок, которых больше нет"""
+        keep = set(sample_ids)
+        with self.lock, self.connect() as db, db:
+            stale = [(key,) for (key,) in db.execute('SELECT sample_id FROM features') if key not in keep]
+            db.executemany('DELETE FROM features WHERE sample_id = ?', stale)
+        return len(stale)
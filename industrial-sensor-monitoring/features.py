@@ -0,0 +1,141 @@
+"""Векторный расчет признаков выборок для обучения и предсказания.
+
+Признаки считаются сразу для пакета выборок одинаковой длины - массива
+(n_samples, length): статистики, энергии частотных полос, спектральный
+центроид и пиковая частота по rfft, относительные энергии поддиапазонов
+DWT (pywt.wavedec по оси 1). Выборки разной длины группируются функцией
+featurize. Набор признаков задается словарем конфигурации; он сохраняется
+вместе с моделью, поэтому /predict считает те же признаки, что и обучение.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pywt
+from scipy.fft import rfft, rfftfreq
+
+FEATURE_VERSION = 2
+DEFAULT_SAMPLE_RATE = 1000
+
+STATISTICS = ('mean', 'std', 'min', 'max', 'rms', 'peak_to_peak', 'crest_factor', 'skewness', 'kurtosis')
+SPECTRAL = ('centroid', 'peak_frequency')
+
+DEFAULT_FEATURES = {
+    'statistics': list(STATISTICS),
+    # Число равных полос до частоты Найквиста или список границ полос в Гц
+    'bands': 8,
+    'spectral': list(SPECTRAL),
+    'wavelet': 'db4',
+    'wavelet_level': 4,
+}
+
+# Прежний набор из четырех статистик: модели, обученные до features.json
+LEGACY_FEATURES = {
+    'statistics': ['mean', 'std', 'max', 'min'],
+    'bands': 0,
+    'spectral': [],
+    'wavelet': None,
+}
+
+
+def _safe_divide(a, b):
+    return np.divide(a, b, out=np.zeros_like(a, dtype=np.float64), where=b > 0)
+
+
+class FeatureExtractor:
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_FEATURES, **(config or {})}
+        unknown = set(self.config['statistics']) - set(STATISTICS) | set(self.config['spectral']) - set(SPECTRAL)
+        if unknown:
+            raise ValueError(f"Неизвестные признаки: {', '.join(sorted(unknown))}")
+        # Версия для кэша признаков: меняется вместе с кодом или конфигурацией
+        digest = hashlib.sha1(json.dumps(self.config, sort_keys=True).encode()).hexdigest()[:8]
+        self.version = f'{FEATURE_VERSION}-{digest}'
+        self.names = self._names()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.config, f, indent=4)
+
+    def _names(self):
+        names = list(self.config['statistics'])
+        bands = self.config['bands']
+        if isinstance(bands, int):
+            names += [f'band_{i}' for i in range(bands)]
+        else:
+            names += [f'band_{lo:g}_{hi:g}' for lo, hi in zip(bands[:-1], bands[1:])]
+        names += [f'spectral_{name}' for name in self.config['spectral']]
+        if self.config['wavelet']:
+            level = self.config['wavelet_level']
+            names += [f'dwt_a{level}'] + [f'dwt_d{i}' for i in range(level, 0, -1)]
+        return names
+
+    def transform(self, batch, sample_rate=DEFAULT_SAMPLE_RATE):
+        """Признаки пакета (n_samples, length) -> массив (n_samples, len(names))"""
+        x = np.atleast_2d(np.asarray(batch, dtype=np.float64))
+        columns = []
+
+        mean = x.mean(axis=1)
+        centered = x - mean[:, None]
+        var = (centered ** 2).mean(axis=1)
+        std = np.sqrt(var)
+        rms = np.sqrt((x ** 2).mean(axis=1))
+        statistics = {
+            'mean': lambda: mean,
+            'std': lambda: std,
+            'min': lambda: x.min(axis=1),
+            'max': lambda: x.max(axis=1),
+            'rms': lambda: rms,
+            'peak_to_peak': lambda: np.ptp(x, axis=1),
+            'crest_factor': lambda: _safe_divide(np.abs(x).max(axis=1), rms),
+            'skewness': lambda: _safe_divide((centered ** 3).mean(axis=1), std ** 3),
+            'kurtosis': lambda: _safe_divide((centered ** 4).mean(axis=1), var ** 2) - 3 * (var > 0),
+        }
+        columns += [statistics[name]() for name in self.config['statistics']]
+
+        # Спектр мощности центрированного сигнала
+        length = x.shape[1]
+        power = np.abs(rfft(centered, axis=1)) ** 2 / length ** 2
+        # Односторонний спектр: сумма по полосам равна дисперсии сигнала
+        power[:, 1:(length + 1) // 2] *= 2
+        freqs = rfftfreq(length, 1 / sample_rate)
+        bands = self.config['bands']
+        if isinstance(bands, int):
+            edges = np.linspace(0, sample_rate / 2, bands + 1)
+            edges[-1] = np.inf
+        else:
+            edges = np.asarray(bands, dtype=np.float64)
+        # Суммы по полосам через накопленную сумму по частотам
+        cumulative = np.concatenate([np.zeros((len(x), 1)), np.cumsum(power, axis=1)], axis=1)
+        positions = np.searchsorted(freqs, edges, side='left')
+        columns += list((cumulative[:, positions[1:]] - cumulative[:, positions[:-1]]).T)
+
+        total = power.sum(axis=1)
+        spectral = {
+            'centroid': lambda: _safe_divide(power @ freqs, total),
+            'peak_frequency': lambda: freqs[np.argmax(power, axis=1)],
+        }
+        columns += [spectral[name]() for name in self.config['spectral']]
+
+        if self.config['wavelet']:
+            coeffs = pywt.wavedec(x, self.config['wavelet'], level=self.config['wavelet_level'], axis=1)
+            energies = np.stack([(c ** 2).sum(axis=1) for c in coeffs], axis=1)
+            columns += list(_safe_divide(energies, energies.sum(axis=1, keepdims=True)).T)
+
+        return np.column_stack(columns)
+
+
+def featurize(arrays, sample_rates, extractor):
+    """Признаки выборок разной длины: группы одинаковой длины и частоты считаются одним пакетом"""
+    result = np.empty((len(arrays), len(extractor.names)))
+    groups = {}
+    for i, (values, rate) in enumerate(zip(arrays, sample_rates)):
+        groups.setdefault((len(values), rate or DEFAULT_SAMPLE_RATE), []).append(i)
+    for (_, rate), positions in groups.items():
+        result[positions] = extractor.transform(np.stack([arrays[i] for i in positions]), rate)
+    return result
@@ -1,78 +1,397 @@
+"""Генерация синтетических выборок для обучения и нагрузочных замеров.
+
+Выборки считаются пакетами - массивами (n_samples, length) - в процессах
+общего пула (sample_loader.get_pool), каждый пакет сразу пишется на диск.
+Классы неисправностей с истинными метками (labels.json рядом с выборками,
+формат прежнего labels.json, и хранилище меток label_store.py, автор generator):
+
+    0 normal     зашумленная синусоида
+    1 harmonics  добавлены 3-я и 5-я гармоники
+    2 bearing    периодические затухающие импульсы (дефект подшипника)
+    3 drift      линейный дрейф амплитуды и смещения
+
+Форматы: csv (как раньше, одно значение в строке), store (колоночное
+хранилище sample_store.py), esp32-json и esp32-binary (формат ответа
+/get_data прошивки, см. wirenboard_data_collector/wire_format.py).
+
+    python generate_samples.py --num-samples 100000 --devices 50 --formats store,esp32-binary
+    python generate_samples.py --replay --devices 5 --rate 10 --mqtt-host localhost
+
+В режиме --replay выборки не пишутся на диск: локальный HTTP сервер отдает
+последнюю выборку каждого устройства по /<device_id>/get_data, а о новой
+выборке сообщается в MQTT так же, как это делает ESP32 (URL/<id>, Data/<id>).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import numpy as np
 import pandas as pd
-import os
-from datetime import datetime, timedelta
-import json
 
-def generate_synthetic_samples(num_samples=100, sample_rate=1000, duration=1, freq=50, noise_level=0.2):
+from label_store import LabelStore
+from sample_loader import get_pool
+from sample_store import SampleStore
+
+FAULT_CLASSES = ('normal', 'harmonics', 'bearing', 'drift')
+FORMATS = ('csv', 'store', 'esp32-json', 'esp32-binary')
+BATCH_SIZE = 256           # выборок в одной задаче пула
+CAPTURE_INTERVAL = 60      # секунд между выборками одного устройства
+RESOLUTION = 12            # разрядность АЦП для форматов ESP32
+ADC_SCALE = 600            # отсчетов АЦП на единицу амплитуды сигнала
+WIRE_FORMAT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wirenboard_data_collector')
+
+
+def wire_format():
+    """Кодирование кадров ESP32 - общий модуль wirenboard_data_collector"""
+    if WIRE_FORMAT_DIR not in sys.path:
+        sys.path.append(WIRE_FORMAT_DIR)
+    import wire_format
+    return wire_format
+
+
+def synthesize(rng, classes, length, sample_rate, freq=50, noise_level=0.2):
+    """Пакет сигналов (len(classes), length) заданных классов неисправностей.
+
+    Возвращает сигналы и основные частоты выборок.
+    """
+    n = len(classes)
+    t = np.arange(length) / sample_rate
+    frequency = freq * (1 + 0.1 * rng.standard_normal(n))  # ±10% вариация частоты
+    phase = 2 * np.pi * frequency[:, None] * t + rng.uniform(0, 2 * np.pi, (n, 1))
+    signal = np.sin(phase)
+
+    harmonics = classes == FAULT_CLASSES.index('harmonics')
+    if harmonics.any():
+        amplitudes = rng.uniform(0.15, 0.4, (harmonics.sum(), 2))
+        signal[harmonics] += (amplitudes[:, :1] * np.sin(3 * phase[harmonics])
+                              + amplitudes[:, 1:] * np.sin(5 * phase[harmonics]))
+
+    bearing = classes == FAULT_CLASSES.index('bearing')
+    if bearing.any():
+        # Время с последнего удара для частоты дефекта 80-160 Гц, затухающий резонанс 250-400 Гц
+        fault = rng.uniform(80, 160, (bearing.sum(), 1))
+        resonance = np.minimum(rng.uniform(250, 400, (bearing.sum(), 1)), sample_rate / 2.5)
+        since = (t * fault % 1) / fault
+        signal[bearing] += (rng.uniform(0.8, 1.5, (bearing.sum(), 1)) * np.exp(-since * 800)
+                            * np.sin(2 * np.pi * resonance * since))
+
+    drift = classes == FAULT_CLASSES.index('drift')
+    if drift.any():
+        ramp = t / t[-1] if length > 1 else t
+        signal[drift] *= 1 + rng.uniform(0.3, 0.8, (drift.sum(), 1)) * ramp
+        signal[drift] += rng.uniform(-0.5, 0.5, (drift.sum(), 1)) * ramp
+
+    signal += noise_level * rng.standard_normal((n, length))
+    return signal, frequency
+
+
+def adc_codes(signal):
+    """Сигнал -> 12-битные отсчеты АЦП вокруг середины шкалы"""
+    middle = 2 ** (RESOLUTION - 1)
+    return np.clip(np.rint(middle + signal * ADC_SCALE), 0, 2 ** RESOLUTION - 1).astype(np.uint16)
+
+
+def esp32_capture(rng, signal, noise_level, sample_rate, timestamp, device_id):
+    """Выборка ESP32: канал тока - сигнал, микрофон и вибрация - тот же сигнал с отдельным шумом"""
+    channels = [adc_codes(signal)] + [adc_codes(signal + noise_level * rng.standard_normal(len(signal)))
+                                      for _ in wire_format().CHANNELS[1:]]
+    metadata = {'sample_rate': int(sample_rate), 'resolution': RESOLUTION,
+                'timestamp': timestamp, 'device_id': device_id}
+    return metadata, channels
+
+
+def esp32_json(metadata, channels):
+    """Тело JSON-ответа /get_data"""
+    return json.dumps({**{name: values.tolist() for name, values in zip(wire_format().CHANNELS, channels)},
+                       'metadata': metadata}).encode()
+
+
+def device_name(index):
+    return f'SIM-{index:04d}'
+
+
+def generate_batch(task):
+    """Генерация и запись одного пакета. Выполняется в процессе пула.
+
+    Возвращает истинные метки: список (sample_id, device_id, метка, частота).
+    """
+    (first, count, seed, output_dir, formats, devices, per_device, probabilities,
+     sample_rate, duration, freq, noise_level, end_ns, interval_ns) = task
+    rng = np.random.default_rng(seed)
+    length = int(sample_rate * duration)
+    classes = rng.choice(len(FAULT_CLASSES), count, p=probabilities)
+    signals, frequencies = synthesize(rng, classes, length, sample_rate, freq, noise_level)
+
+    # Устройства по кругу; выборки каждого устройства идут с шагом interval_ns до end_ns
+    indices = np.arange(first, first + count)
+    starts = end_ns - (per_device - indices // devices) * interval_ns
+    offsets = (np.arange(length) * (1e9 / sample_rate)).astype(np.int64)
+
+    truth, samples = [], []
+    for i in range(count):
+        device = device_name(indices[i] % devices)
+        start = pd.Timestamp(int(starts[i]))
+        name = f"sample_{start.strftime('%Y%m%d_%H%M%S')}_{device}_{indices[i]:08d}"
+        label = int(classes[i])
+        truth.append((name, device, label, float(frequencies[i])))
+
+        if 'csv' in formats:
+            timestamps = np.datetime_as_string((starts[i] + offsets).astype('datetime64[ns]'), unit='us')
+            pd.DataFrame({
+                'timestamp': timestamps,
+                'values': signals[i],
+                'sample_rate': sample_rate,
+                'frequency': frequencies[i],
+                'noise_level': noise_level,
+                'device_id': device,
+                'label': label,
+            }).to_csv(os.path.join(output_dir, f'{name}.csv'), index=False)
+
+        if 'esp32-json' in formats or 'esp32-binary' in formats:
+            metadata, channels = esp32_capture(rng, signals[i], noise_level, sample_rate, start.isoformat(), device)
+            if 'esp32-json' in formats:
+                with open(os.path.join(output_dir, f'{name}.json'), 'wb') as f:
+                    f.write(esp32_json(metadata, channels))
+            if 'esp32-binary' in formats:
+                with open(os.path.join(output_dir, f'{name}.bin'), 'wb') as f:
+                    f.write(wire_format().encode_capture(channels, **metadata))
+
+        if 'store' in formats:
+            samples.append({
+                'sample_id': name,
+                'device_id': device,
+                'timestamp': start.isoformat(),
+                'sample_rate': sample_rate,
+                'label': label,
+                'values': signals[i].astype(np.float32),
+            })
+
+    if samples:
+        SampleStore(os.path.join(output_dir, 'store')).write_chunk(samples, f'chunk_synthetic_{first:010d}')
+    return truth
+
+
+def parse_faults(text):
+    """'normal=0.7,bearing=0.3' -> вероятности в порядке FAULT_CLASSES"""
+    if not text:
+        return np.full(len(FAULT_CLASSES), 1 / len(FAULT_CLASSES))
+    weights = dict.fromkeys(FAULT_CLASSES, 0.0)
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in weights:
+            raise ValueError(f"Неизвестный класс {name}; доступны: {', '.join(FAULT_CLASSES)}")
+        weights[name.strip()] = float(weight or 1)
+    probabilities = np.array(list(weights.values()))
+    return probabilities / probabilities.sum()
+
+
+def generate_synthetic_samples(num_samples=100, sample_rate=1000, duration=1, freq=50, noise_level=0.2,
+                               devices=1, faults=None, formats=('csv',), output_dir='data/synthetic_samples',
+                               workers=0, batch_size=BATCH_SIZE, interval=CAPTURE_INTERVAL, seed=None,
+                               labels_db=None):
     """
-    Генерация синтетических семплов с зашумленной синусоидой
-    
+    Генерация синтетических семплов с классами неисправностей
+
     Параметры:
     - num_samples: количество семплов для генерации
     - sample_rate: частота дискретизации (Гц)
     - duration: длительность семпла (сек)
     - freq: частота синусоиды (Гц)
     - noise_level: уровень шума (от 0 до 1)
+    - devices: число имитируемых устройств
+    - faults: доли классов, 'normal=0.7,bearing=0.3' (по умолчанию поровну)
+    - formats: форматы вывода из FORMATS
+    - workers: процессов пула, 0 - по числу ядер
+    - interval: секунд между выборками одного устройства
+    - labels_db: хранилище меток (label_store.py), в которое записываются истинные метки;
+      None - только labels.json в output_dir (рабочее хранилище не изменяется)
     """
-    # Создаем директорию для сохранения, если ее нет
-    os.makedirs('data/synthetic_samples', exist_ok=True)
-    
-    # Метаданные для сохранения
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Неизвестные форматы: {', '.join(sorted(unknown))}")
+    os.makedirs(output_dir, exist_ok=True)
+    probabilities = parse_faults(faults)
+    end_ns = pd.Timestamp(datetime.now()).value
+    seeds = np.random.SeedSequence(seed).generate_state(-(-num_samples // batch_size))
+
+    per_device = -(-num_samples // devices)
+    tasks = [(first, min(batch_size, num_samples - first), int(batch_seed), output_dir, tuple(formats), devices,
+              per_device, probabilities, sample_rate, duration, freq, noise_level, end_ns, int(interval * 1e9))
+             for first, batch_seed in zip(range(0, num_samples, batch_size), seeds)]
+    started = time.time()
+    results = map(generate_batch, tasks) if workers == 1 or len(tasks) < 2 else get_pool(workers).map(generate_batch, tasks)
+
+    labels = {}
+    counts = dict.fromkeys(FAULT_CLASSES, 0)
+    for done, truth in enumerate(results, 1):
+        for name, _, label, _ in truth:
+            labels[name] = label
+            counts[FAULT_CLASSES[label]] += 1
+        if done % max(1, len(tasks) // 10) == 0:
+            print(f"Сгенерировано {len(labels)}/{num_samples} семплов за {time.time() - started:.1f} с")
+
+    # Метаданные и истинные метки
     metadata = {
         'num_samples': num_samples,
         'sample_rate': sample_rate,
         'duration': duration,
         'base_frequency': freq,
         'noise_level': noise_level,
+        'devices': devices,
+        'classes': list(FAULT_CLASSES),
+        'class_counts': counts,
+        'formats': list(formats),
         'generated_at': datetime.now().isoformat()
     }
-    
-    # Генерируем временную ось
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    
-    for i in range(num_samples):
-        # Генерация синусоиды с небольшим случайным отклонением частоты
-        current_freq = freq * (1 + 0.1 * np.random.randn())  # ±10% вариация частоты
-        sine_wave = np.sin(2 * np.pi * current_freq * t)
-        
-        # Добавляем шум
-        noise = noise_level * np.random.randn(len(t))
-        signal = sine_wave + noise
-        
-        # Создаем временные метки
-        start_time = datetime.now() - timedelta(days=num_samples - i)
-        timestamps = [start_time + timedelta(seconds=dt) for dt in t]
-        
-        # Создаем DataFrame
-        df = pd.DataFrame({
-            'timestamp': timestamps,
-            'values': signal,
-            'sample_rate': sample_rate,
-            'frequency': current_freq,
-            'noise_level': noise_level
-        })
-        
-        # Сохраняем в CSV
-        filename = f"sample_{start_time.strftime('%Y%m%d_%H%M%S')}.csv"
-        df.to_csv(f'data/synthetic_samples/{filename}', index=False)
-    
-    # Сохраняем метаданные
-    with open('data/synthetic_samples/metadata.json', 'w') as f:
+    with open(os.path.join(output_dir, 'metadata.json'), 'w') as f:
         json.dump(metadata, f, indent=2)
-    
-    print(f"Сгенерировано {num_samples} семплов в папке data/synthetic_samples")
+    with open(os.path.join(output_dir, 'labels.json'), 'w') as f:
+        json.dump(labels, f)
+    if labels_db:
+        # labels.json рядом с хранилищем переносится первым, как при запуске веб-приложения
+        store = LabelStore(labels_db, legacy_json=os.path.join(os.path.dirname(labels_db), 'labels.json'))
+        store.set_many(labels, annotator='generator')
+        print(f"Истинные метки записаны в {labels_db}")
 
-if __name__ == "__main__":
-    # Генерация 100 семплов:
-    # - Частота дискретизации 1000 Гц
-    # - Длительность 1 секунда
-    # - Основная частота 50 Гц
-    # - Уровень шума 20%
+    print(f"Сгенерировано {num_samples} семплов в папке {output_dir} за {time.time() - started:.1f} с")
+    return labels
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # {device_id: (json, binary)} - последняя выборка устройства в обоих форматах
+    captures = {}
+
+    def do_GET(self):
+        device, _, endpoint = self.path.strip('/').partition('/')
+        bodies = self.captures.get(device)
+        if endpoint != 'get_data' or bodies is None:
+            self.send_error(404, "Not found")
+            return
+        wire = wire_format()
+        binary = wire.BINARY_CONTENT_TYPE in self.headers.get('Accept', '')
+        content_type, body = ((wire.BINARY_CONTENT_TYPE, bodies[1]) if binary
+                              else (wire.JSON_CONTENT_TYPE, bodies[0]))
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def connect_mqtt(host, port):
+    try:
+        from paho.mqtt import client as mqtt_client
+    except ImportError:
+        raise SystemExit("Для --mqtt-host нужен пакет paho-mqtt")
+    client = mqtt_client.Client()
+    client.connect(host, port)
+    client.loop_start()
+    return client
+
+
+def replay(devices=1, rate=1.0, count=None, sample_rate=1000, duration=1, freq=50, noise_level=0.2, faults=None,
+           host='127.0.0.1', port=8081, mqtt_host=None, mqtt_port=1883, seed=None):
+    """Выдача синтетических выборок с частотой rate выборок в секунду (по всем устройствам)"""
+    wire = wire_format()
+    handler = type('Handler', (ReplayHandler,), {'captures': {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = connect_mqtt(mqtt_host, mqtt_port) if mqtt_host else None
+    names = [device_name(i) for i in range(devices)]
+    if client:
+        for name in names:
+            # Как ESP32: адрес устройства, к которому приемник добавит /get_data
+            client.publish(f'URL/{name}', f'{host}:{server.server_address[1]}/{name}')
+    print(f"Выборки: http://{host}:{server.server_address[1]}/<device_id>/get_data, "
+          f"{devices} устройств, {rate} выборок/с")
+
+    rng = np.random.default_rng(seed)
+    probabilities = parse_faults(faults)
+    length = int(sample_rate * duration)
+    sent = 0
+    next_time = time.perf_counter()
+    try:
+        while count is None or sent < count:
+            # Пакет по одной выборке на устройство, рассылка с заданной частотой
+            classes = rng.choice(len(FAULT_CLASSES), devices, p=probabilities)
+            signals, _ = synthesize(rng, classes, length, sample_rate, freq, noise_level)
+            for name, signal in zip(names, signals):
+                if count is not None and sent >= count:
+                    break
+                metadata, channels = esp32_capture(rng, signal, noise_level, sample_rate,
+                                                   datetime.now().isoformat(), name)
+                handler.captures[name] = (esp32_json(metadata, channels), wire.encode_capture(channels, **metadata))
+                if client:
+                    client.publish(f'Data/{name}', '1')
+                sent += 1
+                next_time += 1 / rate
+                time.sleep(max(0.0, next_time - time.perf_counter()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        if client:
+            client.loop_stop()
+            client.disconnect()
+    print(f"Отправлено {sent} выборок")
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic sample generator')
+    parser.add_argument('--num-samples', type=int, default=100)
+    parser.add_argument('--sample-rate', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=1, help='sample length, seconds')
+    parser.add_argument('--freq', type=float, default=50, help='base frequency, Hz')
+    parser.add_argument('--noise-level', type=float, default=0.2)
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--faults', help=f"class weights, e.g. normal=0.7,bearing=0.3 ({', '.join(FAULT_CLASSES)})")
+    parser.add_argument('--formats', default='csv', help=f"comma separated: {', '.join(FORMATS)}")
+    parser.add_argument('--output', default='data/synthetic_samples')
+    parser.add_argument('--workers', type=int, default=0, help='processes, 0 - all cores')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--interval', type=float, default=CAPTURE_INTERVAL, help='seconds between captures')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--labels-db',
+                        help='also write ground-truth labels to this label store, e.g. data/labels.sqlite '
+                             '(default: only labels.json in --output)')
+    parser.add_argument('--replay', action='store_true', help='serve captures over HTTP/MQTT instead of writing')
+    parser.add_argument('--rate', type=float, default=1.0, help='replay captures per second')
+    parser.add_argument('--count', type=int, help='replay this many captures and exit')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--mqtt-host')
+    parser.add_argument('--mqtt-port', type=int, default=1883)
+    args = parser.parse_args()
+
+    if args.replay:
+        replay(args.devices, args.rate, args.count, args.sample_rate, args.duration, args.freq, args.noise_level,
+               args.faults, args.host, args.port, args.mqtt_host, args.mqtt_port, args.seed)
+        return
     generate_synthetic_samples(
-        num_samples=100,
-        sample_rate=1000,
-        duration=1,
-        freq=50,
-        noise_level=0.2
-    )
\ No newline at end of file
+        num_samples=args.num_samples,
+        sample_rate=args.sample_rate,
+        duration=args.duration,
+        freq=args.freq,
+        noise_level=args.noise_level,
+        devices=args.devices,
+        faults=args.faults,
+        formats=[f.strip() for f in args.formats.split(',') if f.strip()],
+        output_dir=args.output,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        interval=args.interval,
+        seed=args.seed,
+        labels_db=args.labels_db
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Хранилище меток классов (SQLite WAL) для веб-приложения и обучения.
+
+Каждая разметка - отдельная транзакция: строка метки обновляется upsert'ом
+и в историю добавляется запись (старая и новая метка, автор, время), поэтому
+одновременная разметка из нескольких процессов не теряет изменений и не
+переписывает весь набор меток. Номер последней записи истории служит
+курсором: по нему читатели (каталог выборок) получают только изменения.
+Метки из прежнего labels.json переносятся при первом открытии.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+QUERY_BATCH = 500          # идентификаторов в одном запросе IN (...)
+
+
+class LabelStore:
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db, db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS labels (
+                    sample_id TEXT PRIMARY KEY,
+                    label INTEGER NOT NULL,
+                    annotator TEXT,
+                    updated_at TEXT NOT NULL
+                )""")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sample_id TEXT NOT NULL,
+                    label INTEGER,
+                    previous INTEGER,
+                    annotator TEXT,
+                    created_at TEXT NOT NULL
+                )""")
+            db.execute('CREATE INDEX IF NOT EXISTS history_sample ON history (sample_id, seq)')
+            empty = db.execute('SELECT NOT EXISTS (SELECT 1 FROM history)').fetchone()[0]
+        if empty and legacy_json and os.path.exists(legacy_json):
+            with open(legacy_json, 'r') as f:
+                labels = json.load(f)
+            self.set_many(labels, annotator='labels.json')
+            print(f"Перенесено меток из {legacy_json}: {len(labels)}")
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        return closing(db)
+
+    def set_many(self, labels, annotator=None):
+        """Атомарная разметка: {sample_id: метка или None (снять метку)}.
+
+        Возвращает число выборок, метка которых изменилась.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        labels = {key: None if label is None else int(label) for key, label in labels.items()}
+        changed = 0
+        with self.lock, self.connect() as db, db:
+            # BEGIN IMMEDIATE: чтение старых меток и запись идут под одной блокировкой записи
+            db.execute('BEGIN IMMEDIATE')
+            previous = self._lookup(db, list(labels))
+            history = [(key, label, previous.get(key), annotator, now)
+                       for key, label in labels.items() if previous.get(key) != label]
+            db.executemany("""
+                INSERT INTO labels (sample_id, label, annotator, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(sample_id) DO UPDATE SET
+                    label = excluded.label, annotator = excluded.annotator, updated_at = excluded.updated_at""",
+                           [(key, label, annotator, now) for key, label, *_ in history if label is not None])
+            db.executemany('DELETE FROM labels WHERE sample_id = ?',
+                           [(key,) for key, label, *_ in history if label is None])
+            db.executemany('INSERT INTO history (sample_id, label, previous, annotator, created_at) '
+                           'VALUES (?, ?, ?, ?, ?)', history)
+            changed = len(history)
+        return changed
+
+    def set(self, sample_id, label, annotator=None):
+        return self.set_many({sample_id: label}, annotator)
+
+    @staticmethod
+    def _lookup(db, sample_ids):
+        result = {}
+        for start in range(0, len(sample_ids), QUERY_BATCH):
+            batch = sample_ids[start:start + QUERY_BATCH]
+            result.update(db.execute(
+                f'SELECT sample_id, label FROM labels WHERE sample_id IN ({",".join("?" * len(batch))})', batch))
+        return result
+
+    def get(self, sample_id):
+        return self.labels_for([sample_id]).get(sample_id)
+
+    def labels_for(self, sample_ids):
+        """{sample_id: метка} для размеченных выборок из sample_ids"""
+        with self.connect() as db:
+            return self._lookup(db, list(sample_ids))
+
+    def all(self):
+        with self.connect() as db:
+            return dict(db.execute('SELECT sample_id, label FROM labels'))
+
+    def cursor(self):
+        """Номер последнего изменения меток"""
+        with self.connect() as db:
+            return db.execute('SELECT COALESCE(MAX(seq), 0) FROM history').fetchone()[0]
+
+    def changes(self, since=0):
+        """Изменения после курсора since: ({sample_id: текущая метка или None}, новый курсор)"""
+        with self.connect() as db:
+            rows = db.execute('SELECT seq, sample_id, label FROM history WHERE seq > ? ORDER BY seq',
+                              (since,)).fetchall()
+        return {key: label for _, key, label in rows}, (rows[-1][0] if rows else since)
+
+    def history(self, sample_id=None, limit=100):
+        """История разметки (новые записи первыми), для всех выборок или одной"""
+        query = 'SELECT seq, sample_id, label, previous, annotator, created_at FROM history'
+        params = []
+        if sample_id is not None:
+            query += ' WHERE sample_id = ?'
+            params.append(sample_id)
+        with self.connect() as db:
+            rows = db.execute(query + ' ORDER BY seq DESC LIMIT ?', params + [limit]).fetchall()
+        keys = ('seq', 'sample_id', 'label', 'previous', 'annotator', 'created_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def export_json(self, path):
+        """Выгрузка текущих меток в формате прежнего labels.json"""
+        with open(path, 'w') as f:
+            json.dump(self.all(), f, indent=4)
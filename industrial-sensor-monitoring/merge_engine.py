@@ -0,0 +1,171 @@
+"""Векторное объединение выборок в единый временной ряд.
+
+Время хранится как int64 наносекунды (datetime64[ns]). Метки отсчетов
+выборки строятся одним np.arange, каждый файл превращается в отсортированный
+по времени фрагмент, а фрагменты сливаются попарно через np.searchsorted
+(k-way слияние без общей сортировки). Дубликаты ищутся по целочисленным
+меткам времени внутри каждого устройства, остается последнее значение.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMNS = ('exact_timestamp', 'values', 'timestamp', 'sample_rate')
+NO_DEVICE = ''
+
+
+def parse_values(cell):
+    """Значения выборки: массив, список или строка '[1, 2, 3]' из CSV"""
+    if isinstance(cell, np.ndarray):
+        return cell
+    if isinstance(cell, (list, tuple)):
+        return np.asarray(cell)
+    if isinstance(cell, str):
+        text = cell.strip()
+        if text.startswith('['):
+            return np.array(text.strip('[]').split(','), dtype=np.float64) if text != '[]' else np.empty(0)
+        return np.array([float(text)])
+    return np.array([cell], dtype=np.float64)
+
+
+def to_ns(timestamps):
+    """Метки времени (строки ISO, datetime) -> int64 наносекунды UTC"""
+    index = pd.to_datetime(pd.Series(timestamps), utc=True, format='mixed')
+    return index.dt.tz_convert(None).values.astype('datetime64[ns]').astype(np.int64)
+
+
+def capture_times(start_ns, sample_rate, length):
+    """Метки отсчетов одной выборки"""
+    step = 1e9 / sample_rate
+    return start_ns + np.round(np.arange(length) * step).astype(np.int64)
+
+
+def _sorted_chunk(chunk):
+    t = chunk['exact_timestamp']
+    if len(t) > 1 and np.any(t[1:] < t[:-1]):
+        order = np.argsort(t, kind='stable')
+        chunk = {name: column[order] for name, column in chunk.items()}
+    return chunk
+
+
+def frame_to_chunks(df):
+    """Таблица файла выборок -> {device_id: отсортированный фрагмент}.
+
+    Поддерживаются выборки со списком значений в строке (ответ /samples)
+    и длинный формат с одним значением и меткой времени в строке.
+    """
+    if df.empty or 'values' not in df.columns:
+        return {}
+    devices = (df['device_id'].fillna(NO_DEVICE).astype(str) if 'device_id' in df.columns
+               else pd.Series(NO_DEVICE, index=df.index))
+    sample_rate = (df['sample_rate'].astype(float).values if 'sample_rate' in df.columns
+                   else np.full(len(df), np.nan))
+    starts = to_ns(df['timestamp']) if 'timestamp' in df.columns else np.zeros(len(df), dtype=np.int64)
+
+    first = df['values'].iloc[0]
+    long_format = not isinstance(first, (list, tuple, np.ndarray)) and not (
+        isinstance(first, str) and first.strip().startswith('['))
+
+    chunks = {}
+    for device, positions in devices.groupby(devices).indices.items():
+        if long_format:
+            chunk = {
+                'exact_timestamp': starts[positions],
+                'values': pd.to_numeric(df['values'].iloc[positions]).values.astype(np.float64),
+                'timestamp': starts[positions],
+                'sample_rate': sample_rate[positions],
+            }
+        else:
+            arrays = [parse_values(df['values'].iloc[p]) for p in positions]
+            lengths = np.array([len(a) for a in arrays])
+            chunk = {
+                'exact_timestamp': np.concatenate(
+                    [capture_times(starts[p], sample_rate[p], n) for p, n in zip(positions, lengths)]),
+                'values': np.concatenate(arrays).astype(np.float64) if arrays else np.empty(0),
+                'timestamp': np.repeat(starts[positions], lengths),
+                'sample_rate': np.repeat(sample_rate[positions], lengths),
+            }
+        chunks[device] = _sorted_chunk(chunk)
+    return chunks
+
+
+def merge_two(a, b):
+    """Слияние двух отсортированных фрагментов; при равном времени b идет после a"""
+    if not len(a['exact_timestamp']):
+        return b
+    if not len(b['exact_timestamp']):
+        return a
+    ta, tb = a['exact_timestamp'], b['exact_timestamp']
+    if tb[0] >= ta[-1]:
+        return {name: np.concatenate([a[name], b[name]]) for name in a}
+
+    positions = np.searchsorted(ta, tb, side='right') + np.arange(len(tb))
+    from_b = np.zeros(len(ta) + len(tb), dtype=bool)
+    from_b[positions] = True
+    merged = {}
+    for name in a:
+        column = np.empty(len(from_b), dtype=np.result_type(a[name], b[name]))
+        column[from_b] = b[name]
+        column[~from_b] = a[name]
+        merged[name] = column
+    return merged
+
+
+def kway_merge(chunks):
+    """Слияние списка отсортированных фрагментов попарно, O(n log k).
+
+    Порядок фрагментов в списке сохраняется для равных меток времени.
+    """
+    chunks = [c for c in chunks if len(c['exact_timestamp'])]
+    if not chunks:
+        return None
+    while len(chunks) > 1:
+        chunks = [merge_two(chunks[i], chunks[i + 1]) if i + 1 < len(chunks) else chunks[i]
+                  for i in range(0, len(chunks), 2)]
+    return chunks[0]
+
+
+def drop_duplicate_times(chunk):
+    """Оставляет последнее значение для каждой метки времени"""
+    t = chunk['exact_timestamp']
+    keep = np.ones(len(t), dtype=bool)
+    keep[:-1] = t[1:] != t[:-1]
+    if keep.all():
+        return chunk
+    return {name: column[keep] for name, column in chunk.items()}
+
+
+def merge_frames(frames):
+    """Объединяет таблицы файлов (в порядке файлов) в одну таблицу, отсортированную по времени"""
+    return merge_chunk_maps(frame_to_chunks(df) for df in frames)
+
+
+def merge_chunk_maps(chunk_maps):
+    """То же для уже разобранных файлов: {device_id: фрагмент} в порядке файлов"""
+    by_device = {}
+    for chunks in chunk_maps:
+        for device, chunk in chunks.items():
+            by_device.setdefault(device, []).append(chunk)
+
+    merged = []
+    for device, chunks in by_device.items():
+        chunk = kway_merge(chunks)
+        if chunk is None:
+            continue
+        chunk = drop_duplicate_times(chunk)
+        chunk['device_id'] = np.full(len(chunk['exact_timestamp']), device, dtype=object)
+        merged.append(chunk)
+
+    result = kway_merge(merged)
+    if result is None:
+        return pd.DataFrame(columns=list(COLUMNS) + ['device_id'])
+
+    df = pd.DataFrame({
+        'timestamp': result['timestamp'].astype('datetime64[ns]'),
+        'values': result['values'],
+        'sample_rate': result['sample_rate'],
+        'device_id': result['device_id'],
+        'exact_timestamp': result['exact_timestamp'].astype('datetime64[ns]'),
+    })
+    if not (df['device_id'] != NO_DEVICE).any():
+        df = df.drop(columns='device_id')
+    return df
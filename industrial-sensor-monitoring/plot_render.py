@@ -0,0 +1,149 @@
+"""Данные и изображения графиков выборок для /visualize.
+
+Перед построением данные прореживаются: осциллограмма - огибающей min/max,
+спектр - максимумом по интервалам частот, а CWT считается по сигналу,
+пониженному до max_cwt_points отсчетов (resample_poly с фильтром), поэтому
+время не растет с длиной выборки. Рисование идет через matplotlib.figure.Figure
+без глобального состояния pyplot, так что графики можно строить из разных потоков.
+Готовые PNG и JSON хранятся в PlotCache по ключу (выборка, тип, параметры, mtime).
+"""
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import pywt
+from matplotlib.figure import Figure
+from scipy.fft import rfft, rfftfreq
+from scipy.signal import resample_poly
+
+PLOT_TYPES = ('oscillogram', 'fft', 'wavelet')
+PLOT_POINTS = 2000
+MAX_CWT_POINTS = 2048
+WAVELET_SCALES = 127
+WAVELET = 'cmor1.5-1.0'
+PLOT_CACHE_SIZE = 256
+DEFAULT_SAMPLE_RATE = 1000
+
+
+def bin_edges(length, bins):
+    """Начала bins почти равных интервалов на отрезке [0, length)"""
+    return np.linspace(0, length, bins + 1).astype(np.int64)[:-1]
+
+
+def minmax_envelope(values, bins):
+    """(начала интервалов, минимумы, максимумы); короткий сигнал возвращается как есть"""
+    values = np.asarray(values)
+    if len(values) <= bins:
+        return np.arange(len(values)), values, values
+    starts = bin_edges(len(values), bins)
+    return starts, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+def oscillogram_data(times, values, points=PLOT_POINTS):
+    starts, mins, maxs = minmax_envelope(values, points)
+    return {
+        'time': np.asarray(times)[starts].astype('datetime64[ns]').astype(str).tolist(),
+        'min': mins.tolist(),
+        'max': maxs.tolist(),
+    }
+
+
+def fft_data(values, sample_rate, points=PLOT_POINTS):
+    amplitude = np.abs(rfft(np.asarray(values, dtype=np.float64)))
+    frequency = rfftfreq(len(values), 1 / sample_rate)
+    if len(amplitude) > points:
+        # Максимум по интервалу сохраняет пики спектра
+        starts = bin_edges(len(amplitude), points)
+        frequency, amplitude = frequency[starts], np.maximum.reduceat(amplitude, starts)
+    return {'frequency': frequency.tolist(), 'amplitude': amplitude.tolist()}
+
+
+def wavelet_data(values, sample_rate, scales=WAVELET_SCALES, points=PLOT_POINTS, max_cwt_points=MAX_CWT_POINTS):
+    values = np.asarray(values, dtype=np.float64)
+    factor = max(1, int(np.ceil(len(values) / max_cwt_points)))
+    if factor > 1:
+        values = resample_poly(values, 1, factor)
+    coefficients, _ = pywt.cwt(values, np.arange(1, scales + 1), WAVELET, sampling_period=factor / sample_rate)
+    power = np.abs(coefficients)
+    if power.shape[1] > points:
+        starts = bin_edges(power.shape[1], points)
+        power = np.maximum.reduceat(power, starts, axis=1)
+    return {
+        'scales': list(range(1, scales + 1)),
+        'length': int(len(values) * factor),
+        'power': power.tolist(),
+    }
+
+
+def plot_data(plot_type, times, values, sample_rate, points=PLOT_POINTS, scales=WAVELET_SCALES):
+    sample_rate = sample_rate or DEFAULT_SAMPLE_RATE
+    if plot_type == 'oscillogram':
+        return oscillogram_data(times, values, points)
+    if plot_type == 'fft':
+        return fft_data(values, sample_rate, points)
+    if plot_type == 'wavelet':
+        return wavelet_data(values, sample_rate, scales, points)
+    raise ValueError(f"Неизвестный тип графика {plot_type}")
+
+
+def render_png(plot_type, data):
+    figure = Figure(figsize=(10, 4))
+    axes = figure.add_subplot()
+
+    if plot_type == 'oscillogram':
+        time = np.array(data['time'], dtype='datetime64[ns]')
+        axes.fill_between(time, data['min'], data['max'], linewidth=0.5)
+        axes.set_title('Осциллограмма')
+        axes.set_xlabel('Время')
+        axes.set_ylabel('Амплитуда')
+
+    elif plot_type == 'fft':
+        axes.plot(data['frequency'], data['amplitude'])
+        axes.set_title('Фурье-спектр')
+        axes.set_xlabel('Частота (Гц)')
+        axes.set_ylabel('Амплитуда')
+
+    elif plot_type == 'wavelet':
+        image = axes.imshow(data['power'], extent=[0, data['length'], 1, len(data['scales'])],
+                            cmap='jet', aspect='auto')
+        axes.set_title('Вейвлет-спектр')
+        axes.set_xlabel('Время (отсчеты)')
+        axes.set_ylabel('Масштаб')
+        figure.colorbar(image, ax=axes)
+
+    axes.grid(True)
+    buffer = BytesIO()
+    figure.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class PlotCache:
+    """LRU кэш готовых графиков"""
+
+    def __init__(self, max_entries=PLOT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        # Построение вне блокировки, чтобы не задерживать другие запросы
+        value = build()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
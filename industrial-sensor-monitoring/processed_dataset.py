@@ -0,0 +1,163 @@
+"""Обработанный датасет: таблица признаков и исходные сигналы в бинарных файлах.
+
+    dataset/meta.json      версия и имена признаков
+    dataset/features.bin   строки признаков float64 (выборки x признаки)
+    dataset/waveforms.bin  значения выборок float32 подряд
+    dataset/index.bin      записи INDEX_DTYPE: id, mtime/размер файла, смещение сигнала
+
+Датасет дописывается: при изменении файла выборки добавляется новая строка,
+действует последняя строка с данным id. Индекс пишется последним, поэтому
+строка видна только целиком. Признаки и сигналы читаются через numpy.memmap,
+для загрузки признаков сигналы не читаются.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+DATASET_DIR = 'dataset'
+WAVEFORM_DTYPE = np.dtype('<f4')
+FEATURE_DTYPE = np.dtype('<f8')
+INDEX_DTYPE = np.dtype([
+    ('sample_id', 'S64'),
+    ('mtime_ns', '<i8'),
+    ('size', '<i8'),
+    ('offset', '<i8'),
+    ('length', '<i8'),
+    ('sample_rate', '<f8'),
+])
+DATA_FILES = ('features.bin', 'waveforms.bin', 'index.bin')
+
+
+class ProcessedDataset:
+    def __init__(self, directory, names=None, version=None):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.features_path = os.path.join(directory, 'features.bin')
+        self.waveforms_path = os.path.join(directory, 'waveforms.bin')
+        self.index_path = os.path.join(directory, 'index.bin')
+        os.makedirs(directory, exist_ok=True)
+
+        self.meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                self.meta = json.load(f)
+        # Другой набор признаков - датасет создается заново
+        if names is not None and (self.meta.get('names') != list(names) or self.meta.get('version') != version):
+            self.reset({'version': version, 'names': list(names)})
+        self.names = self.meta.get('names', [])
+
+    def reset(self, meta):
+        for name in DATA_FILES:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        with open(self.meta_path, 'w') as f:
+            json.dump(meta, f, indent=4)
+        self.meta = meta
+
+    def __len__(self):
+        if not os.path.exists(self.index_path) or not self.names:
+            return 0
+        # Учитываются только строки, признаки которых уже полностью на диске
+        return min(os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize,
+                   os.path.getsize(self.features_path) // (FEATURE_DTYPE.itemsize * len(self.names)))
+
+    def index(self):
+        count = len(self)
+        if not count:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count)
+
+    def latest(self):
+        """{sample_id: номер строки} - действующие строки датасета"""
+        return {key.decode(): position for position, key in enumerate(self.index()['sample_id'])}
+
+    def records(self):
+        """{sample_id: запись индекса} для действующих строк"""
+        index = self.index()
+        return {key: index[position] for key, position in self.latest().items()}
+
+    def append(self, rows):
+        """Дописывает выборки: словари sample_id, mtime_ns, size, sample_rate, values, features"""
+        if not rows:
+            return
+        offset = (os.path.getsize(self.waveforms_path) // WAVEFORM_DTYPE.itemsize
+                  if os.path.exists(self.waveforms_path) else 0)
+        records = np.zeros(len(rows), dtype=INDEX_DTYPE)
+        features = np.empty((len(rows), len(self.names)), dtype=FEATURE_DTYPE)
+        with open(self.waveforms_path, 'ab') as f:
+            for i, row in enumerate(rows):
+                values = np.asarray(row['values'], dtype=WAVEFORM_DTYPE)
+                f.write(values.tobytes())
+                records[i] = (row['sample_id'].encode()[:64], row['mtime_ns'], row['size'],
+                              offset, len(values), row.get('sample_rate') or 0)
+                features[i] = [row['features'][name] for name in self.names]
+                offset += len(values)
+        # Сначала данные, затем индекс: строка видна читателям только целиком
+        with open(self.features_path, 'ab') as f:
+            f.write(features.tobytes())
+        with open(self.index_path, 'ab') as f:
+            f.write(records.tobytes())
+
+    def _table(self):
+        return np.memmap(self.features_path, dtype=FEATURE_DTYPE, mode='r', shape=(len(self), len(self.names)))
+
+    def features(self, names=None):
+        """Признаки действующих строк: (список id, массив выборки x признаки)"""
+        names = list(names or self.names)
+        latest = self.latest()
+        if not latest:
+            return [], np.empty((0, len(names)))
+        columns = [self.names.index(name) for name in names]
+        rows = np.fromiter(latest.values(), dtype=np.int64, count=len(latest))
+        return list(latest), np.asarray(self._table()[rows][:, columns])
+
+    def waveform(self, sample_id, record=None):
+        """Сигнал выборки (memmap) и частота дискретизации"""
+        if record is None:
+            record = self.records().get(sample_id)
+            if record is None:
+                return None, None
+        values = np.memmap(self.waveforms_path, dtype=WAVEFORM_DTYPE, mode='r',
+                           offset=int(record['offset']) * WAVEFORM_DTYPE.itemsize, shape=(int(record['length']),))
+        return values, float(record['sample_rate'])
+
+    def superseded(self):
+        """Число строк, замененных более новыми"""
+        return len(self) - len(self.latest())
+
+    def compact(self, keep=None):
+        """Переписывает датасет только с действующими строками (и только с id из keep).
+
+        Строки копируются по одной во временный каталог, который затем заменяет текущие файлы.
+        """
+        index = self.index()
+        latest = self.latest()
+        if keep is not None:
+            keep = set(keep)
+            latest = {key: position for key, position in latest.items() if key in keep}
+
+        temporary = ProcessedDataset(self.directory + '.tmp', self.names, self.meta.get('version'))
+        temporary.reset(self.meta)
+        table = self._table() if len(index) else None
+        for key, position in latest.items():
+            record = index[position]
+            values, sample_rate = self.waveform(key, record)
+            temporary.append([{
+                'sample_id': key,
+                'mtime_ns': int(record['mtime_ns']),
+                'size': int(record['size']),
+                'sample_rate': sample_rate,
+                'values': values,
+                'features': dict(zip(self.names, table[position])),
+            }])
+        del table
+        for name in DATA_FILES:
+            source = os.path.join(temporary.directory, name)
+            if os.path.exists(source):
+                os.replace(source, os.path.join(self.directory, name))
+            elif os.path.exists(os.path.join(self.directory, name)):
+                os.remove(os.path.join(self.directory, name))
+        shutil.rmtree(temporary.directory)
@@ -0,0 +1,164 @@
+"""Потоковая передискретизация объединенного ряда на регулярную сетку.
+
+Время хранится как int64 наносекунды, сетка привязана к кратным шага от эпохи,
+поэтому результаты последовательных запусков стыкуются без сдвига. Данные
+подаются фрагментами, между фрагментами сохраняется только последняя точка,
+а сетка выдается блоками не длиннее block_points, так что потребление памяти
+не зависит от длины истории.
+
+Методы: linear, nearest, zoh (удержание предыдущего значения). Если интервал
+между соседними отсчетами больше max_gap, точки сетки внутри него остаются NaN.
+Экстраполяции за пределы данных нет.
+
+    python resampler.py --input data/merged_data.csv --output data/filled_data.csv --freq 1ms --max-gap 10ms
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+METHODS = ('linear', 'nearest', 'zoh')
+CHUNK_ROWS = 1_000_000
+BLOCK_POINTS = 1_000_000
+NO_DEVICE = ''
+
+
+def to_step_ns(freq):
+    """Шаг сетки ('1s', '500us', pd.Timedelta, число нс) -> int64 наносекунды"""
+    if isinstance(freq, (int, np.integer)):
+        return int(freq)
+    if isinstance(freq, str):
+        return int(pd.Timedelta(pd.tseries.frequencies.to_offset(freq)).value)
+    return int(pd.Timedelta(freq).value)
+
+
+def grid_start(time_ns, step_ns):
+    """Первая точка сетки не раньше time_ns"""
+    return -(-time_ns // step_ns) * step_ns
+
+
+class StreamingResampler:
+    def __init__(self, step_ns, method='linear', max_gap_ns=None, start_ns=None, block_points=BLOCK_POINTS):
+        if method not in METHODS:
+            raise ValueError(f"Неизвестный метод {method}, допустимые: {', '.join(METHODS)}")
+        self.step_ns = int(step_ns)
+        self.method = method
+        self.max_gap_ns = max_gap_ns
+        self.block_points = block_points
+        # Следующая точка сетки и последний отсчет предыдущего фрагмента
+        self.next_ns = None if start_ns is None else grid_start(int(start_ns), self.step_ns)
+        self.last_time = None
+        self.last_value = None
+
+    def push(self, times, values):
+        """Принимает отсортированный фрагмент, выдает блоки (метки сетки, значения).
+
+        Выдаются точки сетки до последнего отсчета фрагмента включительно.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if self.last_time is not None:
+            newer = times > self.last_time
+            times = np.concatenate([[self.last_time], times[newer]])
+            values = np.concatenate([[self.last_value], values[newer]])
+        if not len(times):
+            return
+
+        first = grid_start(int(times[0]), self.step_ns)
+        start = first if self.next_ns is None else max(self.next_ns, first)
+        end = int(times[-1])
+        self.last_time, self.last_value = int(times[-1]), float(values[-1])
+
+        while start <= end:
+            count = min((end - start) // self.step_ns + 1, self.block_points)
+            grid = start + np.arange(count, dtype=np.int64) * self.step_ns
+            yield grid, self._evaluate(times, values, grid)
+            start += count * self.step_ns
+        self.next_ns = start
+
+    def _evaluate(self, times, values, grid):
+        left = np.searchsorted(times, grid, side='right') - 1
+        right = np.minimum(left + 1, len(times) - 1)
+        # Целочисленные смещения: точность не теряется даже для меток в наносекундах
+        offset = grid - times[left]
+        span = times[right] - times[left]
+
+        if self.method == 'zoh':
+            result = values[left].copy()
+        elif self.method == 'nearest':
+            result = np.where(offset > span - offset, values[right], values[left])
+        else:
+            fraction = np.divide(offset, span, out=np.zeros(len(grid)), where=span > 0)
+            result = values[left] + (values[right] - values[left]) * fraction
+
+        if self.max_gap_ns is not None:
+            result[(span > self.max_gap_ns) & (offset > 0)] = np.nan
+        return result
+
+
+def resample_frames(frames, step_ns, method='linear', max_gap_ns=None, start_ns=None, block_points=BLOCK_POINTS):
+    """Передискретизация последовательности таблиц (exact_timestamp, values[, device_id]).
+
+    Каждое устройство обрабатывается своим StreamingResampler. start_ns - число
+    (для всех устройств) или словарь {device_id: метка}. Выдает (device_id, сетка, значения).
+    """
+    resamplers = {}
+    for df in frames:
+        if df.empty:
+            continue
+        devices = (df['device_id'].fillna(NO_DEVICE).astype(str) if 'device_id' in df.columns
+                   else pd.Series(NO_DEVICE, index=df.index))
+        times = pd.to_datetime(df['exact_timestamp']).values.astype('datetime64[ns]').astype(np.int64)
+        values = pd.to_numeric(df['values'], errors='coerce').values.astype(np.float64)
+        valid = ~np.isnan(values)
+        for device, positions in devices.groupby(devices).indices.items():
+            positions = positions[valid[positions]]
+            if device not in resamplers:
+                start = start_ns.get(device) if isinstance(start_ns, dict) else start_ns
+                resamplers[device] = StreamingResampler(step_ns, method, max_gap_ns, start, block_points)
+            for grid, result in resamplers[device].push(times[positions], values[positions]):
+                yield device, grid, result
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    """Таблица в памяти -> фрагменты по chunk_rows строк"""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def block_frame(device, grid, values):
+    """Фрагмент результата. device_id пишется всегда (пустой для данных без устройства),
+    чтобы у дописываемого файла не менялся набор столбцов"""
+    return pd.DataFrame({'timestamp': grid.astype('datetime64[ns]'), 'values': values, 'device_id': device})
+
+
+def resample_csv(input_file, output_file, freq='1s', method='linear', max_gap=None, chunk_rows=CHUNK_ROWS):
+    """Передискретизация CSV файла с чтением фрагментами. Возвращает число записанных строк"""
+    step_ns = to_step_ns(freq)
+    max_gap_ns = to_step_ns(max_gap) if max_gap else None
+    frames = pd.read_csv(input_file, chunksize=chunk_rows)
+    written = 0
+    for device, grid, values in resample_frames(frames, step_ns, method, max_gap_ns):
+        block_frame(device, grid, values).to_csv(output_file, mode='a' if written else 'w',
+                                                 header=not written, index=False)
+        written += len(grid)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Потоковая передискретизация объединенных данных')
+    parser.add_argument('--input', default=os.path.join('data', 'merged_data.csv'))
+    parser.add_argument('--output', default=os.path.join('data', 'filled_data.csv'))
+    parser.add_argument('--freq', default='1s', help='шаг сетки, например 1ms')
+    parser.add_argument('--method', default='linear', choices=METHODS)
+    parser.add_argument('--max-gap', help='максимальный заполняемый пропуск, например 10ms')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    written = resample_csv(args.input, args.output, args.freq, args.method, args.max_gap, args.chunk_rows)
+    print(f"Записано {written} строк в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Каталог выборок (SQLite) для главной страницы веб-приложения.
+
+Для каждой выборки хранятся время, устройство, метка, длина, частота
+дискретизации и сводные статистики, поэтому страница строится индексированным
+запросом с фильтрами и постраничным выводом, без обхода каталога и чтения файлов.
+Каталог обновляется событиями (загрузка файла, разметка, сбор данных) и
+пересканированием каталога выборок по mtime: разбираются только новые и
+измененные файлы.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+
+from sample_loader import list_sample_files, load_samples, sample_arrays, sample_id, sample_info
+
+COLUMNS = ('sample_id', 'filename', 'timestamp', 'device_id', 'label', 'length', 'sample_rate',
+           'mean', 'std', 'min', 'max', 'mtime_ns', 'size')
+PER_PAGE = 50
+
+
+def catalog_row(result, label=None):
+    """Строка каталога из результата sample_loader.parse_sample_file"""
+    info = sample_info(result['path'])
+    stat = os.stat(result['path'])
+    times, values = sample_arrays(result)
+    timestamp = info['timestamp'] if info['timestamp'] != 'Unknown' else None
+    if timestamp is None and len(times):
+        timestamp = str(np.datetime64(int(times.min()), 'ns').astype('datetime64[s]')).replace('T', ' ')
+    stats = ((float(values.mean()), float(values.std()), float(values.min()), float(values.max()))
+             if len(values) else (None,) * 4)
+    return (info['id'], info['filename'], timestamp, result['metadata'].get('device_id'), label, len(values),
+            result['metadata'].get('sample_rate')) + stats + (stat.st_mtime_ns, stat.st_size)
+
+
+class SampleCatalog:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.dir_mtime = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db, db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    sample_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    timestamp TEXT,
+                    device_id TEXT,
+                    label INTEGER,
+                    length INTEGER,
+                    sample_rate REAL,
+                    mean REAL,
+                    std REAL,
+                    min REAL,
+                    max REAL,
+                    mtime_ns INTEGER,
+                    size INTEGER
+                )""")
+            db.execute('CREATE INDEX IF NOT EXISTS samples_timestamp ON samples (timestamp)')
+            db.execute('CREATE INDEX IF NOT EXISTS samples_label ON samples (label, timestamp)')
+            db.execute('CREATE INDEX IF NOT EXISTS samples_device ON samples (device_id, timestamp)')
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        return closing(db)
+
+    def upsert(self, results, labels=None):
+        """Добавляет или обновляет выборки по результатам загрузки (см. sample_loader).
+
+        labels - словарь меток или хранилище меток (label_store.LabelStore).
+        """
+        results = [r for r in results if 'error' not in r]
+        if labels is not None and not isinstance(labels, dict):
+            labels = labels.labels_for([r['sample_id'] for r in results])
+        labels = labels or {}
+        rows = [catalog_row(r, labels.get(r['sample_id'])) for r in results]
+        if not rows:
+            return 0
+        with self.lock, self.connect() as db, db:
+            # Метка не затирается, если в labels ее нет
+            db.executemany(f"""
+                INSERT INTO samples ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})
+                ON CONFLICT(sample_id) DO UPDATE SET
+                    {', '.join(f'{c} = excluded.{c}' for c in COLUMNS if c not in ('sample_id', 'label'))},
+                    label = COALESCE(excluded.label, samples.label)""", rows)
+        return len(rows)
+
+    def add_files(self, paths, labels=None):
+        """Событие загрузки или сбора: файлы разбираются и добавляются в каталог"""
+        return self.upsert(load_samples(paths, progress=False), labels)
+
+    def remove(self, sample_ids):
+        with self.lock, self.connect() as db, db:
+            db.executemany('DELETE FROM samples WHERE sample_id = ?', [(s,) for s in sample_ids])
+
+    def set_labels(self, labels):
+        """Событие разметки: {sample_id: метка или None}"""
+        with self.lock, self.connect() as db, db:
+            db.executemany('UPDATE samples SET label = ? WHERE sample_id = ?',
+                           [(label, key) for key, label in labels.items()])
+
+    def sync_labels(self, labels):
+        """Приводит метки каталога к полному набору labels"""
+        with self.lock, self.connect() as db, db:
+            current = dict(db.execute('SELECT sample_id, label FROM samples'))
+            changes = [(labels.get(key), key) for key, label in current.items() if labels.get(key) != label]
+            db.executemany('UPDATE samples SET label = ? WHERE sample_id = ?', changes)
+        return len(changes)
+
+    def rescan(self, samples_dir, labels=None, workers=0, force=False):
+        """Пересканирование каталога выборок по mtime.
+
+        Если mtime каталога не изменился, файлы не перечисляются (если не force).
+        Возвращает число добавленных/обновленных и удаленных выборок.
+        """
+        if not os.path.isdir(samples_dir):
+            return 0, 0
+        dir_mtime = os.stat(samples_dir).st_mtime_ns
+        if not force and self.dir_mtime.get(samples_dir) == dir_mtime:
+            return 0, 0
+
+        with self.connect() as db:
+            known = {key: (mtime_ns, size) for key, mtime_ns, size in
+                     db.execute('SELECT sample_id, mtime_ns, size FROM samples')}
+        files = list_sample_files(samples_dir)
+        changed = []
+        for path in files:
+            stat = os.stat(path)
+            if known.get(sample_id(path)) != (stat.st_mtime_ns, stat.st_size):
+                changed.append(path)
+        removed = set(known) - {sample_id(path) for path in files}
+
+        updated = self.upsert(load_samples(changed, workers, progress=len(changed) > 1000), labels)
+        if removed:
+            self.remove(removed)
+        self.dir_mtime[samples_dir] = dir_mtime
+        return updated, len(removed)
+
+    def query(self, page=1, per_page=PER_PAGE, label=None, device_id=None, search=None,
+              date_from=None, date_to=None):
+        """Страница каталога: (список словарей, общее число выборок по фильтру).
+
+        label: 'labeled', 'unlabeled' или номер класса; другие значения не фильтруют.
+        """
+        where, params = [], []
+        if label == 'labeled':
+            where.append('label IS NOT NULL')
+        elif label == 'unlabeled':
+            where.append('label IS NULL')
+        elif str(label).lstrip('-').isdigit():
+            where.append('label = ?')
+            params.append(int(label))
+        if device_id:
+            where.append('device_id = ?')
+            params.append(device_id)
+        if search:
+            where.append('sample_id LIKE ?')
+            params.append(f'%{search}%')
+        if date_from:
+            where.append('timestamp >= ?')
+            params.append(date_from)
+        if date_to:
+            # Дата без времени включает весь день
+            where.append('timestamp <= ?')
+            params.append(date_to + ' 23:59:59' if len(date_to) == 10 else date_to)
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+
+        page = max(1, int(page))
+        with self.connect() as db:
+            db.row_factory = sqlite3.Row
+            total = db.execute(f'SELECT COUNT(*) FROM samples {clause}', params).fetchone()[0]
+            rows = db.execute(f'SELECT * FROM samples {clause} ORDER BY timestamp DESC, sample_id DESC '
+                              'LIMIT ? OFFSET ?', params + [per_page, (page - 1) * per_page]).fetchall()
+        return [dict(row) for row in rows], total
+
+    def devices(self):
+        with self.connect() as db:
+            return [row[0] for row in db.execute(
+                'SELECT DISTINCT device_id FROM samples WHERE device_id IS NOT NULL ORDER BY device_id')]
@@ -0,0 +1,145 @@
+"""Параллельная загрузка файлов выборок.
+
+Файлы sample_*.csv и чанки .npz колоночного хранилища разбираются в пуле
+процессов: каждый процесс читает файл, разбирает списки значений и строит
+типизированные фрагменты merge_engine.frame_to_chunks (время в int64 нс,
+значения float64). Пул создается один раз и переиспользуется collect_data.py,
+train_classifier.py и app.py. Небольшие наборы файлов читаются без пула.
+"""
+import atexit
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from merge_engine import frame_to_chunks
+from sample_store import SampleStore
+
+LOADER_WORKERS = 0         # 0 - по числу ядер
+LOADER_CHUNKSIZE = 16      # файлов на одну задачу пула
+SERIAL_THRESHOLD = 32      # меньше файлов - загрузка в текущем процессе
+PROGRESS_STEP = 0.1        # сообщение о прогрессе каждые 10% файлов
+
+_pool = None
+_pool_workers = None
+
+
+def get_pool(workers=LOADER_WORKERS):
+    """Общий пул процессов; пересоздается только при смене числа процессов"""
+    global _pool, _pool_workers
+    workers = workers or os.cpu_count() or 1
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+    _pool = _pool_workers = None
+
+
+atexit.register(shutdown_pool)
+
+
+def sample_id(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def list_sample_files(samples_dir):
+    """Файлы sample_*.csv каталога в порядке имен"""
+    if not os.path.isdir(samples_dir):
+        return []
+    return [os.path.join(samples_dir, f) for f in sorted(os.listdir(samples_dir))
+            if f.startswith('sample_') and f.endswith('.csv')]
+
+
+def sample_info(path):
+    """Идентификатор и время выборки из имени файла sample_YYYYmmdd_HHMMSS.csv"""
+    filename = os.path.basename(path)
+    try:
+        timestamp = datetime.strptime(filename.replace('sample_', '').replace('.csv', ''), '%Y%m%d_%H%M%S')
+        timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        timestamp = 'Unknown'
+    return {'id': sample_id(path), 'filename': filename, 'timestamp': timestamp}
+
+
+def read_sample_frame(path, store_root=None, entries=None):
+    """Файл выборки -> таблица со столбцом values (CSV или чанк .npz)"""
+    if path.endswith('.npz'):
+        root = store_root or os.path.dirname(os.path.dirname(os.path.dirname(path)))
+        return pd.DataFrame(SampleStore(root).read_chunk(path, entries))
+    return pd.read_csv(path)
+
+
+def sample_result(path, df):
+    """Таблица выборки -> результат загрузки (metadata и типизированные фрагменты)"""
+    columns = list(df.columns)
+    if 'values' not in df.columns and 'current_avg' in df.columns:
+        df = df.rename(columns={'current_avg': 'values'})
+    metadata = {column: df[column].iloc[:1].tolist()[0]
+                for column in ('sample_rate', 'resolution', 'device_id') if column in df.columns and len(df)}
+    return {
+        'path': path,
+        'sample_id': sample_id(path),
+        'rows': len(df),
+        'columns': columns,
+        'metadata': metadata,
+        'chunks': frame_to_chunks(df),
+    }
+
+
+def parse_sample_file(task):
+    """Разбор одного файла. Выполняется в процессе пула, ошибки возвращаются в результате"""
+    path, store_root, entries = task
+    try:
+        return sample_result(path, read_sample_frame(path, store_root, entries))
+    except Exception as e:
+        return {'path': path, 'sample_id': sample_id(path), 'error': str(e)}
+
+
+def sample_arrays(result):
+    """Метки времени (int64 нс) и значения (float64) выборки по всем устройствам"""
+    chunks = list(result['chunks'].values())
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return (np.concatenate([c['exact_timestamp'] for c in chunks]),
+            np.concatenate([c['values'] for c in chunks]))
+
+
+def load_samples(paths, workers=LOADER_WORKERS, chunksize=LOADER_CHUNKSIZE, store=None, progress=True):
+    """Загружает файлы выборок параллельно, результаты в порядке paths.
+
+    Результат для файла: path, sample_id, rows, metadata и chunks
+    ({device_id: фрагмент}, см. merge_engine.frame_to_chunks) либо error.
+    store - SampleStore для чанков .npz: манифест читается один раз здесь.
+    """
+    paths = list(paths)
+    by_chunk = {}
+    if store is not None and any(p.endswith('.npz') for p in paths):
+        for entry in store.manifest():
+            by_chunk.setdefault(entry['chunk'], []).append(entry)
+    store_root = store.root if store is not None else None
+    tasks = [(p, store_root, by_chunk.get(os.path.relpath(p, store_root)) if store_root else None)
+             for p in paths]
+
+    if workers == 1 or len(tasks) < SERIAL_THRESHOLD:
+        results = map(parse_sample_file, tasks)
+    else:
+        results = get_pool(workers).map(parse_sample_file, tasks, chunksize=chunksize)
+
+    loaded = []
+    started = time.time()
+    step = max(1, int(len(tasks) * PROGRESS_STEP))
+    for result in results:
+        loaded.append(result)
+        if progress and len(tasks) >= SERIAL_THRESHOLD and (len(loaded) % step == 0 or len(loaded) == len(tasks)):
+            print(f"Загружено {len(loaded)}/{len(tasks)} файлов ({time.time() - started:.1f} сек)")
+    return loaded
@@ -0,0 +1,180 @@
+"""Колоночное хранилище выборок для collect_data.py.
+
+Каждый ответ /samples сохраняется одним сжатым чанком .npz с типизированными
+массивами (uint16 для данных АЦП), разложенным по каталогам
+device=<id>/date=<YYYY-MM-DD>/. Метаданные выборок дописываются в manifest.jsonl,
+поэтому для поиска выборок не нужно открывать сами чанки.
+
+Экспорт в прежний CSV формат (по умолчанию в data/exported_samples,
+существующие файлы не перезаписываются):
+    python sample_store.py export-csv --store data/store --out data/exported_samples
+"""
+import argparse
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILE = 'manifest.jsonl'
+# Поля выборки, которые хранятся как массивы; остальные попадают в манифест
+ARRAY_FIELDS = ('values', 'current', 'mic', 'vibro')
+
+
+def _partition_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(value)) or 'unknown'
+
+
+def _typed_array(values):
+    """Список чисел -> массив минимально подходящего типа (uint16 для 12-битного АЦП)"""
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu' and array.size and array.min() >= 0 and array.max() <= np.iinfo(np.uint16).max:
+        return array.astype(np.uint16)
+    if array.dtype.kind == 'f':
+        return array.astype(np.float32) if array.dtype == np.float32 else array.astype(np.float64)
+    return array
+
+
+class SampleStore:
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def write_chunk(self, samples, chunk_name=None):
+        """Сохраняет список выборок (как в ответе /samples). Возвращает пути созданных чанков"""
+        if not chunk_name:
+            chunk_name = datetime.now().strftime('chunk_%Y%m%d_%H%M%S_%f')
+
+        partitions = {}
+        for position, sample in enumerate(samples):
+            timestamp = pd.Timestamp(sample.get('timestamp') or datetime.now())
+            key = (_partition_name(sample.get('device_id')), timestamp.strftime('%Y-%m-%d'))
+            partitions.setdefault(key, []).append((position, timestamp, sample))
+
+        paths = []
+        entries = []
+        for (device, day), items in partitions.items():
+            directory = os.path.join(self.root, f'device={device}', f'date={day}')
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{chunk_name}.npz')
+
+            arrays = {}
+            for position, timestamp, sample in items:
+                entry = {k: v for k, v in sample.items() if k not in ARRAY_FIELDS}
+                entry['timestamp'] = timestamp.isoformat()
+                entry['chunk'] = os.path.relpath(path, self.root)
+                entry['key'] = f's{position}'
+                entry['fields'] = {}
+                for field in ARRAY_FIELDS:
+                    if field in sample and sample[field] is not None:
+                        array = _typed_array(sample[field])
+                        arrays[f's{position}_{field}'] = array
+                        entry['fields'][field] = [str(array.dtype), int(array.size)]
+                entries.append(entry)
+
+            np.savez_compressed(path, **arrays)
+            paths.append(path)
+
+        # Одной записью: манифест могут дописывать несколько процессов
+        with self.lock, open(self.manifest_path, 'a') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+        return paths
+
+    def manifest(self):
+        """Метаданные всех выборок хранилища"""
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def read_chunk(self, path, entries=None):
+        """Читает чанк: список словарей с метаданными и массивами выборок"""
+        if entries is None:
+            relpath = os.path.relpath(path, self.root)
+            entries = [e for e in self.manifest() if e['chunk'] == relpath]
+        samples = []
+        with np.load(path) as arrays:
+            for entry in entries:
+                sample = {k: v for k, v in entry.items() if k not in ('chunk', 'key', 'fields')}
+                for field in entry['fields']:
+                    sample[field] = arrays[f"{entry['key']}_{field}"]
+                samples.append(sample)
+        return samples
+
+    def chunks(self, device_id=None, start_date=None, end_date=None):
+        """Пути чанков с фильтром по устройству и диапазону дат (YYYY-MM-DD)"""
+        paths = []
+        for device_dir in sorted(os.listdir(self.root)):
+            if not device_dir.startswith('device='):
+                continue
+            if device_id is not None and device_dir != f'device={_partition_name(device_id)}':
+                continue
+            for date_dir in sorted(os.listdir(os.path.join(self.root, device_dir))):
+                day = date_dir[len('date='):]
+                if (start_date and day < start_date) or (end_date and day > end_date):
+                    continue
+                directory = os.path.join(self.root, device_dir, date_dir)
+                paths.extend(os.path.join(directory, f) for f in sorted(os.listdir(directory))
+                             if f.endswith('.npz'))
+        return paths
+
+    def export_csv(self, output_dir, device_id=None):
+        """Экспорт чанков в CSV прежнего формата (одна строка на выборку, values списком).
+
+        Уже существующие файлы не перезаписываются и пропускаются, поэтому повторный
+        экспорт в тот же каталог безопасен. Возвращает пути созданных файлов.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        by_chunk = {}
+        for entry in self.manifest():
+            by_chunk.setdefault(entry['chunk'], []).append(entry)
+
+        # Один CSV на исходный ответ /samples, как при storage = csv
+        grouped = {}
+        for path in self.chunks(device_id):
+            samples = self.read_chunk(path, by_chunk.get(os.path.relpath(path, self.root), []))
+            grouped.setdefault(os.path.basename(path)[:-len('.npz')], []).extend(samples)
+
+        exported = []
+        planned = set()
+        for chunk_name, samples in sorted(grouped.items()):
+            for sample in samples:
+                for field in ARRAY_FIELDS:
+                    if field in sample:
+                        sample[field] = sample[field].tolist()
+            # chunk_YYYYmmdd_HHMMSS_ffffff -> sample_YYYYmmdd_HHMMSS.csv
+            name = 'sample_' + chunk_name[len('chunk_'):len('chunk_') + 15]
+            filepath = os.path.join(output_dir, f'{name}.csv')
+            suffix = 1
+            while filepath in planned:
+                filepath = os.path.join(output_dir, f'{name}_{suffix}.csv')
+                suffix += 1
+            planned.add(filepath)
+            if os.path.exists(filepath):
+                print(f"Файл уже существует, пропущен: {filepath}")
+                continue
+            pd.DataFrame(samples).to_csv(filepath, index=False)
+            exported.append(filepath)
+        return exported
+
+def main():
+    parser = argparse.ArgumentParser(description='Колоночное хранилище выборок')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export-csv', help='экспорт в CSV')
+    export.add_argument('--store', default=os.path.join('data', 'store'))
+    export.add_argument('--out', default=os.path.join('data', 'exported_samples'))
+    export.add_argument('--device-id')
+    args = parser.parse_args()
+
+    if args.command == 'export-csv':
+        files = SampleStore(args.store).export_csv(args.out, args.device_id)
+        print(f"Экспортировано {len(files)} файлов в {args.out}")
+
+
+if __name__ == '__main__':
+    main()
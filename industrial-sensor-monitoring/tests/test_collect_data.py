@@ -0,0 +1,150 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from collect_data import APIDataCollector
+
+
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return APIDataCollector(str(tmp_path / 'missing.ini'))
+
+
+def write_sample(collector, name, start, values, device_id=None):
+    """Файл в длинном формате generate_samples.py: одно значение и метка времени в строке"""
+    rows = {'timestamp': pd.date_range(start, periods=len(values), freq='1s'), 'values': values,
+            'sample_rate': 1}
+    if device_id is not None:
+        rows['device_id'] = device_id
+    path = os.path.join(collector.samples_dir, f'sample_{name}.csv')
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+def merged(collector):
+    return pd.read_csv(collector.merged_file)
+
+
+def watermark(collector):
+    with open(collector.watermark_file) as f:
+        return json.load(f)
+
+
+def processed(collector):
+    return [os.path.basename(f) for f in watermark(collector)['processed']]
+
+
+def test_incremental_merge_resumes_from_watermark(collector):
+    write_sample(collector, '20250101_000000', '2025-01-01 00:00:00', [1.0, 2.0, 3.0])
+    write_sample(collector, '20250101_000100', '2025-01-01 00:01:00', [4.0, 5.0])
+    assert len(collector.merge_samples()) == 5
+    assert processed(collector) == ['sample_20250101_000000.csv', 'sample_20250101_000100.csv']
+
+    # Без новых файлов ничего не дописывается
+    assert collector.merge_samples() is None
+    assert len(merged(collector)) == 5
+
+    # Новый файл перекрывается с уже объединенными данными: дописываются только новые отсчеты
+    write_sample(collector, '20250101_000200', '2025-01-01 00:01:01', [50.0, 6.0, 7.0])
+    assert len(collector.merge_samples()) == 2
+    result = merged(collector)
+    assert list(result['values']) == [1, 2, 3, 4, 5, 6, 7]
+    assert pd.to_datetime(result['exact_timestamp']).is_monotonic_increasing
+    assert processed(collector)[-1] == 'sample_20250101_000200.csv'
+
+
+def test_incremental_matches_full_merge(collector):
+    rng = np.random.default_rng(0)
+    for minute in range(4):
+        write_sample(collector, f'20250101_00{minute:02d}00', f'2025-01-01 00:{minute:02d}:00',
+                     rng.standard_normal(30), device_id='ab'[minute % 2])
+        collector.merge_samples()
+    incremental = merged(collector)
+
+    collector.merge_samples(incremental=False)
+    full = merged(collector)
+    pd.testing.assert_frame_equal(incremental.sort_values(['device_id', 'exact_timestamp'], ignore_index=True),
+                                  full.sort_values(['device_id', 'exact_timestamp'], ignore_index=True))
+
+
+def test_failed_file_is_retried_before_newer_files(collector):
+    write_sample(collector, '20250101_000000', '2025-01-01 00:00:00', [1.0, 2.0])
+    broken = os.path.join(collector.samples_dir, 'sample_20250101_000100.csv')
+    with open(broken, 'w') as f:
+        f.write('"partial write')
+    write_sample(collector, '20250101_000200', '2025-01-01 00:02:00', [5.0, 6.0])
+
+    collector.merge_samples()
+    state = watermark(collector)
+    assert processed(collector) == ['sample_20250101_000000.csv']
+    assert len(state['pending']) == 2
+    assert list(merged(collector)['values']) == [1, 2]
+
+    # Файл дописан: его данные не теряются, хотя следующий файл новее
+    write_sample(collector, '20250101_000100', '2025-01-01 00:01:00', [3.0, 4.0])
+    collector.merge_samples()
+    state = watermark(collector)
+    assert len(state['processed']) == 3
+    assert state['pending'] == [] and state['failures'] == {}
+    assert list(merged(collector)['values']) == [1, 2, 3, 4, 5, 6]
+
+
+def test_file_is_skipped_after_merge_retries(collector):
+    write_sample(collector, '20250101_000000', '2025-01-01 00:00:00', [1.0])
+    with open(os.path.join(collector.samples_dir, 'sample_20250101_000100.csv'), 'w') as f:
+        f.write('"corrupt')
+    write_sample(collector, '20250101_000200', '2025-01-01 00:02:00', [2.0])
+
+    for _ in range(collector.merge_retries):
+        collector.merge_samples()
+    assert len(processed(collector)) == 3 and watermark(collector)['pending'] == []
+    assert list(merged(collector)['values']) == [1, 2]
+
+
+def test_uploaded_file_with_any_name_is_merged(collector):
+    """Имя загруженного файла не содержит время и может сортироваться раньше уже объединенных"""
+    write_sample(collector, '20250101_000000', '2025-01-01 00:00:00', [1.0, 2.0], device_id='a')
+    collector.merge_samples()
+    write_sample(collector, '000_pump_upload', '2025-01-01 00:05:00', [3.0, 4.0], device_id='b')
+    assert len(collector.merge_samples()) == 2
+    assert sorted(merged(collector)['values']) == [1, 2, 3, 4]
+    assert collector.merge_samples() is None
+
+
+def test_legacy_watermark_is_migrated(collector):
+    write_sample(collector, '20250101_000000', '2025-01-01 00:00:00', [1.0, 2.0])
+    write_sample(collector, '20250101_000100', '2025-01-01 00:01:00', [3.0])
+    collector.save_watermark({'last_file': '20250101_000000', 'devices': {}, 'filled_until': {},
+                              'pending': [], 'failures': {}})
+    assert len(collector.merge_samples()) == 1
+    assert 'last_file' not in watermark(collector)
+    assert len(processed(collector)) == 2
+
+
+def test_output_schema_does_not_depend_on_devices(collector):
+    """Выборки без устройства и с устройством дописываются в файлы с одним набором столбцов"""
+    write_sample(collector, '20250101_000000', '2025-01-01 00:00:00', [1.0, 2.0, 3.0])
+    collector.merge_samples()
+    collector.fill_missing_data()
+    write_sample(collector, '20250101_000100', '2025-01-01 00:01:00', [4.0, 5.0], device_id='dev')
+    collector.merge_samples()
+    collector.fill_missing_data()
+
+    for path in (collector.merged_file, collector.filled_file):
+        with open(path) as f:
+            lines = f.read().splitlines()
+        assert 'device_id' in lines[0].split(',')
+        assert {line.count(',') for line in lines} == {lines[0].count(',')}
+    filled = pd.read_csv(collector.filled_file, keep_default_na=False)
+    assert filled.groupby('device_id').size().to_dict() == {'': 3, 'dev': 2}
+
+
+def test_csv_storage_does_not_create_columnar_store(collector):
+    assert collector.storage == 'csv' and collector.store is None
+    assert not os.path.exists(os.path.join(collector.output_dir, 'store'))
+    write_sample(collector, '20250101_000000', '2025-01-01 00:00:00', [1.0, 2.0])
+    assert len(collector.merge_samples()) == 2
@@ -0,0 +1,12 @@
+import numpy as np
+
+from features import LEGACY_FEATURES, FeatureExtractor
+
+
+def test_legacy_features_match_original_statistics():
+    """Модели без features.json обучены на [mean, std, max, min] каждой выборки"""
+    batch = np.random.default_rng(0).standard_normal((3, 500))
+    extractor = FeatureExtractor(LEGACY_FEATURES)
+    assert extractor.names == ['mean', 'std', 'max', 'min']
+    expected = np.stack([batch.mean(axis=1), batch.std(axis=1), batch.max(axis=1), batch.min(axis=1)], axis=1)
+    np.testing.assert_allclose(extractor.transform(batch), expected)
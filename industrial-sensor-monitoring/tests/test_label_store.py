@@ -0,0 +1,75 @@
+import json
+import threading
+
+from label_store import LabelStore
+
+
+def test_set_many_upserts_and_records_history(tmp_path):
+    store = LabelStore(str(tmp_path / 'labels.sqlite'))
+    assert store.set_many({'a': 1, 'b': 2}, annotator='alice') == 2
+    assert store.set_many({'a': 1, 'b': 3}, annotator='bob') == 1
+    assert store.set('a', None, annotator='bob') == 1
+
+    assert store.all() == {'b': 3}
+    assert store.get('a') is None
+    assert store.labels_for(['a', 'b', 'c']) == {'b': 3}
+    history = store.history()
+    assert [(h['sample_id'], h['label'], h['previous'], h['annotator']) for h in history] == [
+        ('a', None, 1, 'bob'), ('b', 3, 2, 'bob'), ('b', 2, None, 'alice'), ('a', 1, None, 'alice')]
+    assert [h['label'] for h in store.history('b')] == [3, 2]
+
+
+def test_changes_since_cursor(tmp_path):
+    store = LabelStore(str(tmp_path / 'labels.sqlite'))
+    store.set_many({'a': 1, 'b': 1})
+    cursor = store.cursor()
+    store.set_many({'a': 2})
+    store.set_many({'a': 3, 'c': 0})
+
+    changes, new_cursor = store.changes(cursor)
+    assert changes == {'a': 3, 'c': 0}
+    assert new_cursor == store.cursor()
+    assert store.changes(new_cursor) == ({}, new_cursor)
+
+
+def test_concurrent_writers_do_not_lose_updates(tmp_path):
+    path = str(tmp_path / 'labels.sqlite')
+    LabelStore(path)
+    writers, per_writer = 4, 50
+
+    def write(writer):
+        # Отдельный экземпляр на поток: блокировка только в SQLite, как у разных процессов
+        store = LabelStore(path)
+        for i in range(per_writer):
+            store.set_many({f'w{writer}_{i}': i % 4, 'shared': writer * per_writer + i},
+                           annotator=f'writer{writer}')
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    store = LabelStore(path)
+    labels = store.all()
+    assert len(labels) == writers * per_writer + 1
+    assert all(labels[f'w{w}_{i}'] == i % 4 for w in range(writers) for i in range(per_writer))
+    # Каждая запись истории ссылается на метку, записанную предыдущей
+    shared = store.history('shared', limit=10000)[::-1]
+    assert len(shared) == writers * per_writer
+    assert [h['previous'] for h in shared[1:]] == [h['label'] for h in shared[:-1]]
+    assert labels['shared'] == shared[-1]['label']
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / 'labels.json'
+    legacy.write_text(json.dumps({'a': 1, 'b': 0}))
+    path = str(tmp_path / 'labels.sqlite')
+
+    store = LabelStore(path, legacy_json=str(legacy))
+    assert store.all() == {'a': 1, 'b': 0}
+    store.set('a', 2)
+    assert LabelStore(path, legacy_json=str(legacy)).all() == {'a': 2, 'b': 0}
+
+    store.export_json(str(tmp_path / 'export.json'))
+    assert json.loads((tmp_path / 'export.json').read_text()) == {'a': 2, 'b': 0}
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from resampler import block_frame, iter_chunks, resample_frames, to_step_ns
+
+SECOND = 10 ** 9
+
+
+def frame(times_s, values, device_id=None):
+    df = pd.DataFrame({'exact_timestamp': pd.to_datetime(np.asarray(times_s) * SECOND), 'values': values})
+    if device_id is not None:
+        df['device_id'] = device_id
+    return df
+
+
+def collect(frames, step='1s', **kwargs):
+    result = {}
+    for device, grid, values in resample_frames(frames, to_step_ns(step), **kwargs):
+        times, series = result.setdefault(device, ([], []))
+        times.extend(grid.tolist())
+        series.extend(values.tolist())
+    return {device: (np.array(t) // SECOND, np.array(v)) for device, (t, v) in result.items()}
+
+
+def test_linear_interpolation_on_grid():
+    grid, values = collect([frame([0, 4], [0.0, 8.0])])['']
+    np.testing.assert_array_equal(grid, [0, 1, 2, 3, 4])
+    np.testing.assert_allclose(values, [0, 2, 4, 6, 8])
+
+
+def test_max_gap_leaves_nan_inside_long_gaps():
+    grid, values = collect([frame([0, 1, 5, 6], [1.0, 2.0, 3.0, 4.0])], max_gap_ns=2 * SECOND)['']
+    np.testing.assert_array_equal(grid, np.arange(7))
+    # Точки на отсчетах сохраняются, внутри пропуска длиннее max_gap - NaN
+    np.testing.assert_array_equal(np.isnan(values), [False, False, True, True, True, False, False])
+    assert values[5] == 3.0
+
+
+def test_zoh_and_nearest():
+    frames = [frame([0, 3], [1.0, 4.0])]
+    np.testing.assert_array_equal(collect(frames, method='zoh')[''][1], [1, 1, 1, 4])
+    np.testing.assert_array_equal(collect(frames, method='nearest')[''][1], [1, 1, 4, 4])
+
+
+def test_each_device_has_its_own_grid():
+    df = pd.concat([frame([0.5, 2.5], [0.0, 2.0], 'a'), frame([10, 12], [5.0, 7.0], 'b')])
+    result = collect([df.sort_values('exact_timestamp')])
+    np.testing.assert_array_equal(result['a'][0], [1, 2])
+    np.testing.assert_allclose(result['a'][1], [0.5, 1.5])
+    np.testing.assert_array_equal(result['b'][0], [10, 11, 12])
+    np.testing.assert_allclose(result['b'][1], [5, 6, 7])
+
+
+def test_start_ns_continues_each_device():
+    df = pd.concat([frame([0, 4], [0.0, 4.0], 'a'), frame([0, 4], [0.0, 4.0], 'b')])
+    result = collect([df], start_ns={'a': 3 * SECOND})
+    np.testing.assert_array_equal(result['a'][0], [3, 4])
+    np.testing.assert_array_equal(result['b'][0], [0, 1, 2, 3, 4])
+
+
+def test_chunking_does_not_change_result():
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.choice(np.arange(0, 1000, 0.25), 500, replace=False))
+    df = frame(times, rng.standard_normal(500))
+    whole = collect([df], step='700ms', max_gap_ns=3 * SECOND)['']
+    chunked = collect(iter_chunks(df, chunk_rows=37), step='700ms', max_gap_ns=3 * SECOND)['']
+    np.testing.assert_array_equal(whole[0], chunked[0])
+    np.testing.assert_allclose(whole[1], chunked[1], equal_nan=True)
+
+
+def test_block_frame_always_has_device_id():
+    grid = np.array([0, SECOND], dtype=np.int64)
+    assert list(block_frame('', grid, np.zeros(2)).columns) == ['timestamp', 'values', 'device_id']
+    assert list(block_frame('dev', grid, np.zeros(2))['device_id']) == ['dev', 'dev']
@@ -0,0 +1,48 @@
+import os
+
+import pandas as pd
+import pytest
+
+from sample_catalog import SampleCatalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    samples_dir = tmp_path / 'samples'
+    samples_dir.mkdir()
+    for day, device in ((1, 'a'), (2, 'b'), (3, 'a')):
+        pd.DataFrame({'timestamp': pd.date_range(f'2025-01-0{day}', periods=3, freq='1s'),
+                      'values': [1.0, 2.0, 3.0], 'sample_rate': 1, 'device_id': device}
+                     ).to_csv(samples_dir / f'sample_2025010{day}_000000.csv', index=False)
+    catalog = SampleCatalog(str(tmp_path / 'catalog.sqlite'))
+    catalog.rescan(str(samples_dir), {'sample_20250102_000000': 1})
+    catalog.samples_dir = str(samples_dir)
+    return catalog
+
+
+def ids(result):
+    return [row['sample_id'] for row in result[0]]
+
+
+def test_query_filters(catalog):
+    assert ids(catalog.query()) == ['sample_20250103_000000', 'sample_20250102_000000', 'sample_20250101_000000']
+    assert ids(catalog.query(label='1')) == ['sample_20250102_000000']
+    assert catalog.query(label='unlabeled')[1] == 2
+    assert catalog.query(device_id='a')[1] == 2
+    assert ids(catalog.query(date_from='2025-01-02', date_to='2025-01-02')) == ['sample_20250102_000000']
+    assert ids(catalog.query(page=2, per_page=2)) == ['sample_20250101_000000']
+    assert catalog.devices() == ['a', 'b']
+
+
+@pytest.mark.parametrize('label', ['foo', '1.5', '', None])
+def test_invalid_label_filter_is_ignored(catalog, label):
+    assert catalog.query(label=label)[1] == 3
+
+
+def test_rescan_picks_up_changes_and_keeps_labels(catalog):
+    os.remove(os.path.join(catalog.samples_dir, 'sample_20250101_000000.csv'))
+    assert catalog.rescan(catalog.samples_dir, force=True) == (0, 1)
+    catalog.set_labels({'sample_20250103_000000': 2})
+    assert catalog.rescan(catalog.samples_dir, force=True) == (0, 0)
+    assert {row['sample_id']: row['label'] for row in catalog.query()[0]} == {
+        'sample_20250103_000000': 2, 'sample_20250102_000000': 1}
@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from sample_store import SampleStore
+
+
+def test_write_and_read_chunk_keeps_types(tmp_path):
+    store = SampleStore(str(tmp_path / 'store'))
+    paths = store.write_chunk([{'timestamp': '2025-01-01T00:00:00', 'device_id': 'dev', 'values': [1, 2, 4095]}],
+                              chunk_name='chunk_20250101_000000_000000')
+    assert store.chunks('dev') == paths
+    sample, = store.read_chunk(paths[0])
+    assert sample['device_id'] == 'dev'
+    assert sample['values'].dtype == np.uint16
+    np.testing.assert_array_equal(sample['values'], [1, 2, 4095])
+
+
+def test_export_does_not_overwrite_existing_files(tmp_path):
+    store = SampleStore(str(tmp_path / 'store'))
+    store.write_chunk([{'timestamp': '2025-01-01T00:00:00', 'values': [1, 2]}],
+                      chunk_name='chunk_20250101_000000_000000')
+    out = tmp_path / 'exported'
+    existing = out / 'sample_20250101_000000.csv'
+    out.mkdir()
+    existing.write_text('live data\n')
+
+    assert store.export_csv(str(out)) == []
+    assert existing.read_text() == 'live data\n'
+
+    exported = store.export_csv(str(tmp_path / 'fresh'))
+    assert [os.path.basename(path) for path in exported] == ['sample_20250101_000000.csv']
+    assert pd.read_csv(exported[0])['values'].tolist() == ['[1, 2]']
@@ -1,25 +1,42 @@
 import os
 import json
+import time
 import numpy as np
-import pandas as pd
-from datetime import datetime
+from numpy.lib.stride_tricks import sliding_window_view
 from fedot.core.pipelines.pipeline import Pipeline
 from fedot.core.pipelines.node import PrimaryNode, SecondaryNode
 from fedot.core.data.data import InputData
 from fedot.core.data.data_split import train_test_data_setup
 from fedot.core.repository.dataset_types import DataTypesEnum
 from fedot.core.repository.tasks import Task, TaskTypesEnum
-from fedot.industrial.data.data_split import industrial_validation_split
 from fedot.industrial.pipelines.ts_classification_pipelines import ts_classification_pipeline
 from fedot.industrial.utils.utils import ensure_directory_exists
+from sample_loader import LOADER_CHUNKSIZE, list_sample_files, load_samples, sample_arrays, sample_id
+from feature_cache import FeatureCache
+from features import FeatureExtractor, featurize
+from processed_dataset import DATASET_DIR, ProcessedDataset
+from label_store import LabelStore
 
 class DataPreprocessor:
     def __init__(self, config_path='config.json'):
         self.config = self.load_config(config_path)
         self.data_dir = self.config.get('data_dir', 'data')
         self.labels_file = self.config.get('labels_file', 'labels.json')
+        # Метки классов общие с веб-приложением (см. label_store.py)
+        self.label_store = LabelStore(os.path.join(self.data_dir, self.config.get('labels_db', 'labels.sqlite')),
+                                      legacy_json=os.path.join(self.data_dir, self.labels_file))
         self.processed_dir = os.path.join(self.data_dir, 'processed')
+        # Параллельная загрузка семплов (см. sample_loader.py), 0 - по числу ядер
+        self.loader_workers = self.config.get('loader_workers', 0)
+        self.loader_chunksize = self.config.get('loader_chunksize', LOADER_CHUNKSIZE)
         ensure_directory_exists(self.processed_dir)
+        self.extractor = FeatureExtractor(self.config.get('features'))
+        self.feature_cache = FeatureCache(os.path.join(self.processed_dir, self.config.get('feature_cache', 'feature_cache.sqlite')),
+                                          self.extractor.version)
+        # Обработанный датасет: таблица признаков и сигналы (см. processed_dataset.py)
+        self.dataset = ProcessedDataset(os.path.join(self.processed_dir, DATASET_DIR),
+                                        self.extractor.names, self.extractor.version)
+        self.dataset_batch = self.config.get('dataset_batch', 1000)
         
     def load_config(self, config_path):
         """Загрузка конфигурационного файла"""
@@ -28,67 +45,74 @@ class DataPreprocessor:
     
     def load_labels(self):
         """Загрузка меток классов"""
-        labels_path = os.path.join(self.data_dir, self.labels_file)
-        if os.path.exists(labels_path):
-            with open(labels_path, 'r') as f:
-                return json.load(f)
-        return {}
+        return self.label_store.all()
     
     def save_labels(self, labels):
-        """Сохранение меток классов"""
-        labels_path = os.path.join(self.data_dir, self.labels_file)
-        with open(labels_path, 'w') as f:
-            json.dump(labels, f, indent=4)
+        """Сохранение меток классов (одной транзакцией, с записью в историю)"""
+        self.label_store.set_many(labels, annotator='train_classifier')
     
     def preprocess_samples(self):
-        """Предварительная обработка семплов и создание единого датасета"""
+        """Предварительная обработка семплов: новые и измененные файлы дописываются в датасет"""
         samples_dir = os.path.join(self.data_dir, 'samples')
-        all_samples = []
-        labels = self.load_labels()
-        
-        for sample_file in os.listdir(samples_dir):
-            if sample_file.startswith('sample_') and sample_file.endswith('.csv'):
-                file_path = os.path.join(samples_dir, sample_file)
-                df = pd.read_csv(file_path)
-                
-                # Извлечение временных меток
-                if 'exact_timestamp' in df.columns:
-                    timestamps = pd.to_datetime(df['exact_timestamp'])
-                elif 'timestamp' in df.columns:
-                    timestamps = pd.to_datetime(df['timestamp'])
-                else:
-                    timestamps = pd.Series([datetime.now()] * len(df))
-                
-                # Извлечение значений
-                values = df['values'].values if 'values' in df.columns else df['current_avg'].values
-                
-                # Создание фичей (можно добавить дополнительные)
-                features = {
-                    'mean': np.mean(values),
-                    'std': np.std(values),
-                    'max': np.max(values),
-                    'min': np.min(values),
-                    # Добавьте другие статистики по необходимости
-                }
-                
-                # Определение метки класса (если есть)
-                sample_id = sample_file.replace('.csv', '')
-                label = labels.get(sample_id, -1)  # -1 для неразмеченных данных
-                
-                all_samples.append({
-                    'sample_id': sample_id,
-                    'timestamps': timestamps,
+        sample_files = list_sample_files(samples_dir)
+        stats = {sample_id(path): os.stat(path) for path in sample_files}
+        
+        # Файлы, которых нет в датасете или которые изменились (по mtime и размеру)
+        records = self.dataset.records()
+        pending = []
+        for path in sample_files:
+            record, stat = records.get(sample_id(path)), stats[sample_id(path)]
+            if record is None or (int(record['mtime_ns']), int(record['size'])) != (stat.st_mtime_ns, stat.st_size):
+                pending.append(path)
+        
+        # Признаки берутся из кэша, пересчитываются только новые и измененные файлы
+        features_by_id, changed = self.feature_cache.lookup(pending)
+        changed = set(changed)
+        computed = 0
+        
+        # Пакетами, чтобы в памяти были сигналы только одного пакета
+        for start in range(0, len(pending), self.dataset_batch):
+            rows = []
+            # Файлы разбираются параллельно: метки времени в int64 нс, значения float64
+            for result in load_samples(pending[start:start + self.dataset_batch],
+                                       self.loader_workers, self.loader_chunksize):
+                if 'error' in result:
+                    print(f"Ошибка при обработке файла {result['path']}: {result['error']}")
+                    continue
+                _, values = sample_arrays(result)
+                if not len(values):
+                    continue
+                stat = stats[result['sample_id']]
+                rows.append({
+                    'sample_id': result['sample_id'],
+                    'path': result['path'],
+                    'mtime_ns': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'sample_rate': result['metadata'].get('sample_rate'),
                     'values': values,
-                    'features': features,
-                    'label': label
+                    'features': features_by_id.get(result['sample_id']),
                 })
+            
+            # Признаки всех новых файлов пакета считаются одним вызовом (см. features.py)
+            missing = [row for row in rows if row['path'] in changed]
+            matrix = featurize([row['values'] for row in missing],
+                               [row['sample_rate'] for row in missing], self.extractor)
+            for row, features in zip(missing, matrix):
+                row['features'] = dict(zip(self.extractor.names, features.tolist()))
+            self.feature_cache.store((row['path'], row['features']) for row in missing)
+            self.dataset.append(rows)
+            computed += len(missing)
+        
+        print(f"Датасет: {len(pending)} новых и измененных файлов, признаки рассчитаны для {computed}")
         
-        # Сохранение обработанных данных
-        processed_path = os.path.join(self.processed_dir, 'processed_data.json')
-        with open(processed_path, 'w') as f:
-            json.dump(all_samples, f, indent=4)
+        # Удаленные файлы и замененные строки убираются, когда их становится много
+        current = set(stats)
+        self.feature_cache.prune(current)
+        removed = set(self.dataset.latest()) - current
+        if removed or self.dataset.superseded() > len(self.dataset) // 2:
+            self.dataset.compact(keep=current)
         
-        return all_samples
+        return self.dataset
 
 class TSClassifierTrainer:
     def __init__(self, config_path='config.json'):
@@ -96,6 +120,15 @@ class TSClassifierTrainer:
         self.data_dir = self.config.get('data_dir', 'data')
         self.processed_dir = os.path.join(self.data_dir, 'processed')
         self.models_dir = os.path.join(self.data_dir, 'models')
+        self.extractor = FeatureExtractor(self.config.get('features'))
+        self.label_store = LabelStore(os.path.join(self.data_dir, self.config.get('labels_db', 'labels.sqlite')),
+                                      legacy_json=os.path.join(self.data_dir, self.config.get('labels_file', 'labels.json')))
+        # Режим обучения: tabular (признаки), ts (окна сигналов) или compare (оба)
+        self.mode = self.config.get('mode', 'tabular')
+        self.n_jobs = self.config.get('n_jobs', -1)
+        self.ts_config = {'window': 1000, 'step': 500, 'max_windows': 100, **self.config.get('ts', {})}
+        # Время обучения и скорость предсказания по режимам
+        self.reports = {}
         ensure_directory_exists(self.models_dir)
         
     def load_config(self, config_path):
@@ -103,20 +136,27 @@ class TSClassifierTrainer:
         with open(config_path, 'r') as f:
             return json.load(f)
     
-    def prepare_input_data(self, samples):
+    def load_labels(self, sample_ids=None):
+        """Загрузка меток классов (всех или только для sample_ids)"""
+        if sample_ids is None:
+            return self.label_store.all()
+        return self.label_store.labels_for(sample_ids)
+    
+    def load_training_data(self):
+        """Признаки и метки размеченных выборок из датасета, без чтения сигналов"""
+        dataset = ProcessedDataset(os.path.join(self.processed_dir, DATASET_DIR))
+        sample_ids, features = dataset.features(self.extractor.names)
+        labels = self.load_labels(sample_ids)
+        targets = np.array([labels.get(s, -1) for s in sample_ids])  # -1 для неразмеченных данных
+        labeled = targets != -1
+        return features[labeled], targets[labeled]
+    
+    def prepare_input_data(self, features, labels):
         """Подготовка данных для FEDOT"""
-        # Преобразование в numpy массивы
-        features = np.array([[s['features']['mean'], 
-                             s['features']['std'],
-                             s['features']['max'],
-                             s['features']['min']] for s in samples])
-        
-        labels = np.array([s['label'] for s in samples])
-        
         # Создание объекта InputData для FEDOT
         task = Task(TaskTypesEnum.classification)
         input_data = InputData(
-            idx=np.arange(len(samples)),
+            idx=np.arange(len(features)),
             features=features,
             target=labels,
             task=task,
@@ -135,46 +175,154 @@ class TSClassifierTrainer:
         pipeline = Pipeline(node_rf)
         return pipeline
     
-    def train_classifier(self, samples):
+    def train_classifier(self, features, labels):
         """Обучение классификатора"""
         # Подготовка данных
-        input_data = self.prepare_input_data(samples)
+        input_data = self.prepare_input_data(features, labels)
         
         # Разделение на train/test
         train_data, test_data = train_test_data_setup(input_data)
         
         # Создание и обучение пайплайна
         pipeline = self.create_pipeline()
-        pipeline.fit(train_data)
+        started = time.perf_counter()
+        pipeline.fit(train_data, n_jobs=self.n_jobs)
+        train_time = time.perf_counter() - started
         
         # Оценка качества
+        started = time.perf_counter()
         predicted = pipeline.predict(test_data)
+        predict_time = time.perf_counter() - started
         true_labels = test_data.target
         
-        accuracy = np.mean(predicted.predict == true_labels)
+        accuracy = np.mean(np.ravel(predicted.predict) == np.ravel(true_labels))
         print(f"Accuracy: {accuracy:.2f}")
+        self.reports['tabular'] = {
+            'train_samples': len(train_data.idx),
+            'test_samples': len(test_data.idx),
+            'train_time_s': round(train_time, 3),
+            'predict_time_s': round(predict_time, 4),
+            'samples_per_s': round(len(test_data.idx) / predict_time, 1) if predict_time else None,
+            'accuracy': round(float(accuracy), 4),
+        }
         
         # Сохранение модели
         model_path = os.path.join(self.models_dir, 'ts_classifier')
         pipeline.save(model_path)
+        # Конфигурация признаков сохраняется рядом с моделью для /predict
+        self.extractor.save(os.path.join(self.models_dir, 'features.json'))
         print(f"Model saved to {model_path}")
         
         return pipeline
+    
+    def load_waveform_windows(self):
+        """Окна фиксированной длины из сигналов размеченных выборок датасета.
+        
+        Возвращает (окна, метки окон, номер выборки для каждого окна).
+        """
+        dataset = ProcessedDataset(os.path.join(self.processed_dir, DATASET_DIR))
+        records = dataset.records()
+        labels = self.load_labels(list(records))
+        window, step, max_windows = (self.ts_config[k] for k in ('window', 'step', 'max_windows'))
+        
+        windows, targets, groups = [], [], []
+        for key, record in records.items():
+            label = labels.get(key, -1)
+            if label == -1 or record['length'] < window:
+                continue
+            values, _ = dataset.waveform(key, record)
+            # Длинные записи режутся на окна с шагом step
+            view = sliding_window_view(values, window)[::step][:max_windows]
+            windows.append(np.array(view))
+            targets.append(np.full(len(view), label))
+            groups.append(np.full(len(view), len(groups)))
+        
+        if not windows:
+            return np.empty((0, window), dtype=np.float32), np.empty(0, dtype=int), np.empty(0, dtype=int)
+        return np.concatenate(windows), np.concatenate(targets), np.concatenate(groups)
+    
+    def split_by_sample(self, groups):
+        """Маска обучающих окон: окна одной выборки попадают в одну часть"""
+        samples = np.unique(groups)
+        rng = np.random.default_rng(self.config.get('random_state', 42))
+        test_count = max(1, int(round(len(samples) * self.config.get('test_size', 0.2))))
+        test_samples = rng.permutation(samples)[:test_count]
+        return ~np.isin(groups, test_samples)
+    
+    def train_ts_classifier(self):
+        """Обучение классификатора временных рядов fedot-industrial на окнах исходных сигналов"""
+        windows, targets, groups = self.load_waveform_windows()
+        if len(np.unique(groups)) < 2:
+            print("Not enough labeled waveforms for the ts mode.")
+            return None
+        
+        train = self.split_by_sample(groups)
+        task = Task(TaskTypesEnum.classification)
+        train_data, test_data = (InputData(idx=np.arange(mask.sum()), features=windows[mask], target=targets[mask],
+                                           task=task, data_type=DataTypesEnum.ts)
+                                 for mask in (train, ~train))
+        
+        pipeline = ts_classification_pipeline()
+        started = time.perf_counter()
+        pipeline.fit(train_data, n_jobs=self.n_jobs)
+        train_time = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        predicted = np.ravel(pipeline.predict(test_data).predict)
+        predict_time = time.perf_counter() - started
+        
+        # Класс выборки - самый частый класс ее окон
+        test_groups = groups[~train]
+        votes = {g: np.bincount(predicted[test_groups == g].astype(int)).argmax() for g in np.unique(test_groups)}
+        truth = {g: targets[groups == g][0] for g in votes}
+        window_accuracy = np.mean(predicted == targets[~train])
+        sample_accuracy = np.mean([votes[g] == truth[g] for g in votes])
+        print(f"Accuracy (ts): windows {window_accuracy:.2f}, samples {sample_accuracy:.2f}")
+        
+        self.reports['ts'] = {
+            'train_samples': int(len(np.unique(groups[train]))),
+            'test_samples': len(votes),
+            'windows': int(len(windows)),
+            'window': self.ts_config['window'],
+            'train_time_s': round(train_time, 3),
+            'predict_time_s': round(predict_time, 4),
+            'samples_per_s': round(len(votes) / predict_time, 1) if predict_time else None,
+            'windows_per_s': round(len(test_groups) / predict_time, 1) if predict_time else None,
+            'accuracy': round(float(sample_accuracy), 4),
+        }
+        
+        model_path = os.path.join(self.models_dir, 'ts_classifier_waveform')
+        pipeline.save(model_path)
+        print(f"Model saved to {model_path}")
+        return pipeline
+    
+    def save_report(self):
+        """Сравнение режимов по времени обучения и скорости предсказания"""
+        for mode, report in self.reports.items():
+            print(f"{mode:>8}: train {report['train_time_s']} s, "
+                  f"predict {report['samples_per_s']} samples/s, accuracy {report['accuracy']}")
+        report_path = os.path.join(self.models_dir, 'training_report.json')
+        with open(report_path, 'w') as f:
+            json.dump(self.reports, f, indent=4)
 
 def main():
     # 1. Предварительная обработка данных
     preprocessor = DataPreprocessor()
-    samples = preprocessor.preprocess_samples()
+    preprocessor.preprocess_samples()
     
     # Проверка наличия размеченных данных
-    labeled_samples = [s for s in samples if s['label'] != -1]
-    if len(labeled_samples) == 0:
+    trainer = TSClassifierTrainer()
+    features, labels = trainer.load_training_data()
+    if len(labels) == 0:
         print("No labeled samples found. Please label your data first.")
         return
     
     # 2. Обучение классификатора
-    trainer = TSClassifierTrainer()
-    pipeline = trainer.train_classifier(labeled_samples)
+    if trainer.mode in ('tabular', 'compare'):
+        trainer.train_classifier(features, labels)
+    if trainer.mode in ('ts', 'compare'):
+        trainer.train_ts_classifier()
+    trainer.save_report()
     
     print("Training completed successfully!")
 
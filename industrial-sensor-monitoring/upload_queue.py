@@ -0,0 +1,190 @@
+"""Фоновая обработка загруженных выборок для /upload.
+
+Запрос только записывает файлы на диск потоково, блоками UPLOAD_BLOCK, во
+временный каталог задания и сразу возвращает номер задания. Остальное делает
+пул фоновых потоков: распаковка zip (тоже потоково), разбор файлов через
+sample_loader.load_samples, проверка схемы, перенос CSV в каталог выборок
+и обработчик приложения (запись в каталог, расчет признаков). Состояние
+заданий - UploadQueue.status.
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from werkzeug.utils import secure_filename
+
+from sample_loader import load_samples, sample_arrays, sample_id
+
+UPLOAD_BLOCK = 1 << 20            # байт на одну запись при сохранении потока
+UPLOAD_WORKERS = 2
+UPLOAD_BATCH = 500                # файлов на один разбор и вызов on_accepted
+MAX_JOBS = 200                    # хранится состояние последних заданий
+MAX_UNPACKED_BYTES = 4 << 30      # предел распакованного размера одного zip
+ALLOWED_EXTENSIONS = ('.csv', '.zip')
+
+
+def stream_to_file(stream, path, block_size=UPLOAD_BLOCK):
+    """Потоковая запись в файл через временный .part. Возвращает число байт"""
+    written = 0
+    with open(path + '.part', 'wb') as f:
+        for block in iter(lambda: stream.read(block_size), b''):
+            f.write(block)
+            written += len(block)
+    os.replace(path + '.part', path)
+    return written
+
+
+def sample_filename(name):
+    """Безопасное имя файла выборки: каталог и rescan учитывают только sample_*.csv"""
+    name = secure_filename(os.path.basename(name))
+    return name if name.startswith('sample_') else f'sample_{name}'
+
+
+def extract_zip(path, directory, limit=MAX_UNPACKED_BYTES):
+    """Потоковая распаковка CSV из архива. Возвращает пути файлов и ошибки"""
+    paths, errors = [], {}
+    unpacked = 0
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.lower().endswith('.csv'):
+                continue
+            unpacked += member.file_size
+            if unpacked > limit:
+                errors[member.filename] = 'Archive is too large'
+                break
+            target = os.path.join(directory, sample_filename(member.filename))
+            if target in paths:
+                errors[member.filename] = 'Duplicate file name in archive'
+                continue
+            with archive.open(member) as source:
+                stream_to_file(source, target)
+            paths.append(target)
+    return paths, errors
+
+
+def validate_result(result):
+    """Проверка схемы разобранной выборки. Возвращает текст ошибки или None"""
+    if 'error' in result:
+        return result['error']
+    columns = result.get('columns', ())
+    if 'values' not in columns and 'current_avg' not in columns:
+        return 'Missing column: values or current_avg'
+    for column in ('timestamp', 'sample_rate'):
+        if column not in columns:
+            return f'Missing column: {column}'
+    rate = result['metadata'].get('sample_rate')
+    if rate is None or not np.isfinite(rate) or rate <= 0:
+        return 'Invalid sample_rate'
+    times, values = sample_arrays(result)
+    if not len(values):
+        return 'Empty sample'
+    if not np.all(np.isfinite(values)):
+        return 'Non-numeric or missing values'
+    return None
+
+
+class UploadQueue:
+    def __init__(self, samples_dir, staging_dir, on_accepted=None, workers=UPLOAD_WORKERS,
+                 extensions=ALLOWED_EXTENSIONS):
+        """on_accepted(results) вызывается для принятых выборок (результаты sample_loader)"""
+        self.samples_dir = samples_dir
+        self.extensions = extensions
+        self.staging_dir = staging_dir
+        self.on_accepted = on_accepted
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(samples_dir, exist_ok=True)
+        os.makedirs(staging_dir, exist_ok=True)
+
+    def submit(self, files):
+        """Сохраняет загруженные файлы (werkzeug FileStorage) и ставит задание в очередь"""
+        job_id = uuid.uuid4().hex[:12]
+        directory = os.path.join(self.staging_dir, job_id)
+        os.makedirs(directory)
+        job = {'id': job_id, 'status': 'queued', 'created': time.time(), 'finished': None,
+               'files': 0, 'processed': 0, 'bytes': 0, 'accepted': [], 'rejected': {}}
+        staged = []
+        for file in files:
+            name = os.path.basename(file.filename or '')
+            if not name.lower().endswith(self.extensions):
+                job['rejected'][name] = 'Unsupported file type'
+                continue
+            path = os.path.join(directory, secure_filename(name) or uuid.uuid4().hex)
+            job['bytes'] += stream_to_file(file.stream, path)
+            staged.append(path)
+
+        with self.lock:
+            self.jobs[job_id] = job
+            while len(self.jobs) > MAX_JOBS:
+                self.jobs.popitem(last=False)
+        self.executor.submit(self._run, job, directory, staged)
+        return job_id
+
+    def status(self, job_id=None):
+        """Копия состояния задания (или всех заданий)"""
+        with self.lock:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return self._snapshot(job) if job else None
+            return [self._snapshot(job) for job in reversed(self.jobs.values())]
+
+    @staticmethod
+    def _snapshot(job):
+        return {**job, 'accepted': list(job['accepted']), 'rejected': dict(job['rejected'])}
+
+    def _update(self, job, **changes):
+        with self.lock:
+            job.update(changes)
+
+    def _run(self, job, directory, staged):
+        try:
+            self._update(job, status='processing')
+            paths = []
+            for path in staged:
+                if path.lower().endswith('.zip'):
+                    try:
+                        extracted, errors = extract_zip(path, directory)
+                    except zipfile.BadZipFile:
+                        extracted, errors = [], {os.path.basename(path): 'Invalid zip archive'}
+                    os.remove(path)
+                    paths += extracted
+                    with self.lock:
+                        job['rejected'].update(errors)
+                else:
+                    target = os.path.join(directory, sample_filename(path))
+                    os.replace(path, target)
+                    paths.append(target)
+            self._update(job, files=len(paths) + len(job['rejected']))
+
+            # Пакетами, чтобы в памяти были сигналы только одного пакета
+            for start in range(0, len(paths), UPLOAD_BATCH):
+                accepted = []
+                for result in load_samples(paths[start:start + UPLOAD_BATCH], progress=False):
+                    error = validate_result(result)
+                    name = os.path.basename(result['path'])
+                    if error is None:
+                        target = os.path.join(self.samples_dir, name)
+                        os.replace(result['path'], target)
+                        result['path'] = target
+                        accepted.append(result)
+                    with self.lock:
+                        job['processed'] += 1
+                        if error is None:
+                            job['accepted'].append(sample_id(name))
+                        else:
+                            job['rejected'][name] = error
+                if accepted and self.on_accepted is not None:
+                    self.on_accepted(accepted)
+            self._update(job, status='done', finished=time.time())
+        except Exception as e:
+            print(f"Ошибка обработки загрузки {job['id']}: {e}")
+            self._update(job, status='error', error=str(e), finished=time.time())
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
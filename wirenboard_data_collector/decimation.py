@@ -0,0 +1,103 @@
+"""Прореживание осциллограмм для отображения.
+
+Огибающая min/max сохраняет пики сигнала: каждый интервал из исходных
+отсчетов заменяется его минимумом и максимумом. LTTB дает одну линию
+из заданного числа точек, визуально близкую к исходной.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def bin_edges(length, bins):
+    """Начала bins почти равных интервалов на отрезке [0, length)"""
+    return np.linspace(0, length, bins + 1).astype(np.int64)[:-1]
+
+
+def minmax_envelope(values, bins):
+    """Возвращает (starts, mins, maxs) для bins интервалов.
+
+    Если отсчетов не больше bins, возвращает их без изменений.
+    """
+    values = np.asarray(values)
+    if len(values) <= bins:
+        return np.arange(len(values)), values, values
+    starts = bin_edges(len(values), bins)
+    return starts, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+def lttb(values, points):
+    """Largest-Triangle-Three-Buckets: возвращает (индексы, значения) из points точек.
+
+    Первая и последняя точки сохраняются, из каждого промежуточного интервала
+    выбирается точка, образующая наибольший треугольник с предыдущей выбранной
+    точкой и средним следующего интервала.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    length = len(values)
+    if points >= length or points < 3:
+        return np.arange(length), values
+
+    edges = np.linspace(1, length - 1, points - 1).astype(np.int64)
+    # Средние всех интервалов считаются сразу
+    sums = np.add.reduceat(values, edges[:-1])
+    counts = np.diff(edges)
+    bucket_x = (edges[:-1] + edges[1:] - 1) / 2
+    bucket_y = sums / counts
+    next_x = np.append(bucket_x[1:], length - 1)
+    next_y = np.append(bucket_y[1:], values[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        x = np.arange(start, stop)
+        area = np.abs((previous - next_x[bucket]) * (values[start:stop] - values[previous])
+                      - (previous - x) * (next_y[bucket] - values[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected, values[selected]
+
+
+DECIMATION_METHODS = ("minmax", "lttb")
+WAVEFORM_CACHE_SIZE = 256
+
+
+class WaveformCache:
+    """LRU-кэш прореженных осциллограмм по ключу (seq, канал, метод, число точек)"""
+
+    def __init__(self, max_entries=WAVEFORM_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute, valid=None):
+        """Значение из кэша или compute(). Если valid() после расчета ложно
+        (слот буфера перезаписан во время чтения), результат не кэшируется и возвращается None"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        value = compute()
+        if valid is not None and not valid():
+            return None
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+
+def decimate(values, points, method="minmax"):
+    """Прореживает канал и возвращает словарь, готовый для JSON"""
+    if method == "lttb":
+        index, selected = lttb(values, points)
+        return {"x": index.tolist(), "y": selected.tolist()}
+    starts, mins, maxs = minmax_envelope(values, points)
+    return {"x": starts.tolist(), "min": mins.tolist(), "max": maxs.tolist()}
@@ -0,0 +1,130 @@
+"""Планировщик загрузки выборок с устройств.
+
+Обработчики MQTT только ставят задачу в очередь (submit), а HTTP-запросы
+выполняются в пуле потоков. Для каждого устройства держится своя
+requests.Session с keep-alive, ограничивается число одновременных запросов,
+а повторные флаги готовности, пришедшие до начала загрузки, объединяются.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from wire_format import ACCEPT_HEADER
+
+FETCH_WORKERS = 4
+PER_DEVICE_LIMIT = 1
+FETCH_TIMEOUT = 5
+LATENCY_WINDOW = 1000
+
+
+class FetchScheduler:
+    def __init__(self, handler, max_workers=FETCH_WORKERS, per_device_limit=PER_DEVICE_LIMIT,
+                 timeout=FETCH_TIMEOUT, error_handler=None):
+        """handler(device_id, response) вызывается в рабочем потоке для каждого ответа 200,
+        error_handler(device_id, error) - при ошибке запроса или обработки"""
+        self.handler = handler
+        self.error_handler = error_handler
+        self.per_device_limit = per_device_limit
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.pending = {}   # device_id -> url, ожидают свободного слота устройства
+        self.running = {}   # device_id -> число выполняющихся запросов
+        self.queued = 0     # переданы в пул, но еще не начаты
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"submitted": 0, "coalesced": 0, "completed": 0, "failed": 0}
+
+    def submit(self, device_id, url):
+        """Ставит загрузку в очередь. Возвращает False, если она объединена с уже ожидающей"""
+        with self.lock:
+            self.counters["submitted"] += 1
+            coalesced = device_id in self.pending
+            self.pending[device_id] = url
+            if coalesced:
+                self.counters["coalesced"] += 1
+            else:
+                self._dispatch(device_id)
+            return not coalesced
+
+    def _dispatch(self, device_id):
+        # Вызывается под self.lock
+        if device_id not in self.pending or self.running.get(device_id, 0) >= self.per_device_limit:
+            return
+        url = self.pending.pop(device_id)
+        self.running[device_id] = self.running.get(device_id, 0) + 1
+        self.queued += 1
+        self.executor.submit(self._fetch, device_id, url)
+
+    def _session(self, device_id):
+        with self.lock:
+            session = self.sessions.get(device_id)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_device_limit)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["Accept"] = ACCEPT_HEADER
+                self.sessions[device_id] = session
+            return session
+
+    def _fetch(self, device_id, url):
+        with self.lock:
+            self.queued -= 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self._session(device_id).get(url, timeout=self.timeout)
+            response.raise_for_status()
+            self.handler(device_id, response)
+            ok = True
+        except Exception as e:
+            print(f"Error fetching data from {device_id}: {e}")
+            if self.error_handler is not None:
+                self.error_handler(device_id, e)
+        finally:
+            with self.lock:
+                self.latencies.append(time.perf_counter() - start)
+                self.counters["completed" if ok else "failed"] += 1
+                self.running[device_id] -= 1
+                if not self.running[device_id]:
+                    del self.running[device_id]
+                self._dispatch(device_id)
+
+    def forget(self, device_id):
+        """Закрывает соединения устройства"""
+        with self.lock:
+            session = self.sessions.pop(device_id, None)
+        if session is not None:
+            session.close()
+
+    def stats(self):
+        """Глубина очереди и задержки загрузки для подбора размера пула"""
+        with self.lock:
+            latencies = np.array(self.latencies, dtype=float) * 1000
+            stats = {
+                "workers": self.max_workers,
+                "per_device_limit": self.per_device_limit,
+                "queue_depth": self.queued + len(self.pending),
+                "in_flight": sum(self.running.values()) - self.queued,
+                **self.counters,
+            }
+        if latencies.size:
+            stats["latency_ms"] = {
+                "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "max": float(latencies.max()),
+            }
+        return stats
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        for device_id in list(self.sessions):
+            self.forget(device_id)
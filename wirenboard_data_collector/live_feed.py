@@ -0,0 +1,102 @@
+"""Рассылка уведомлений о новых выборках подписчикам WebSocket и SSE.
+
+publish() вызывается из потока загрузки сразу после записи выборки в буфер
+и не ждет подписчиков: сообщения передаются в цикл asyncio, а у каждого
+подписчика своя ограниченная очередь. Если подписчик не успевает читать,
+самые старые сообщения в его очереди отбрасываются.
+"""
+import asyncio
+import threading
+
+from decimation import minmax_envelope
+from wire_format import CHANNELS
+
+FEED_QUEUE_SIZE = 16
+MAX_WAVEFORM_POINTS = 5000
+
+
+class Subscriber:
+    __slots__ = ('queue', 'device_id', 'waveform_points', 'dropped')
+
+    def __init__(self, device_id=None, waveform_points=0, queue_size=FEED_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.device_id = device_id
+        self.waveform_points = min(max(int(waveform_points), 0), MAX_WAVEFORM_POINTS)
+        self.dropped = 0
+
+    def wants(self, device_id):
+        return self.device_id is None or self.device_id == device_id
+
+    def offer(self, message):
+        """Кладет сообщение в очередь, вытесняя самое старое при переполнении"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class LiveFeed:
+    def __init__(self, queue_size=FEED_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.loop = None
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, device_id=None, waveform_points=0):
+        """Регистрирует подписчика. Вызывается из обработчика FastAPI"""
+        self.loop = asyncio.get_running_loop()
+        subscriber = Subscriber(device_id, waveform_points, self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, device_id, sample):
+        """Рассылает уведомление о выборке. Безопасно вызывать из любого потока"""
+        with self.lock:
+            subscribers = [s for s in self.subscribers if s.wants(device_id)]
+        if not subscribers or self.loop is None:
+            return
+
+        notification = {
+            "event": "capture",
+            "seq": sample.seq,
+            "device_id": device_id,
+            "timestamp": sample.timestamp,
+            "sample_rate": sample.sample_rate,
+            "resolution": sample.resolution,
+            "lengths": dict(zip(CHANNELS, sample.lengths)),
+            "stats": sample.stats.summary(CHANNELS),
+        }
+        # Огибающие считаются здесь, пока слот буфера не перезаписан, по одной на размер
+        waveforms = {}
+        for points in {s.waveform_points for s in subscribers if s.waveform_points}:
+            waveforms[points] = {
+                name: dict(zip(("start", "min", "max"),
+                               (part.tolist() for part in minmax_envelope(channel, points))))
+                for name, channel in zip(CHANNELS, sample.channels)
+            }
+
+        messages = [(s, {**notification, "waveform": waveforms[s.waveform_points]}
+                     if s.waveform_points else notification) for s in subscribers]
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, messages)
+        except RuntimeError:
+            # Цикл событий уже остановлен
+            pass
+
+    @staticmethod
+    def _deliver(messages):
+        for subscriber, message in messages:
+            subscriber.offer(message)
+
+    def stats(self):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "dropped": sum(s.dropped for s in subscribers),
+        }
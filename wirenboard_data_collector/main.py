@@ -1,12 +1,21 @@
+import os
 import json
-import requests
-from collections import deque
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
 from paho.mqtt import client as mqtt_client
 import uvicorn
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.encoders import jsonable_encoder
-from datetime import datetime
+from wire_format import (BINARY_CONTENT_TYPE, CHANNELS, decode_capture, decode_json_capture,
+                         encode_capture, encode_stream_frame)
+from ring_buffer import BUFFER_SIZE, SAMPLE_SIZE
+from fetcher import FetchScheduler
+from registry import LEGACY_DEVICE_ID, DeviceRegistry
+from stats import SampleStats
+from live_feed import MAX_WAVEFORM_POINTS, LiveFeed
+from decimation import DECIMATION_METHODS, WaveformCache, decimate
+from segment_store import MAX_SEGMENTS, SEGMENT_RECORDS, SegmentStore, format_ns, parse_ns
 
 app = FastAPI()
 
@@ -15,34 +24,30 @@ MQTT_BROKER = "192.168.0.67"
 MQTT_PORT = 1883
 MQTT_TOPIC_DATA_READY = "Data"
 MQTT_TOPIC_URL = "URL"
-DEVICE_API_URL = None
-
-class DataSample:
-    def __init__(self):
-        self.values = []
-        self.timestamp = None
-        self.sample_rate = None
-        self.resolution = None
-        self.device_id = None
-
-    def update(self, data):
-        self.values = data.get('current', []) + data.get('mic', []) + data.get('vibro', [])
-        metadata = data.get('metadata', {})
-        self.timestamp = metadata.get('timestamp')
-        self.sample_rate = metadata.get('sample_rate')
-        self.resolution = metadata.get('resolution')
-        self.device_id = metadata.get('device_id')
-
-# Буферы для хранения данных
-BUFFER_SIZE = 10
-data_buffer = deque(maxlen=BUFFER_SIZE)
+
+# Размер истории на диске: выборок в сегменте и число хранимых сегментов
+CAPTURE_SEGMENT_RECORDS = int(os.environ.get("CAPTURE_SEGMENT_RECORDS", SEGMENT_RECORDS))
+CAPTURE_MAX_SEGMENTS = int(os.environ.get("CAPTURE_MAX_SEGMENTS", MAX_SEGMENTS))
+
+# Устройства и их буферы для хранения данных
+devices = DeviceRegistry(BUFFER_SIZE, SAMPLE_SIZE)
+# История выборок на диске; нумерация продолжается после перезапуска
+capture_store = SegmentStore(sample_size=SAMPLE_SIZE, segment_records=CAPTURE_SEGMENT_RECORDS,
+                             max_segments=CAPTURE_MAX_SEGMENTS)
+devices.sequence.last = capture_store.last_seq()
+# Подписчики на уведомления о новых выборках (/ws, /events)
+live_feed = LiveFeed()
+waveform_cache = WaveformCache()
+SSE_KEEPALIVE = 15
 
 def connect_mqtt():
     def on_connect(client, userdata, flags, rc):
         if rc == 0:
             print("Connected to MQTT Broker!")
-            client.subscribe(MQTT_TOPIC_DATA_READY)
-            client.subscribe(MQTT_TOPIC_URL)
+            # Data/<device_id> и URL/<device_id>, а также старые топики без device_id
+            for topic in (MQTT_TOPIC_DATA_READY, MQTT_TOPIC_URL):
+                client.subscribe(topic)
+                client.subscribe(f"{topic}/+")
         else:
             print(f"Failed to connect, return code {rc}")
 
@@ -51,75 +56,292 @@ def connect_mqtt():
     client.connect(MQTT_BROKER, MQTT_PORT)
     return client
 
+def parse_topic(topic):
+    """'Data/<device_id>' -> ('Data', '<device_id>')"""
+    name, _, device_id = topic.partition("/")
+    return name, device_id or LEGACY_DEVICE_ID
+
 def on_message(client, userdata, msg):
-    global DEVICE_API_URL
-    
-    if msg.topic == MQTT_TOPIC_URL:
-        DEVICE_API_URL = f"http://{msg.payload.decode()}/get_data"
-        print(f"Device URL updated: {DEVICE_API_URL}")
-    
-    elif msg.topic == MQTT_TOPIC_DATA_READY and msg.payload.decode() == "1":
-        print("Data ready flag received")
-        if DEVICE_API_URL:
-            fetch_sensor_data()
+    topic, device_id = parse_topic(msg.topic)
 
-def fetch_sensor_data():
-    try:
-        response = requests.get(DEVICE_API_URL, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            sample = DataSample()
-            sample.update(data)
-            data_buffer.append(sample)
-            
-            print(f"New data received from {sample.device_id} at {sample.timestamp}")
-            print(f"Sample rate: {sample.sample_rate}, Resolution: {sample.resolution} bits")
-            
-    except Exception as e:
-        print(f"Error fetching data: {e}")
+    if topic == MQTT_TOPIC_URL:
+        device = devices.set_url(device_id, f"http://{msg.payload.decode()}/get_data")
+        print(f"Device {device_id} URL updated: {device.url}")
+
+    elif topic == MQTT_TOPIC_DATA_READY:
+        device = devices.seen(device_id)
+        if msg.payload.decode() == "1":
+            print(f"Data ready flag received from {device_id}")
+            if device.url:
+                fetch_sensor_data(device_id)
+
+def ingest_response(device_id, response):
+    """Разбирает ответ устройства и кладет выборку в его буфер (выполняется в пуле загрузки)"""
+    content_type = response.headers.get("Content-Type", "")
+    if content_type.startswith(BINARY_CONTENT_TYPE):
+        metadata, channels = decode_capture(response.content)
+    else:
+        metadata, channels = decode_json_capture(response.json())
+    sample = devices.record_capture(device_id, metadata, channels)
+    capture_store.append(sample, devices.get(device_id).buffer.data[sample.slot])
+    live_feed.publish(device_id, sample)
+
+    print(f"New data received from {sample.device_id} at {sample.timestamp}")
+    print(f"Sample rate: {sample.sample_rate}, Resolution: {sample.resolution} bits")
+
+fetch_scheduler = FetchScheduler(ingest_response, error_handler=devices.record_failure)
+
+def fetch_sensor_data(device_id):
+    """Ставит загрузку выборки в очередь, не блокируя поток MQTT"""
+    fetch_scheduler.submit(device_id, devices.get(device_id).url)
 
 # API Endpoints
 @app.get("/averages")
-async def get_averages():
-    """Возвращает средние значения последней выборки"""
-    if not data_buffer:
+async def get_averages(device_id: Optional[str] = None, window: int = Query(1, ge=1)):
+    """Возвращает средние значения и статистики каналов последней выборки.
+
+    window - число последних выборок устройства, по которым агрегируются статистики.
+    Статистики считаются при приеме выборки, поэтому запрос не проходит по данным.
+    """
+    buffer = devices.latest_buffer(device_id)
+    samples = buffer.samples()[-window:] if buffer else []
+    if not samples:
         return {"message": "No data available"}
-    
-    last_sample = data_buffer[-1]
+
+    last_sample = samples[-1]
+    stats = SampleStats.aggregate(s.stats for s in samples).summary(CHANNELS)
     return {
-        "current_avg": sum(last_sample.values[:len(last_sample.values)//3]) / (len(last_sample.values)//3),
-        "mic_avg": sum(last_sample.values[len(last_sample.values)//3:2*len(last_sample.values)//3]) / (len(last_sample.values)//3),
-        "vibro_avg": sum(last_sample.values[2*len(last_sample.values)//3:]) / (len(last_sample.values)//3),
-        "timestamp": last_sample.timestamp
+        "current_avg": stats["current"]["mean"],
+        "mic_avg": stats["mic"]["mean"],
+        "vibro_avg": stats["vibro"]["mean"],
+        "timestamp": last_sample.timestamp,
+        "device_id": last_sample.device_id,
+        "window": len(samples),
+        "stats": stats
     }
 
+SAMPLE_FORMATS = ("json", "ndjson", "binary")
+
+def sample_to_dict(sample):
+    return {
+        "seq": sample.seq,
+        **{name: channel.tolist() for name, channel in zip(CHANNELS, sample.channels)},
+        "timestamp": sample.timestamp,
+        "sample_rate": sample.sample_rate,
+        "resolution": sample.resolution,
+        "device_id": sample.device_id
+    }
+
+def stream_samples(found, sample_format):
+    """Отдает выборки по одной, пропуская те, что успели перезаписаться в буфере"""
+    for buffer, sample in found:
+        if sample_format == "binary":
+            frame = encode_stream_frame(sample.seq, encode_capture(
+                sample.channels, sample.sample_rate, sample.resolution, sample.timestamp, sample.device_id))
+        else:
+            frame = (json.dumps(sample_to_dict(sample)) + "\n").encode()
+        if buffer.is_current(sample):
+            yield frame
+
 @app.get("/samples")
-async def get_samples():
-    """Возвращает все сохраненные семплы с метаданными"""
-    return JSONResponse(content=jsonable_encoder({
-        "samples": [{
-            "values": sample.values,
-            "timestamp": sample.timestamp,
-            "sample_rate": sample.sample_rate,
-            "resolution": sample.resolution,
-            "device_id": sample.device_id
-        } for sample in data_buffer]
-    }))
+async def get_samples(device_id: Optional[str] = None, since: Optional[int] = None, format: str = "json"):
+    """Возвращает сохраненные семплы с метаданными.
+
+    since - курсор (seq последней полученной выборки), возвращаются только более новые.
+    format=ndjson или binary - потоковая выдача по одной выборке, курсор в заголовке X-Cursor.
+    """
+    if format not in SAMPLE_FORMATS:
+        return JSONResponse(status_code=400, content={"message": f"format must be one of {SAMPLE_FORMATS}"})
+
+    cursor, found = devices.since(-1 if since is None else since, device_id)
+    headers = {"X-Cursor": str(cursor)}
+
+    if format == "json":
+        samples = []
+        for buffer, sample in found:
+            entry = {
+                "seq": sample.seq,
+                "values": sample.values.tolist(),
+                "timestamp": sample.timestamp,
+                "sample_rate": sample.sample_rate,
+                "resolution": sample.resolution,
+                "device_id": sample.device_id
+            }
+            # Как в stream_samples: выборка, перезаписанная во время копирования, пропускается
+            if buffer.is_current(sample):
+                samples.append(entry)
+        return JSONResponse(headers=headers, content=jsonable_encoder({"cursor": cursor, "samples": samples}))
+
+    media_type = BINARY_CONTENT_TYPE if format == "binary" else "application/x-ndjson"
+    return StreamingResponse(stream_samples(found, format), media_type=media_type, headers=headers)
+
+@app.get("/samples/{seq}/waveform")
+async def get_waveform(seq: int, channel: str = "current", points: int = Query(2000, ge=3, le=20000),
+                       method: str = "minmax"):
+    """Возвращает прореженную осциллограмму канала выборки seq.
+
+    method=minmax - огибающая (x - начала интервалов, min, max), method=lttb - линия (x, y).
+    Результат кэшируется по (seq, канал, метод, число точек).
+    """
+    if channel not in CHANNELS:
+        return JSONResponse(status_code=400, content={"message": f"channel must be one of {CHANNELS}"})
+    if method not in DECIMATION_METHODS:
+        return JSONResponse(status_code=400, content={"message": f"method must be one of {DECIMATION_METHODS}"})
+
+    buffer, sample = devices.find(seq)
+    if sample is None:
+        return JSONResponse(status_code=404, content={"message": "Sample is no longer buffered"})
+
+    values = sample.channel(channel)
+    waveform = waveform_cache.get((seq, channel, method, points), lambda: decimate(values, points, method),
+                                  valid=lambda: buffer.is_current(sample))
+    if waveform is None or not buffer.is_current(sample):
+        return JSONResponse(status_code=404, content={"message": "Sample is no longer buffered"})
+
+    return {
+        "seq": seq,
+        "device_id": sample.device_id,
+        "channel": channel,
+        "method": method,
+        "length": len(values),
+        "sample_rate": sample.sample_rate,
+        **waveform
+    }
 
 @app.get("/metadata")
-async def get_metadata():
+async def get_metadata(device_id: Optional[str] = None):
     """Возвращает метаданные последней выборки"""
-    if not data_buffer:
+    last_sample = devices.latest(device_id)
+    if last_sample is None:
         return {"message": "No data available"}
     
-    last_sample = data_buffer[-1]
     return {
         "timestamp": last_sample.timestamp,
         "sample_rate": last_sample.sample_rate,
         "resolution": last_sample.resolution,
-        "device_id": last_sample.device_id
+        "device_id": last_sample.device_id,
+        "seq": last_sample.seq,
+        "lengths": dict(zip(CHANNELS, last_sample.lengths)),
+        "stats": last_sample.stats.summary(CHANNELS)
+    }
+
+@app.get("/last_sample")
+async def get_last_sample(device_id: Optional[str] = None):
+    """Возвращает последнюю выборку с раздельными каналами"""
+    last_sample = devices.latest(device_id)
+    if last_sample is None:
+        return {"message": "No data available"}
+
+    return {
+        "seq": last_sample.seq,
+        **{name: channel.tolist() for name, channel in zip(CHANNELS, last_sample.channels)},
+        "metadata": {
+            "timestamp": last_sample.timestamp,
+            "sample_rate": last_sample.sample_rate,
+            "resolution": last_sample.resolution,
+            "device_id": last_sample.device_id
+        }
     }
 
+HISTORY_FORMATS = ("index", "ndjson", "binary")
+
+@app.get("/history")
+async def get_history(device_id: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+                      since: Optional[int] = None, limit: int = Query(100, ge=1), format: str = "index"):
+    """Выборки из хранилища на диске за интервал [start, end] (ISO-8601).
+
+    format=index - только метаданные, ndjson и binary - потоковая выдача данных, как в /samples.
+    """
+    if format not in HISTORY_FORMATS:
+        return JSONResponse(status_code=400, content={"message": f"format must be one of {HISTORY_FORMATS}"})
+
+    try:
+        start_ns = parse_ns(start) if start else None
+        end_ns = parse_ns(end) if end else None
+    except ValueError:
+        return JSONResponse(status_code=400, content={"message": "start and end must be ISO-8601 timestamps"})
+
+    found = capture_store.query(device_id, start_ns, end_ns, since, limit)
+
+    def metadata(record):
+        return {
+            "seq": int(record["seq"]),
+            "timestamp": format_ns(int(record["time_ns"])),
+            "sample_rate": int(record["sample_rate"]),
+            "resolution": int(record["resolution"]),
+            "device_id": record["device_id"].decode(),
+        }
+
+    if format == "index":
+        return {"samples": [{**metadata(record), "lengths": dict(zip(CHANNELS, record["lengths"].tolist()))}
+                            for record, _ in found]}
+
+    def frames():
+        for record, channels in found:
+            meta = metadata(record)
+            if format == "binary":
+                yield encode_stream_frame(meta["seq"], encode_capture(
+                    channels, meta["sample_rate"], meta["resolution"], meta["timestamp"], meta["device_id"]))
+            else:
+                yield (json.dumps({**meta, **{name: channel.tolist() for name, channel in zip(CHANNELS, channels)}})
+                       + "\n").encode()
+
+    media_type = BINARY_CONTENT_TYPE if format == "binary" else "application/x-ndjson"
+    return StreamingResponse(frames(), media_type=media_type)
+
+@app.websocket("/ws")
+async def live_websocket(websocket: WebSocket, device_id: Optional[str] = None, waveform_points: int = 0):
+    """Уведомления о новых выборках со статистиками.
+
+    waveform_points > 0 - добавить огибающую min/max каждого канала из стольких точек
+    (не больше MAX_WAVEFORM_POINTS).
+    """
+    if not 0 <= waveform_points <= MAX_WAVEFORM_POINTS:
+        await websocket.close(code=1008, reason=f"waveform_points must be in 0..{MAX_WAVEFORM_POINTS}")
+        return
+    await websocket.accept()
+    subscriber = live_feed.subscribe(device_id, waveform_points)
+    try:
+        while True:
+            await websocket.send_json(await subscriber.queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_feed.unsubscribe(subscriber)
+
+@app.get("/events")
+async def live_events(device_id: Optional[str] = None, waveform_points: int = 0):
+    """То же, что /ws, в виде Server-Sent Events"""
+    if not 0 <= waveform_points <= MAX_WAVEFORM_POINTS:
+        return JSONResponse(status_code=400,
+                            content={"message": f"waveform_points must be in 0..{MAX_WAVEFORM_POINTS}"})
+    subscriber = live_feed.subscribe(device_id, waveform_points)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {message['event']}\nid: {message['seq']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            live_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/devices")
+async def get_devices():
+    """Возвращает зарегистрированные устройства и их состояние"""
+    return {"devices": [device.to_dict() for device in devices.devices()]}
+
+@app.get("/fetch_stats")
+async def get_fetch_stats():
+    """Возвращает глубину очереди загрузки и задержки запросов к устройствам"""
+    return {**fetch_scheduler.stats(), "live_feed": live_feed.stats()}
+
 def run():
     client = connect_mqtt()
     client.on_message = on_message
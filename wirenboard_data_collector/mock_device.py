@@ -0,0 +1,127 @@
+"""Локальная замена ESP32 для отладки и замеров производительности.
+
+Отдает /get_data в JSON или в бинарном формате (по заголовку Accept),
+как это делает прошивка esp32_data_collector_with_mqtt.
+
+    python mock_device.py --port 8081          # запустить сервер
+    python mock_device.py --bench --repeat 10  # сравнить JSON и бинарный прием
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+from wire_format import (ACCEPT_HEADER, BINARY_CONTENT_TYPE, CHANNELS, JSON_CONTENT_TYPE,
+                         decode_capture, decode_json_capture, encode_capture)
+
+SAMPLE_SIZE = 80000  # как SAMPLE_SIZE в прошивке ESP32
+SAMPLE_RATE = 240000
+RESOLUTION = 12
+
+
+def make_capture(sample_size=SAMPLE_SIZE, device_id="ESP32-MOCK", seed=None):
+    """Генерирует выборку со случайными 12-битными значениями по каждому каналу"""
+    rng = np.random.default_rng(seed)
+    channels = [rng.integers(0, 2 ** RESOLUTION, sample_size, dtype=np.uint16) for _ in CHANNELS]
+    metadata = {
+        "sample_rate": SAMPLE_RATE,
+        "resolution": RESOLUTION,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "device_id": device_id,
+    }
+    return metadata, channels
+
+
+class MockDeviceHandler(BaseHTTPRequestHandler):
+    json_body = b""
+    binary_body = b""
+
+    def do_GET(self):
+        if self.path != "/get_data":
+            self.send_error(404, "Not found")
+            return
+
+        if BINARY_CONTENT_TYPE in self.headers.get("Accept", ""):
+            content_type, body = BINARY_CONTENT_TYPE, self.binary_body
+        else:
+            content_type, body = JSON_CONTENT_TYPE, self.json_body
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(host="127.0.0.1", port=8081, sample_size=SAMPLE_SIZE, device_id="ESP32-MOCK"):
+    """Создает HTTP сервер, отдающий заранее закодированную выборку в обоих форматах"""
+    metadata, channels = make_capture(sample_size, device_id)
+    handler = type("Handler", (MockDeviceHandler,), {
+        "json_body": json.dumps({
+            **{name: channel.tolist() for name, channel in zip(CHANNELS, channels)},
+            "metadata": metadata,
+        }).encode(),
+        "binary_body": encode_capture(channels, **metadata),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def benchmark(url, repeat=10):
+    """Замер полного цикла запрос + разбор для JSON и бинарного формата"""
+    results = {}
+    for name, accept in (("json", JSON_CONTENT_TYPE), ("binary", ACCEPT_HEADER)):
+        session = requests.Session()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = session.get(url, headers={"Accept": accept}, timeout=5)
+            if response.headers.get("Content-Type", "").startswith(BINARY_CONTENT_TYPE):
+                _, channels = decode_capture(response.content)
+            else:
+                _, channels = decode_json_capture(response.json())
+            timings.append(time.perf_counter() - start)
+        results[name] = {
+            "median_ms": 1000 * float(np.median(timings)),
+            "bytes": len(response.content),
+            "values": int(sum(len(c) for c in channels)),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock ESP32 data collector")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+    parser.add_argument("--device-id", default="ESP32-MOCK")
+    parser.add_argument("--bench", action="store_true", help="run ingest benchmark and exit")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.sample_size, args.device_id)
+    url = f"http://{args.host}:{server.server_address[1]}/get_data"
+
+    if not args.bench:
+        print(f"Mock device serving {url}")
+        server.serve_forever()
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        for name, result in benchmark(url, args.repeat).items():
+            print(f"{name:>6}: {result['median_ms']:8.2f} ms, {result['bytes']} bytes, "
+                  f"{result['values']} values")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
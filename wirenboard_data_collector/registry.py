@@ -0,0 +1,161 @@
+"""Реестр устройств, подключенных к шлюзу.
+
+Каждое устройство публикует свой URL в URL/<device_id> и флаг готовности
+в Data/<device_id>. У каждого устройства свой кольцевой буфер, поэтому
+прием данных от разных ESP32 не проходит через общую блокировку.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from ring_buffer import BUFFER_SIZE, SAMPLE_SIZE, SampleRingBuffer, SequenceCounter
+
+# Устройства без device_id в топике (старая прошивка публикует просто в URL и Data)
+LEGACY_DEVICE_ID = "default"
+# Через сколько секунд без сообщений устройство считается неактивным
+STALE_AFTER = 300
+
+
+def _isoformat(moment):
+    if moment is None:
+        return None
+    return datetime.fromtimestamp(moment, timezone.utc).isoformat()
+
+
+class Device:
+    __slots__ = ('device_id', 'url', 'buffer', 'last_seen', 'last_capture', 'last_error',
+                 'consecutive_failures', 'captures', 'failures')
+
+    def __init__(self, device_id, buffer_size=BUFFER_SIZE, sample_size=SAMPLE_SIZE, sequence=None):
+        self.device_id = device_id
+        self.url = None
+        self.buffer = SampleRingBuffer(buffer_size, sample_size, sequence=sequence)
+        self.last_seen = None
+        self.last_capture = None
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.captures = 0
+        self.failures = 0
+
+    def health(self, now=None):
+        now = time.time() if now is None else now
+        if self.url is None:
+            return "unknown"
+        if self.last_seen is None or now - self.last_seen > STALE_AFTER:
+            return "stale"
+        if self.consecutive_failures:
+            return "error"
+        return "ok"
+
+    def to_dict(self):
+        return {
+            "device_id": self.device_id,
+            "url": self.url,
+            "health": self.health(),
+            "last_seen": _isoformat(self.last_seen),
+            "last_capture": _isoformat(self.last_capture),
+            "last_error": self.last_error,
+            "captures": self.captures,
+            "failures": self.failures,
+            "buffered": len(self.buffer),
+        }
+
+
+class DeviceRegistry:
+    def __init__(self, buffer_size=BUFFER_SIZE, sample_size=SAMPLE_SIZE):
+        self.buffer_size = buffer_size
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        # Общая нумерация выборок всех устройств для курсора /samples?since=
+        self.sequence = SequenceCounter()
+        self._devices = {}
+
+    def __len__(self):
+        return len(self._devices)
+
+    def get(self, device_id):
+        return self._devices.get(device_id)
+
+    def device(self, device_id):
+        """Возвращает устройство, регистрируя его при первом обращении"""
+        device = self._devices.get(device_id)
+        if device is None:
+            with self.lock:
+                device = self._devices.get(device_id)
+                if device is None:
+                    device = Device(device_id, self.buffer_size, self.sample_size, self.sequence)
+                    self._devices[device_id] = device
+        return device
+
+    def devices(self):
+        return list(self._devices.values())
+
+    def seen(self, device_id):
+        device = self.device(device_id)
+        device.last_seen = time.time()
+        return device
+
+    def set_url(self, device_id, url):
+        device = self.seen(device_id)
+        device.url = url
+        return device
+
+    def record_capture(self, device_id, metadata, channels):
+        device = self.device(device_id)
+        sample = device.buffer.append(metadata, channels)
+        device.last_capture = device.last_seen = time.time()
+        device.consecutive_failures = 0
+        device.captures += 1
+        return sample
+
+    def record_failure(self, device_id, error):
+        device = self.device(device_id)
+        device.last_error = str(error)
+        device.consecutive_failures += 1
+        device.failures += 1
+
+    def buffers(self, device_id=None):
+        """Буферы выбранного устройства или всех устройств"""
+        if device_id is not None:
+            device = self._devices.get(device_id)
+            return [device.buffer] if device else []
+        return [device.buffer for device in self.devices()]
+
+    def since(self, seq, device_id=None):
+        """Выборки новее курсора seq по всем (или одному) устройствам, упорядоченные по seq.
+
+        Возвращает (cursor, [(buffer, sample), ...]). Выборки с номером больше cursor
+        в ответ не попадают, даже если уже записаны, и будут отданы при следующем запросе.
+        """
+        cursor = self.sequence.high_water()
+        if seq > cursor:
+            # Курсор от предыдущего запуска шлюза: отдаем все, что есть в буферах
+            seq = -1
+        found = [(buffer, sample) for buffer in self.buffers(device_id)
+                 for sample in buffer.since(seq, cursor)]
+        found.sort(key=lambda item: item[1].seq)
+        return cursor, found
+
+    def find(self, seq, device_id=None):
+        """Ищет выборку по номеру. Возвращает (buffer, sample) или (None, None)"""
+        for buffer in self.buffers(device_id):
+            for sample in buffer.samples():
+                if sample.seq == seq:
+                    return buffer, sample
+        return None, None
+
+    def latest_buffer(self, device_id=None):
+        """Буфер устройства или буфер устройства с самой свежей выборкой"""
+        if device_id is not None:
+            device = self._devices.get(device_id)
+            return device.buffer if device else None
+
+        devices = [d for d in self.devices() if d.last_capture is not None]
+        if not devices:
+            return None
+        return max(devices, key=lambda d: d.last_capture).buffer
+
+    def latest(self, device_id=None):
+        """Последняя выборка устройства или самая свежая по всем устройствам"""
+        buffer = self.latest_buffer(device_id)
+        return buffer.latest() if buffer else None
@@ -0,0 +1,139 @@
+"""Кольцевой буфер выборок с заранее выделенной памятью.
+
+Все выборки хранятся в одном массиве (capacity, channels, sample_size) uint16,
+поэтому объем памяти фиксирован, а запись новой выборки на место самой старой
+выполняется за O(1) без выделения памяти.
+"""
+import threading
+import numpy as np
+from wire_format import CHANNELS
+from stats import SampleStats
+
+BUFFER_SIZE = 10
+SAMPLE_SIZE = 80000  # SAMPLE_SIZE из прошивки ESP32
+
+
+class DataSample:
+    """Метаданные одной выборки и представления ее каналов в буфере"""
+    __slots__ = ('seq', 'slot', 'timestamp', 'sample_rate', 'resolution', 'device_id',
+                 'lengths', 'channels', 'stats')
+
+    def __init__(self, seq, slot, metadata, lengths, channels, stats=None):
+        self.seq = seq
+        self.slot = slot
+        self.timestamp = metadata.get('timestamp')
+        self.sample_rate = metadata.get('sample_rate')
+        self.resolution = metadata.get('resolution')
+        self.device_id = metadata.get('device_id')
+        self.lengths = lengths
+        self.channels = channels
+        self.stats = stats
+
+    @property
+    def values(self):
+        """Все каналы подряд, как в прежнем JSON-формате /samples"""
+        return np.concatenate(self.channels)
+
+    def channel(self, name):
+        return self.channels[CHANNELS.index(name)]
+
+
+class SequenceCounter:
+    """Сквозная нумерация выборок (seq) для нескольких буферов.
+
+    Номер присваивается и выборка становится видимой под одной блокировкой,
+    поэтому все выборки с seq <= last уже доступны для чтения.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last = -1
+
+    def high_water(self):
+        with self.lock:
+            return self.last
+
+
+class SampleRingBuffer:
+    def __init__(self, capacity=BUFFER_SIZE, sample_size=SAMPLE_SIZE, channels=CHANNELS,
+                 sequence=None):
+        self.capacity = capacity
+        self.sample_size = sample_size
+        self.channel_names = tuple(channels)
+        self.data = np.zeros((capacity, len(self.channel_names), sample_size), dtype=np.uint16)
+        # Смещение начала каждого канала в строке буфера (в отсчетах)
+        self.channel_offsets = np.arange(len(self.channel_names)) * sample_size
+        self.records = [None] * capacity
+        self.count = 0
+        self.sequence = sequence if sequence is not None else SequenceCounter()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __bool__(self):
+        return self.count > 0
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def append(self, metadata, channels):
+        """Копирует каналы выборки на место самой старой и возвращает ее запись.
+
+        Каналы длиннее sample_size обрезаются.
+        """
+        with self.lock:
+            slot = self.count % self.capacity
+            # Запись слота снимается до копирования: читатель, получивший прежнюю
+            # запись, после чтения данных увидит is_current() == False
+            self.records[slot] = None
+            row = self.data[slot]
+            lengths = []
+            views = []
+            for index, channel in enumerate(channels[:len(self.channel_names)]):
+                length = min(len(channel), self.sample_size)
+                row[index, :length] = channel[:length]
+                lengths.append(length)
+                views.append(row[index, :length])
+            for index in range(len(views), len(self.channel_names)):
+                lengths.append(0)
+                views.append(row[index, :0])
+
+            stats = SampleStats.from_channels(row, lengths)
+            with self.sequence.lock:
+                self.sequence.last += 1
+                record = DataSample(self.sequence.last, slot, metadata, tuple(lengths), views, stats)
+                self.records[slot] = record
+            self.count += 1
+            return record
+
+    def latest(self):
+        """Последняя выборка или None"""
+        with self.lock:
+            if not self.count:
+                return None
+            return self.records[(self.count - 1) % self.capacity]
+
+    def samples(self):
+        """Выборки из буфера от самой старой к самой новой"""
+        with self.lock:
+            first = max(0, self.count - self.capacity)
+            return [self.records[index % self.capacity] for index in range(first, self.count)]
+
+    def since(self, seq, until=None):
+        """Выборки с номером больше seq (и не больше until), от старых к новым"""
+        return [record for record in self.samples()
+                if record.seq > seq and (until is None or record.seq <= until)]
+
+    def is_current(self, record):
+        """False, если слот записи перезаписывается или уже перезаписан более новой выборкой.
+
+        Проверять после чтения данных записи: True означает, что данные прочитаны целиком.
+        """
+        return self.records[record.slot] is record
+
+    def __iter__(self):
+        return iter(self.samples())
+
+    def __getitem__(self, index):
+        return self.samples()[index]
@@ -0,0 +1,199 @@
+"""Хранилище выборок на диске.
+
+Выборки дописываются в сегменты записями фиксированного размера
+(каналы x SAMPLE_SIZE, uint16) в том же виде, что и строка кольцевого буфера,
+без преобразования в текст. Для каждого сегмента ведется индекс с метаданными.
+Сегмент закрывается по числу записей или по времени, старые сегменты удаляются.
+Чтение идет через numpy.memmap, поэтому история не загружается в память целиком.
+"""
+import glob
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ring_buffer import SAMPLE_SIZE
+from wire_format import CHANNELS, SAMPLE_DTYPE
+
+STORE_DIR = "captures"
+# Запись 3 x 80000 отсчетов uint16 ~ 480 КБ: по умолчанию сегмент ~30 МБ, всего ~300 МБ
+SEGMENT_RECORDS = 64
+SEGMENT_SECONDS = 3600
+MAX_SEGMENTS = 10          # 0 - хранить все сегменты
+DEVICE_ID_BYTES = 64
+
+INDEX_DTYPE = np.dtype([
+    ("seq", "<i8"),
+    ("time_ns", "<i8"),
+    ("device_id", f"S{DEVICE_ID_BYTES}"),
+    ("sample_rate", "<u4"),
+    ("resolution", "<u1"),
+    ("lengths", "<u4", (len(CHANNELS),)),
+])
+
+
+def parse_ns(timestamp):
+    """ISO-8601 время в наносекундах UTC. ValueError, если время не разобрать"""
+    moment = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1_000_000) * 1000
+
+
+def timestamp_ns(timestamp):
+    """Время выборки в наносекундах UTC, либо текущее время, если его нет или не разобрать"""
+    if timestamp:
+        try:
+            return parse_ns(timestamp)
+        except ValueError:
+            pass
+    return time.time_ns()
+
+
+def device_key(device_id):
+    """Идентификатор устройства в индексе: UTF-8, обрезанный до DEVICE_ID_BYTES по границе символа.
+
+    Одинаково применяется при записи и в запросах, поэтому длинные идентификаторы находятся.
+    """
+    return (device_id or "").encode()[:DEVICE_ID_BYTES].decode(errors="ignore").encode()
+
+
+def format_ns(value):
+    return datetime.fromtimestamp(value / 1e9, timezone.utc).isoformat()
+
+
+class Segment:
+    def __init__(self, path_prefix, record_shape):
+        self.data_path = path_prefix + ".bin"
+        self.index_path = path_prefix + ".idx"
+        self.record_shape = record_shape
+        self.record_size = int(np.prod(record_shape)) * SAMPLE_DTYPE.itemsize
+        self.created = os.path.getmtime(self.index_path) if os.path.exists(self.index_path) else time.time()
+
+    def __len__(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        # Учитываются только записи, для которых данные уже полностью на диске
+        return min(os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize,
+                   os.path.getsize(self.data_path) // self.record_size)
+
+    def index(self):
+        count = len(self)
+        if not count:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count)
+
+    def data(self, count=None):
+        """Записи сегмента как memmap (count, каналы, отсчеты)"""
+        count = len(self) if count is None else count
+        return np.memmap(self.data_path, dtype=SAMPLE_DTYPE, mode="r",
+                         shape=(count,) + tuple(self.record_shape))
+
+    def remove(self):
+        for path in (self.data_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class SegmentStore:
+    def __init__(self, directory=STORE_DIR, sample_size=SAMPLE_SIZE, segment_records=SEGMENT_RECORDS,
+                 segment_seconds=SEGMENT_SECONDS, max_segments=MAX_SEGMENTS):
+        self.directory = directory
+        self.record_shape = (len(CHANNELS), sample_size)
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = [Segment(path[:-len(".idx")], self.record_shape)
+                         for path in sorted(glob.glob(os.path.join(directory, "segment_*.idx")))]
+        self.active = None
+        self.data_file = None
+        self.index_file = None
+
+    def last_seq(self):
+        """Номер последней сохраненной выборки или -1"""
+        for segment in reversed(self.segments):
+            index = segment.index()
+            if len(index):
+                return int(index["seq"][-1])
+        return -1
+
+    def _rotate(self):
+        # Вызывается под self.lock
+        self.close()
+        number = 0
+        if self.segments:
+            number = int(os.path.basename(self.segments[-1].index_path)[len("segment_"):-len(".idx")]) + 1
+        self.active = Segment(os.path.join(self.directory, f"segment_{number:06d}"), self.record_shape)
+        self.segments.append(self.active)
+        self.data_file = open(self.active.data_path, "ab")
+        self.index_file = open(self.active.index_path, "ab")
+
+        while self.max_segments and len(self.segments) > self.max_segments:
+            self.segments.pop(0).remove()
+
+    def append(self, sample, row):
+        """Дописывает выборку. row - строка буфера (каналы x отсчеты, uint16)"""
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record["seq"] = sample.seq
+        record["time_ns"] = timestamp_ns(sample.timestamp)
+        record["device_id"] = device_key(sample.device_id)
+        record["sample_rate"] = sample.sample_rate or 0
+        record["resolution"] = sample.resolution or 0
+        record["lengths"] = sample.lengths
+
+        with self.lock:
+            if (self.active is None or len(self.active) >= self.segment_records
+                    or time.time() - self.active.created >= self.segment_seconds):
+                self._rotate()
+            # Сначала данные, затем индекс: запись видна читателям только целиком
+            self.data_file.write(np.ascontiguousarray(row, dtype=SAMPLE_DTYPE).data)
+            self.data_file.flush()
+            self.index_file.write(record.tobytes())
+            self.index_file.flush()
+
+    def query(self, device_id=None, start_ns=None, end_ns=None, after_seq=None, limit=None):
+        """Выборки из истории по устройству и интервалу времени.
+
+        Возвращает список (index_record, channels), где channels - представления memmap.
+        """
+        with self.lock:
+            segments = list(self.segments)
+
+        found = []
+        for segment in segments:
+            index = segment.index()
+            if not len(index):
+                continue
+            mask = np.ones(len(index), dtype=bool)
+            if device_id is not None:
+                mask &= index["device_id"] == device_key(device_id)
+            if start_ns is not None:
+                mask &= index["time_ns"] >= start_ns
+            if end_ns is not None:
+                mask &= index["time_ns"] <= end_ns
+            if after_seq is not None:
+                mask &= index["seq"] > after_seq
+            positions = np.flatnonzero(mask)
+            if not len(positions):
+                continue
+
+            data = segment.data(len(index))
+            for position in positions:
+                record = index[position]
+                channels = [data[position, channel, :length]
+                            for channel, length in enumerate(record["lengths"])]
+                found.append((record, channels))
+                if limit is not None and len(found) >= limit:
+                    return found
+        return found
+
+    def close(self):
+        for handle in (self.data_file, self.index_file):
+            if handle is not None:
+                handle.close()
+        self.data_file = self.index_file = None
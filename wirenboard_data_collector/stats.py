@@ -0,0 +1,71 @@
+"""Статистики каналов, вычисляемые один раз при приеме выборки.
+
+Хранятся суммы, суммы квадратов, минимумы и максимумы по каналам, поэтому
+статистики окна из нескольких выборок собираются за O(число выборок),
+без повторного прохода по данным.
+"""
+import numpy as np
+
+STAT_NAMES = ("mean", "rms", "min", "max", "std", "peak_to_peak", "crest_factor")
+
+
+class SampleStats:
+    __slots__ = ('count', 'total', 'total_sq', 'minimum', 'maximum')
+
+    def __init__(self, count, total, total_sq, minimum, maximum):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def from_channels(cls, block, lengths):
+        """Считает статистики по строкам block (каналы x отсчеты) длиной lengths"""
+        lengths = np.asarray(lengths, dtype=np.int64)
+        n_channels = len(lengths)
+        if n_channels and np.all(lengths == lengths[0]) and lengths[0]:
+            # Каналы одинаковой длины: один векторный проход по 2-D представлению
+            values = np.asarray(block[:n_channels, :lengths[0]], dtype=np.float64)
+            return cls(lengths, values.sum(axis=1), np.einsum('ij,ij->i', values, values),
+                       values.min(axis=1), values.max(axis=1))
+
+        total = np.zeros(n_channels)
+        total_sq = np.zeros(n_channels)
+        minimum = np.full(n_channels, np.nan)
+        maximum = np.full(n_channels, np.nan)
+        for index, length in enumerate(lengths):
+            if length:
+                values = np.asarray(block[index, :length], dtype=np.float64)
+                total[index] = values.sum()
+                total_sq[index] = values.dot(values)
+                minimum[index] = values.min()
+                maximum[index] = values.max()
+        return cls(lengths, total, total_sq, minimum, maximum)
+
+    @classmethod
+    def aggregate(cls, stats):
+        """Объединяет статистики нескольких выборок"""
+        stats = list(stats)
+        return cls(np.sum([s.count for s in stats], axis=0),
+                   np.sum([s.total for s in stats], axis=0),
+                   np.sum([s.total_sq for s in stats], axis=0),
+                   np.fmin.reduce([s.minimum for s in stats]),
+                   np.fmax.reduce([s.maximum for s in stats]))
+
+    def summary(self, channel_names):
+        """Словарь {канал: {статистика: значение}}, None для пустых каналов"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            count = np.where(self.count > 0, self.count, np.nan)
+            mean = self.total / count
+            rms = np.sqrt(self.total_sq / count)
+            std = np.sqrt(np.maximum(rms ** 2 - mean ** 2, 0))
+            peak = np.fmax(np.abs(self.minimum), np.abs(self.maximum))
+            crest = np.where(rms > 0, peak / rms, np.nan)
+        columns = (mean, rms, self.minimum, self.maximum, std, self.maximum - self.minimum, crest)
+
+        result = {}
+        for index, name in enumerate(channel_names):
+            result[name] = {stat: (None if np.isnan(column[index]) else float(column[index]))
+                            for stat, column in zip(STAT_NAMES, columns)}
+        return result
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули проекта - отдельные скрипты в каталоге выше
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,55 @@
+import numpy as np
+
+from ring_buffer import SampleRingBuffer, SequenceCounter
+
+
+def capture(value, length=8):
+    return [np.full(length, value, dtype=np.uint16)] * 3
+
+
+def test_append_overwrites_oldest_slot():
+    buffer = SampleRingBuffer(capacity=2, sample_size=8)
+    records = [buffer.append({'device_id': 'dev'}, capture(i)) for i in range(3)]
+
+    assert [r.seq for r in buffer] == [1, 2]
+    assert not buffer.is_current(records[0])
+    assert buffer.is_current(records[1]) and buffer.is_current(records[2])
+    assert records[2].slot == records[0].slot
+    np.testing.assert_array_equal(buffer.latest().channel('current'), np.full(8, 2))
+
+
+def test_long_channels_are_truncated():
+    buffer = SampleRingBuffer(capacity=1, sample_size=4)
+    record = buffer.append({}, [np.arange(10), np.arange(2)])
+    assert record.lengths == (4, 2, 0)
+    np.testing.assert_array_equal(record.values, [0, 1, 2, 3, 0, 1])
+
+
+def test_slot_is_not_current_while_it_is_overwritten():
+    """Читатель прежней записи не должен считать ее актуальной во время копирования"""
+    buffer = SampleRingBuffer(capacity=1, sample_size=8)
+    old = buffer.append({}, capture(1))
+    seen = []
+
+    class Channel:
+        # Срез канала берется в середине копирования строки слота
+        def __len__(self):
+            return 8
+
+        def __getitem__(self, item):
+            seen.append(buffer.is_current(old))
+            return np.full(8, 2, dtype=np.uint16)[item]
+
+    buffer.append({}, [Channel()] * 3)
+    assert seen and not any(seen)
+
+
+def test_shared_sequence_across_buffers():
+    sequence = SequenceCounter()
+    first = SampleRingBuffer(capacity=2, sample_size=4, sequence=sequence)
+    second = SampleRingBuffer(capacity=2, sample_size=4, sequence=sequence)
+    seqs = [first.append({}, capture(0, 4)).seq, second.append({}, capture(0, 4)).seq,
+            first.append({}, capture(0, 4)).seq]
+    assert seqs == [0, 1, 2]
+    assert sequence.high_water() == 2
+    assert [r.seq for r in first.since(0)] == [2]
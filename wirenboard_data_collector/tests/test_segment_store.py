@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from ring_buffer import SampleRingBuffer
+from segment_store import DEVICE_ID_BYTES, SegmentStore, parse_ns
+
+
+def fill(store, buffer, device_id, timestamp, value=1):
+    record = buffer.append({'device_id': device_id, 'timestamp': timestamp, 'sample_rate': 1000},
+                           [np.full(5, value, dtype=np.uint16)] * 3)
+    store.append(record, buffer.data[record.slot])
+    return record
+
+
+def test_query_by_device_and_time(tmp_path):
+    store = SegmentStore(str(tmp_path), sample_size=8, segment_records=2)
+    buffer = SampleRingBuffer(capacity=2, sample_size=8)
+    fill(store, buffer, 'a', '2025-01-01T00:00:00', 1)
+    fill(store, buffer, 'b', '2025-01-01T00:01:00', 2)
+    fill(store, buffer, 'a', '2025-01-01T00:02:00', 3)
+
+    found = store.query('a')
+    assert [int(record['seq']) for record, _ in found] == [0, 2]
+    np.testing.assert_array_equal(found[1][1][0], np.full(5, 3))
+
+    found = store.query(start_ns=parse_ns('2025-01-01T00:00:30'), end_ns=parse_ns('2025-01-01T00:01:30'))
+    assert [record['device_id'] for record, _ in found] == [b'b']
+    assert len(store.query(after_seq=0, limit=1)) == 1
+    assert store.last_seq() == 2
+
+
+@pytest.mark.parametrize('device_id', ['d' * (DEVICE_ID_BYTES + 10), 'ж' * DEVICE_ID_BYTES])
+def test_long_device_ids_are_found(tmp_path, device_id):
+    store = SegmentStore(str(tmp_path), sample_size=8)
+    buffer = SampleRingBuffer(capacity=2, sample_size=8)
+    fill(store, buffer, device_id, '2025-01-01T00:00:00')
+    fill(store, buffer, 'other', '2025-01-01T00:00:00')
+
+    found = store.query(device_id)
+    assert len(found) == 1
+    assert len(found[0][0]['device_id']) <= DEVICE_ID_BYTES
+    assert device_id.startswith(found[0][0]['device_id'].decode())
+
+
+def test_parse_ns():
+    assert parse_ns('1970-01-01T00:00:01Z') == 10 ** 9
+    assert parse_ns('1970-01-01T03:00:01+03:00') == 10 ** 9
+    with pytest.raises(ValueError):
+        parse_ns('yesterday')
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from wire_format import (CHANNELS, SAMPLE_DTYPE, decode_capture, decode_json_capture, encode_capture,
+                         encode_stream_frame, iter_stream_frames)
+
+
+def make_channels(lengths, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 4096, length).astype(SAMPLE_DTYPE) for length in lengths]
+
+
+@pytest.mark.parametrize('lengths', [(1000, 1000, 1000), (5, 0, 17), (0, 0, 0)])
+def test_round_trip(lengths):
+    channels = make_channels(lengths)
+    buffer = encode_capture(channels, 8000, 12, '2025-06-01T12:00:00.123456', 'ESP32-01')
+    metadata, decoded = decode_capture(buffer)
+
+    assert metadata == {'sample_rate': 8000, 'resolution': 12,
+                        'timestamp': '2025-06-01T12:00:00.123456', 'device_id': 'ESP32-01'}
+    assert len(decoded) == len(channels)
+    for original, channel in zip(channels, decoded):
+        assert channel.dtype == SAMPLE_DTYPE
+        np.testing.assert_array_equal(channel, original)
+
+
+def test_round_trip_unicode_and_missing_metadata():
+    channels = make_channels((3, 3, 3))
+    metadata, decoded = decode_capture(encode_capture(channels, None, None, None, 'датчик-№1'))
+    assert metadata == {'sample_rate': 0, 'resolution': 0, 'timestamp': None, 'device_id': 'датчик-№1'}
+    np.testing.assert_array_equal(decoded[2], channels[2])
+
+
+def test_channels_are_aligned_views():
+    buffer = encode_capture(make_channels((10, 10, 10)), 1000, 12, 'x', 'odd-length-id')
+    _, decoded = decode_capture(buffer)
+    for channel in decoded:
+        assert channel.base is not None
+        assert channel.__array_interface__['data'][0] % SAMPLE_DTYPE.itemsize == 0
+
+
+def test_truncated_and_foreign_buffers_are_rejected():
+    buffer = encode_capture(make_channels((100, 100, 100)), 1000, 12, 'x', 'dev')
+    with pytest.raises(ValueError):
+        decode_capture(buffer[:-1])
+    with pytest.raises(ValueError):
+        decode_capture(buffer[:8])
+    with pytest.raises(ValueError):
+        decode_capture(b'JSON' + buffer[4:])
+
+
+def test_stream_frames():
+    captures = [(seq, make_channels((seq + 1, 2, 3), seed=seq)) for seq in (7, 8, 42)]
+    stream = b''.join(encode_stream_frame(seq, encode_capture(channels, 1000, 12, str(seq), 'dev'))
+                      for seq, channels in captures)
+
+    frames = list(iter_stream_frames(stream))
+    assert [seq for seq, _, _ in frames] == [7, 8, 42]
+    for (_, channels), (seq, metadata, decoded) in zip(captures, frames):
+        assert metadata['timestamp'] == str(seq)
+        for original, channel in zip(channels, decoded):
+            np.testing.assert_array_equal(channel, original)
+
+
+def test_json_capture_matches_binary_layout():
+    channels = make_channels((4, 4, 4))
+    data = {name: channel.tolist() for name, channel in zip(CHANNELS, channels)}
+    data['metadata'] = {'sample_rate': 1000, 'device_id': 'dev'}
+    metadata, decoded = decode_json_capture(data)
+    assert metadata['device_id'] == 'dev'
+    for original, channel in zip(channels, decoded):
+        assert channel.dtype == SAMPLE_DTYPE
+        np.testing.assert_array_equal(channel, original)
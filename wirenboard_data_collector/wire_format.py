@@ -0,0 +1,108 @@
+"""Бинарный формат передачи выборок ESP32 -> Wirenboard.
+
+Кадр состоит из заголовка фиксированного размера, строк device_id и timestamp,
+длин каналов и самих данных каналов (uint16, little-endian), выровненных по 8 байт.
+Данные читаются через np.frombuffer, поэтому каналы - это представления
+поверх буфера ответа без копирования.
+"""
+import struct
+import numpy as np
+
+BINARY_CONTENT_TYPE = "application/octet-stream"
+JSON_CONTENT_TYPE = "application/json"
+# Бинарный формат предпочтительнее, JSON остается запасным вариантом
+ACCEPT_HEADER = f"{BINARY_CONTENT_TYPE}, {JSON_CONTENT_TYPE};q=0.5"
+
+MAGIC = b"FDC1"
+VERSION = 1
+CHANNELS = ("current", "mic", "vibro")
+SAMPLE_DTYPE = np.dtype("<u2")
+
+# magic, version, channels, resolution, reserved, sample_rate, len(device_id), len(timestamp)
+_HEADER = struct.Struct("<4sBBBBIHH")
+# Кадр потока /samples?format=binary: seq, длина выборки в байтах
+_STREAM_FRAME = struct.Struct("<QI")
+_ALIGN = 8
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def encode_capture(channels, sample_rate, resolution, timestamp, device_id):
+    """Кодирует выборку в бинарный кадр.
+
+    channels - последовательность массивов в порядке CHANNELS.
+    """
+    device_bytes = (device_id or "").encode()
+    timestamp_bytes = (timestamp or "").encode()
+    arrays = [np.ascontiguousarray(c, dtype=SAMPLE_DTYPE) for c in channels]
+
+    header = _HEADER.pack(MAGIC, VERSION, len(arrays), resolution or 0, 0,
+                          sample_rate or 0, len(device_bytes), len(timestamp_bytes))
+    lengths = struct.pack(f"<{len(arrays)}I", *(len(a) for a in arrays))
+    head = header + device_bytes + timestamp_bytes + lengths
+    padding = b"\x00" * (_aligned(len(head)) - len(head))
+    return b"".join([head, padding] + [a.tobytes() for a in arrays])
+
+
+def decode_capture(buffer):
+    """Разбирает бинарный кадр.
+
+    Возвращает (metadata, channels), где channels - список массивов uint16,
+    ссылающихся на исходный буфер.
+    """
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Binary capture is shorter than its header")
+
+    magic, version, n_channels, resolution, _, sample_rate, device_len, timestamp_len = \
+        _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported binary capture: magic={magic!r}, version={version}")
+
+    offset = _HEADER.size
+    device_id = bytes(buffer[offset:offset + device_len]).decode()
+    offset += device_len
+    timestamp = bytes(buffer[offset:offset + timestamp_len]).decode()
+    offset += timestamp_len
+    lengths = struct.unpack_from(f"<{n_channels}I", buffer, offset)
+    offset = _aligned(offset + 4 * n_channels)
+
+    if offset + sum(lengths) * SAMPLE_DTYPE.itemsize > len(buffer):
+        raise ValueError("Binary capture is truncated")
+
+    channels = []
+    for length in lengths:
+        channels.append(np.frombuffer(buffer, dtype=SAMPLE_DTYPE, count=length, offset=offset))
+        offset += length * SAMPLE_DTYPE.itemsize
+
+    metadata = {
+        "sample_rate": sample_rate,
+        "resolution": resolution,
+        "timestamp": timestamp or None,
+        "device_id": device_id or None,
+    }
+    return metadata, channels
+
+
+def encode_stream_frame(seq, capture):
+    """Оборачивает закодированную выборку в кадр потока с ее номером"""
+    return _STREAM_FRAME.pack(seq, len(capture)) + capture
+
+
+def iter_stream_frames(buffer):
+    """Разбирает поток кадров, возвращая (seq, metadata, channels) для каждой выборки"""
+    view = memoryview(buffer)
+    offset = 0
+    while offset < len(view):
+        seq, length = _STREAM_FRAME.unpack_from(view, offset)
+        offset += _STREAM_FRAME.size
+        metadata, channels = decode_capture(view[offset:offset + length])
+        offset += length
+        yield seq, metadata, channels
+
+
+def decode_json_capture(data):
+    """Приводит JSON-ответ ESP32 к тому же виду, что и decode_capture"""
+    channels = [np.asarray(data.get(name, []), dtype=SAMPLE_DTYPE) for name in CHANNELS]
+    return data.get("metadata", {}), channels